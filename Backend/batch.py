@@ -0,0 +1,193 @@
+"""
+Batch execution of tool requests.
+
+A batch request carries many ``{tool_type, query}`` items in one invoke. Items
+run concurrently in a bounded thread pool and every item gets its own success
+or error result. Items are given up on when their own timeout expires or when
+the Lambda invocation is about to run out of time, whichever comes first.
+
+Python threads cannot be stopped, so a given-up item keeps running in the
+background: past the return of this invocation, and after the container thaws
+for the next one, until it finishes on its own. Meanwhile it holds its
+Bedrock ``limiter`` slot. Each item records metrics and usage apart from the
+request. Those records are merged into the request's when the item finishes
+or is given up on, so whatever an abandoned item does afterwards is never
+counted, whether against this request or the next.
+"""
+import contextvars
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import metrics
+import usage
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', '8'))
+MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', '500'))
+# Time kept back from the invocation deadline to serialize and return results
+DEADLINE_MARGIN_MS = int(os.environ.get('BATCH_DEADLINE_MARGIN_MS', '3000'))
+
+
+class BatchValidationError(ValueError):
+    """Raised when the batch envelope itself is malformed"""
+
+
+def _invocation_deadline(context) -> Optional[float]:
+    """Monotonic time by which all items must have finished, if known"""
+    if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+        return None
+    remaining_ms = context.get_remaining_time_in_millis() - DEADLINE_MARGIN_MS
+    return time.monotonic() + max(remaining_ms, 0) / 1000
+
+
+def _earliest(*deadlines: Optional[float]) -> Optional[float]:
+    known = [deadline for deadline in deadlines if deadline is not None]
+    return min(known) if known else None
+
+
+def _error_result(item_id, error: str, message: str, duration_ms: Optional[float] = None) -> Dict[str, Any]:
+    result = {
+        'id': item_id,
+        'success': False,
+        'error': error,
+        'message': message,
+    }
+    if duration_ms is not None:
+        result['duration_ms'] = round(duration_ms, 1)
+    return result
+
+
+def validate_items(items: Any) -> List[Dict[str, Any]]:
+    if not isinstance(items, list) or not items:
+        raise BatchValidationError("batch must be a non-empty list of {tool_type, query} items")
+    if len(items) > MAX_ITEMS:
+        raise BatchValidationError(f"batch has {len(items)} items, the limit is {MAX_ITEMS}")
+    return items
+
+
+def _positive_int(value: Any, name: str) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise BatchValidationError(f"{name} must be a positive integer")
+    return value
+
+
+def run_batch(
+    items: List[Dict[str, Any]],
+    run_item: Callable[[str, str], Dict[str, Any]],
+    context=None,
+    max_workers: Optional[int] = None,
+    item_timeout_ms: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Run ``run_item(tool_type, query)`` for every item and collect per-item results.
+
+    Results are returned in the order of ``items``. A successful result is the
+    tool's response data plus ``id`` and ``duration_ms``; a failed one has
+    ``success: False`` with an ``error`` code of ``invalid``, ``failed`` or
+    ``timeout``.
+    """
+    items = validate_items(items)
+    max_workers = _positive_int(max_workers, 'max_concurrency')
+    item_timeout_ms = _positive_int(item_timeout_ms, 'item_timeout_ms')
+    workers = max(1, min(max_workers or MAX_WORKERS, MAX_WORKERS, len(items)))
+    item_timeout = item_timeout_ms / 1000 if item_timeout_ms else None
+    deadline = _invocation_deadline(context)
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    started: Dict[int, float] = {}
+    request_metrics = metrics.current()
+    request_usage = usage.current()
+    parts: Dict[int, Tuple[Optional[metrics.RequestMetrics], Optional[usage.UsageLedger]]] = {}
+
+    def _run(index: int, tool_type: str, query: str) -> Dict[str, Any]:
+        parts[index] = (
+            metrics.start_part(tool_type) if request_metrics is not None else None,
+            usage.start_request() if request_usage is not None else None,
+        )
+        started[index] = time.monotonic()
+        return run_item(tool_type, query)
+
+    def _merge(index: int):
+        """Fold an item's records into the request's; anything it records later is dropped"""
+        part_metrics, part_usage = parts.pop(index, (None, None))
+        if part_metrics is not None:
+            request_metrics.merge(part_metrics)
+        if part_usage is not None:
+            request_usage.merge(part_usage)
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch')
+    pending: Dict[Future, int] = {}
+    try:
+        for index, item in enumerate(items):
+            item_id = item.get('id', index) if isinstance(item, dict) else index
+            if not isinstance(item, dict) or not item.get('tool_type') or not item.get('query'):
+                results[index] = _error_result(item_id, 'invalid', 'Missing required parameters: tool_type and query')
+                continue
+            # Items start from the caller's context; _run then gives them their own metrics and usage
+            context_copy = contextvars.copy_context()
+            pending[executor.submit(context_copy.run, _run, index, item['tool_type'], item['query'])] = index
+
+        while pending:
+            now = time.monotonic()
+            next_deadline = deadline
+
+            for future, index in list(pending.items()):
+                item_deadline = deadline
+                if item_timeout is not None:
+                    # Queued items have not used any of their own budget yet
+                    start = started.get(index, now)
+                    item_deadline = _earliest(item_deadline, start + item_timeout)
+                if item_deadline is not None and now >= item_deadline:
+                    future.cancel()
+                    del pending[future]
+                    _merge(index)
+                    item = items[index]
+                    elapsed = (now - started[index]) * 1000 if index in started else None
+                    results[index] = _error_result(
+                        item.get('id', index), 'timeout',
+                        'Item did not finish before its deadline', elapsed
+                    )
+                elif item_deadline is not None:
+                    next_deadline = _earliest(next_deadline, item_deadline)
+
+            if not pending:
+                break
+
+            timeout = None if next_deadline is None else max(next_deadline - now, 0)
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                index = pending.pop(future)
+                _merge(index)
+                item = items[index]
+                duration_ms = (time.monotonic() - started.get(index, now)) * 1000
+                try:
+                    response_data = future.result()
+                    results[index] = {
+                        'id': item.get('id', index),
+                        **response_data,
+                        'duration_ms': round(duration_ms, 1),
+                    }
+                except Exception as e:
+                    logger.error(f"Batch item {index} ({item['tool_type']}) failed: {str(e)}")
+                    results[index] = _error_result(item.get('id', index), 'failed', str(e), duration_ms)
+    finally:
+        # Abandon anything still queued or running; the invocation has to return
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return results
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, int]:
+    succeeded = sum(1 for result in results if result.get('success'))
+    return {
+        'total': len(results),
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+    }
@@ -0,0 +1,326 @@
+"""
+Shared Bedrock runtime client and Claude 3 request plumbing.
+
+Every tool calls Bedrock through this module:
+
+- ``get_bedrock_runtime`` returns one pooled client per container, configured
+  for concurrent use (pool size, keep-alive, standard retries, timeouts);
+- ``build_request`` builds the Anthropic messages body, including assistant
+  prefills, images and stop sequences;
+- ``invoke`` / ``invoke_text`` send it and parse the response, answering
+  from ``llm_cache`` when the identical deterministic request was seen
+  before, and
+  ``stream_text`` streams the response as text deltas.
+
+Unless a caller pins ``model_id``, the model comes from ``model_router``,
+keyed by the caller's ``purpose`` and tool, and a throttled or failing model
+is retried on the route's fallbacks. Every call records its tokens, latency,
+stop reason and retries in ``usage``. With ``hedging`` enabled, a slow
+non-streamed call is duplicated and the first answer kept. Every call, hedges
+included, first waits for a slot from the model's adaptive ``limiter``.
+
+Tuning happens here, through environment variables, instead of in each tool.
+For offline benchmarks, ``BEDROCK_EMULATOR=true`` answers every call from
+``bedrock_emulator`` in process, and ``BEDROCK_ENDPOINT_URL`` points the
+clients at another endpoint, such as the emulator's HTTP server.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+import hedging
+import limiter
+import metrics
+import usage
+from llm_cache import cache_key, get_llm_cache, is_cacheable
+from model_router import error_code, get_router, should_fall_back
+from streaming import iter_text
+from tools.lazy import lazy_dependency
+
+logger = logging.getLogger(__name__)
+
+MODEL_ID = os.environ.get('BEDROCK_MODEL_ID', 'anthropic.claude-3-sonnet-20240229-v1:0')
+ANTHROPIC_VERSION = 'bedrock-2023-05-31'
+MAX_TOKENS = int(os.environ.get('BEDROCK_MAX_TOKENS', '4096'))
+
+REGION = os.environ.get('AWS_REGION', 'us-east-1')
+# Enough connections for a full batch fan-out plus streaming calls
+MAX_POOL_CONNECTIONS = int(os.environ.get('BEDROCK_MAX_POOL_CONNECTIONS', '32'))
+CONNECT_TIMEOUT = float(os.environ.get('BEDROCK_CONNECT_TIMEOUT', '5'))
+READ_TIMEOUT = float(os.environ.get('BEDROCK_READ_TIMEOUT', '120'))
+MAX_ATTEMPTS = int(os.environ.get('BEDROCK_MAX_ATTEMPTS', '4'))
+ENDPOINT_URL = os.environ.get('BEDROCK_ENDPOINT_URL') or None
+EMULATOR = os.environ.get('BEDROCK_EMULATOR', 'false').lower() == 'true'
+
+Content = Union[str, List[Dict[str, Any]]]
+
+
+def client_config(read_timeout: float = READ_TIMEOUT):
+    """botocore config shared by every Bedrock runtime client"""
+    from botocore.config import Config
+
+    return Config(
+        region_name=REGION,
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=read_timeout,
+        tcp_keepalive=True,
+        # Not 'adaptive': client-side rate limiting is ``limiter``'s job, and two would stack
+        retries={'mode': 'standard', 'max_attempts': MAX_ATTEMPTS},
+    )
+
+
+def _create_client(read_timeout: float = READ_TIMEOUT):
+    import boto3
+
+    try:
+        client = boto3.client(
+            service_name='bedrock-runtime',
+            endpoint_url=ENDPOINT_URL,
+            config=client_config(read_timeout)
+        )
+    except Exception as e:
+        logger.error(f"Failed to initialize Bedrock client: {e}")
+        raise
+    # Lets the limiter back off on throttles botocore retried away
+    client.meta.events.register('needs-retry.bedrock-runtime', limiter.count_throttled_attempt)
+    if EMULATOR:
+        import bedrock_emulator
+
+        logger.warning("Bedrock calls are answered by the local emulator")
+        bedrock_emulator.install(client)
+    return client
+
+
+@lazy_dependency('bedrock')
+def get_bedrock_runtime():
+    """Create the shared Bedrock runtime client on first use"""
+    return _create_client()
+
+
+_timeout_clients: Dict[float, Any] = {}
+_timeout_clients_lock = threading.Lock()
+
+
+def _client(timeout: Optional[float] = None):
+    """Shared client, or one with a different read timeout (also shared)"""
+    if timeout is None or timeout == READ_TIMEOUT:
+        return get_bedrock_runtime()
+    client = _timeout_clients.get(timeout)
+    if client is None:
+        with _timeout_clients_lock:
+            client = _timeout_clients.get(timeout)
+            if client is None:
+                client = _timeout_clients[timeout] = _create_client(timeout)
+    return client
+
+
+def text_block(text: str) -> Dict[str, Any]:
+    return {'type': 'text', 'text': text}
+
+
+def image_block(base64_string: str, media_type: str = 'image/png') -> Dict[str, Any]:
+    return {
+        'type': 'image',
+        'source': {
+            'type': 'base64',
+            'media_type': media_type,
+            'data': base64_string,
+        },
+    }
+
+
+def _blocks(content: Content) -> List[Dict[str, Any]]:
+    return [text_block(content)] if isinstance(content, str) else list(content)
+
+
+def build_request(
+    system_prompt: str,
+    content: Content,
+    prefill: Optional[str] = None,
+    stop_sequences: Optional[List[str]] = None,
+    max_tokens: int = MAX_TOKENS,
+) -> Dict[str, Any]:
+    """
+    Build an Anthropic messages request body.
+
+    ``content`` is the user turn, as text or a list of content blocks;
+    ``prefill`` starts the assistant turn so the model continues from it.
+    """
+    request = {
+        'anthropic_version': ANTHROPIC_VERSION,
+        'max_tokens': max_tokens,
+        'system': system_prompt,
+        'messages': [{'role': 'user', 'content': _blocks(content)}],
+    }
+    if stop_sequences:
+        request['stop_sequences'] = list(stop_sequences)
+    if prefill:
+        request['messages'].append({'role': 'assistant', 'content': [text_block(prefill)]})
+    return request
+
+
+def parse_response(response: Dict[str, Any]) -> Dict[str, Any]:
+    """Decode an ``invoke_model`` response body"""
+    return json.loads(response['body'].read())
+
+
+def response_text(response_body: Dict[str, Any]) -> str:
+    """Text of the first content block of a decoded response"""
+    return response_body.get('content')[0].get('text')
+
+
+def _retries(response: Dict[str, Any]) -> int:
+    return response.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+
+
+def _record_usage(model_id: str, purpose: Optional[str], response_body: Dict[str, Any],
+                  latency_ms: float = 0.0, retries: int = 0, cached: bool = False):
+    body_usage = response_body.get('usage') or {}
+    usage.record_call(
+        model_id,
+        purpose=purpose,
+        input_tokens=body_usage.get('input_tokens'),
+        output_tokens=body_usage.get('output_tokens'),
+        stop_reason=response_body.get('stop_reason'),
+        latency_ms=latency_ms,
+        retries=retries,
+        cached=cached,
+    )
+
+
+def _candidates(request: Dict[str, Any], model_id: Optional[str], purpose: Optional[str]) -> List[str]:
+    if model_id:
+        return [model_id]
+    return get_router().candidates(purpose, usage.current_tool(), request)
+
+
+def _with_fallback(call, request: Dict[str, Any], model_id: Optional[str], purpose: Optional[str]):
+    """Run ``call(model_id)`` on each routed model until one succeeds"""
+    candidates = _candidates(request, model_id, purpose)
+    for attempt, candidate in enumerate(candidates):
+        try:
+            return call(candidate)
+        except Exception as e:
+            if attempt == len(candidates) - 1 or not should_fall_back(e):
+                raise
+            logger.warning(
+                f"{candidate} failed for {purpose or 'call'} ({error_code(e) or type(e).__name__}), "
+                f"falling back to {candidates[attempt + 1]}"
+            )
+            metrics.increment('bedrock_fallbacks')
+
+
+def _call_model(request: Dict[str, Any], model_id: str, timeout: Optional[float],
+                purpose: Optional[str]) -> Dict[str, Any]:
+    permit = limiter.acquire(model_id)
+    start = time.perf_counter()
+    try:
+        response = _client(timeout).invoke_model(
+            body=json.dumps(request),
+            modelId=model_id,
+            accept='application/json',
+            contentType='application/json'
+        )
+        response_body = parse_response(response)
+    except Exception as e:
+        limiter.release(permit, error=e)
+        raise
+    limiter.release(permit)
+    # Recorded per attempt, so an abandoned hedge still shows up as spend
+    _record_usage(
+        model_id, purpose, response_body,
+        latency_ms=(time.perf_counter() - start) * 1000,
+        retries=_retries(response)
+    )
+    return response_body
+
+
+def _invoke_model(request: Dict[str, Any], model_id: str, timeout: Optional[float],
+                  purpose: Optional[str]) -> Dict[str, Any]:
+    cache = get_llm_cache() if is_cacheable(request) else None
+    if cache is not None:
+        key = cache_key(model_id, request)
+        cached = cache.get(key)
+        if cached is not None:
+            _record_usage(model_id, purpose, cached, cached=True)
+            return cached
+
+    response_body = hedging.call(
+        lambda: _call_model(request, model_id, timeout, purpose),
+        model_id, purpose
+    )
+    if cache is not None:
+        cache.put(key, response_body)
+    return response_body
+
+
+def invoke(request: Dict[str, Any], model_id: Optional[str] = None, timeout: Optional[float] = None,
+           purpose: Optional[str] = None) -> Dict[str, Any]:
+    """Invoke the routed (or given) model and return the decoded response body"""
+    return _with_fallback(
+        lambda candidate: _invoke_model(request, candidate, timeout, purpose),
+        request, model_id, purpose
+    )
+
+
+def invoke_text(request: Dict[str, Any], model_id: Optional[str] = None, timeout: Optional[float] = None,
+                purpose: Optional[str] = None) -> str:
+    """Invoke a model and return the generated text"""
+    return response_text(invoke(request, model_id=model_id, timeout=timeout, purpose=purpose))
+
+
+def invoke_stream(request: Dict[str, Any], model_id: str = MODEL_ID, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """Open a streamed response; read it with ``streaming.iter_text``"""
+    return _client(timeout).invoke_model_with_response_stream(
+        body=json.dumps(request),
+        modelId=model_id,
+        accept='application/json',
+        contentType='application/json'
+    )
+
+
+def stream_text(
+    request: Dict[str, Any],
+    model_id: Optional[str] = None,
+    stop_sequences: Optional[List[str]] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+    timeout: Optional[float] = None,
+    purpose: Optional[str] = None,
+) -> Iterator[str]:
+    """Stream a response as text deltas, recording its usage once it ends"""
+    metadata = {} if metadata is None else metadata
+
+    def open_stream(candidate: str):
+        permit = limiter.acquire(candidate)
+        try:
+            return candidate, permit, invoke_stream(request, model_id=candidate, timeout=timeout)
+        except Exception as e:
+            limiter.release(permit, error=e)
+            raise
+
+    start = time.perf_counter()
+    # Only opening the stream can fall back; after the first delta it is committed
+    model_id, permit, response = _with_fallback(open_stream, request, model_id, purpose)
+    error = None
+    try:
+        yield from iter_text(response, stop_sequences=stop_sequences, metadata=metadata)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        # The slot is held for the whole stream, since generation is what the quota limits
+        limiter.release(permit, error=error)
+        invocation_metrics = metadata.get('invocation_metrics') or {}
+        usage.record_call(
+            model_id,
+            purpose=purpose,
+            input_tokens=metadata.get('input_tokens'),
+            output_tokens=metadata.get('output_tokens'),
+            stop_reason=metadata.get('stop_reason'),
+            latency_ms=invocation_metrics.get('invocationLatency', (time.perf_counter() - start) * 1000),
+            retries=_retries(response)
+        )
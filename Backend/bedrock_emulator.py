@@ -0,0 +1,555 @@
+"""
+Local stand-in for the Bedrock runtime, for benchmarks and load tests.
+
+The emulator answers ``invoke_model`` and ``invoke_model_with_response_stream``
+from recorded responses (``bedrock_recordings.json``), one list per prompt
+type: ``call_claude_3``, ``call_claude_3_code``, ``call_claude_3_fill`` and
+``gen_image_caption``. The prompt type is worked out from the request itself
+(images, assistant prefill). Stop sequences and ``max_tokens`` are applied as
+Bedrock would.
+
+Latency, throttles and errors are injected from a config (``DEFAULT_CONFIG``,
+overridden by the JSON file named in ``BEDROCK_EMULATOR_CONFIG``):
+
+- ``first_byte_ms`` and ``per_token_ms`` are distributions: ``constant``
+  (value), ``uniform`` (low, high), ``normal`` (mean, stddev) or
+  ``lognormal`` (median, sigma);
+- ``throttle_rate`` and ``error_rate`` are the chances that a call fails
+  with ``ThrottlingException`` or one of ``errors``;
+- ``max_concurrency`` throttles calls beyond that many in flight, like a
+  model quota;
+- ``stream_error_rate`` sends one of ``stream_errors`` mid-stream;
+- ``models`` overrides any of these per model ID.
+
+There are two ways to use it:
+
+- In process: set ``BEDROCK_EMULATOR=true`` and ``bedrock`` installs it on
+  its clients. It stands in for the HTTP round trip, so botocore's parsing
+  and retries still run but no request leaves the process;
+- Over HTTP: run ``python bedrock_emulator.py serve --port 8089`` and point
+  the handler at it with ``BEDROCK_ENDPOINT_URL=http://localhost:8089``. Any
+  credentials will do.
+
+``python bedrock_emulator.py record --cases model_routes_bench.json`` calls
+the real service and adds its answers to the recordings.
+"""
+import argparse
+import base64
+import copy
+import json
+import logging
+import math
+import os
+import random
+import re
+import struct
+import sys
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RECORDINGS_PATH = os.environ.get('BEDROCK_RECORDINGS_PATH', os.path.join(BASE_DIR, 'bedrock_recordings.json'))
+CONFIG_PATH = os.environ.get('BEDROCK_EMULATOR_CONFIG')
+DEFAULT_PORT = 8089
+
+DEFAULT_CONFIG: Dict[str, Any] = {
+    'seed': None,
+    'first_byte_ms': {'distribution': 'lognormal', 'median': 600, 'sigma': 0.5},
+    'per_token_ms': {'distribution': 'constant', 'value': 10},
+    'throttle_rate': 0.0,
+    'error_rate': 0.0,
+    'errors': ['ModelTimeoutException', 'InternalServerException', 'ServiceUnavailableException'],
+    'max_concurrency': 0,
+    'stream_error_rate': 0.0,
+    'stream_errors': ['throttlingException', 'modelStreamErrorException'],
+    'models': {
+        'anthropic.claude-3-haiku-20240307-v1:0': {
+            'first_byte_ms': {'distribution': 'lognormal', 'median': 250, 'sigma': 0.4},
+            'per_token_ms': {'distribution': 'constant', 'value': 4},
+        },
+    },
+}
+
+ERROR_STATUS = {
+    'ThrottlingException': 429,
+    'ServiceQuotaExceededException': 429,
+    'ModelNotReadyException': 429,
+    'ModelTimeoutException': 408,
+    'ModelErrorException': 424,
+    'InternalServerException': 500,
+    'ServiceUnavailableException': 503,
+    'ValidationException': 400,
+}
+
+CHARS_PER_TOKEN = 4
+
+
+class EmulatedError(Exception):
+    """An error the emulator was configured to return"""
+
+    def __init__(self, code: str, message: str):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.message = message
+        self.status = ERROR_STATUS.get(code, 400)
+
+
+def sample(distribution: Dict[str, Any], rng: random.Random) -> float:
+    """Draw a non-negative value from a distribution spec"""
+    kind = distribution.get('distribution', 'constant')
+    if kind == 'constant':
+        value = distribution.get('value', 0)
+    elif kind == 'uniform':
+        value = rng.uniform(distribution['low'], distribution['high'])
+    elif kind == 'normal':
+        value = rng.gauss(distribution['mean'], distribution['stddev'])
+    elif kind == 'lognormal':
+        value = rng.lognormvariate(math.log(distribution['median']), distribution['sigma'])
+    else:
+        raise ValueError(f"Unknown distribution: {kind}")
+    return max(0.0, value)
+
+
+def classify(request: Dict[str, Any]) -> str:
+    """Prompt type of a request, from its shape (see ``tools.llm``)"""
+    messages = request.get('messages', [])
+    for block in (messages[0].get('content') if messages else None) or []:
+        if isinstance(block, dict) and block.get('type') == 'image':
+            return 'gen_image_caption'
+    if len(messages) > 1 and messages[-1].get('role') == 'assistant':
+        prefill = ''.join(block.get('text', '') for block in messages[-1].get('content', []))
+        return 'call_claude_3_code' if prefill.strip() == '```' else 'call_claude_3_fill'
+    return 'call_claude_3'
+
+
+def _request_chars(request: Dict[str, Any]) -> int:
+    total = len(request.get('system') or '')
+    for message in request.get('messages', []):
+        content = message.get('content')
+        if isinstance(content, str):
+            total += len(content)
+            continue
+        for block in content or []:
+            total += len(block.get('text', '')) if block.get('type') == 'text' else 1600 * CHARS_PER_TOKEN
+    return total
+
+
+def load_recordings(path: str = RECORDINGS_PATH) -> Dict[str, List[Dict[str, Any]]]:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def load_config(path: Optional[str] = CONFIG_PATH) -> Dict[str, Any]:
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    if path:
+        with open(path, 'r') as f:
+            config.update(json.load(f))
+    return config
+
+
+class BedrockEmulator:
+    """Generates Claude 3 responses from recordings with injected latency and faults"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None,
+                 recordings: Optional[Dict[str, List[Dict[str, Any]]]] = None):
+        self.config = config if config is not None else load_config()
+        self.recordings = recordings if recordings is not None else load_recordings()
+        self.rng = random.Random(self.config.get('seed'))
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def _settings(self, model_id: str) -> Dict[str, Any]:
+        return {**self.config, **self.config.get('models', {}).get(model_id, {})}
+
+    def _sample(self, distribution: Dict[str, Any]) -> float:
+        with self._lock:
+            return sample(distribution, self.rng)
+
+    def _choice(self, options: List[Any]) -> Any:
+        with self._lock:
+            return self.rng.choice(options)
+
+    def _chance(self, probability: float) -> bool:
+        with self._lock:
+            return self.rng.random() < probability
+
+    def _admit(self, settings: Dict[str, Any]):
+        """Count the call in flight, or raise the error it was chosen to fail with"""
+        with self._lock:
+            limit = settings.get('max_concurrency') or 0
+            if limit and self.in_flight >= limit:
+                raise EmulatedError('ThrottlingException', 'Too many requests, please wait before trying again.')
+            if self.rng.random() < settings.get('throttle_rate', 0):
+                raise EmulatedError('ThrottlingException', 'Too many requests, please wait before trying again.')
+            if self.rng.random() < settings.get('error_rate', 0):
+                raise EmulatedError(self.rng.choice(settings['errors']), 'Injected by the Bedrock emulator.')
+            self.in_flight += 1
+
+    def _done(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def _answer(self, request: Dict[str, Any]) -> Tuple[str, str, int]:
+        """Text, stop reason and input tokens for a request"""
+        purpose = classify(request)
+        recorded = self.recordings.get(purpose) or self.recordings.get('call_claude_3') or [{'text': ''}]
+        text = self._choice(recorded)['text']
+        stop_reason = 'end_turn'
+        cut = min((text.find(stop) for stop in request.get('stop_sequences') or [] if stop in text), default=-1)
+        if cut >= 0:
+            text, stop_reason = text[:cut], 'stop_sequence'
+        max_chars = request.get('max_tokens', 4096) * CHARS_PER_TOKEN
+        if len(text) > max_chars:
+            text, stop_reason = text[:max_chars], 'max_tokens'
+        return text, stop_reason, max(1, _request_chars(request) // CHARS_PER_TOKEN)
+
+    def invoke(self, model_id: str, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Response body of ``invoke_model``"""
+        settings = self._settings(model_id)
+        self._admit(settings)
+        try:
+            text, stop_reason, input_tokens = self._answer(request)
+            output_tokens = max(1, len(text) // CHARS_PER_TOKEN)
+            delay_ms = self._sample(settings['first_byte_ms'])
+            delay_ms += output_tokens * self._sample(settings['per_token_ms'])
+            time.sleep(delay_ms / 1000)
+        finally:
+            self._done()
+        return {
+            'id': f"msg_emulated_{uuid.uuid4().hex}",
+            'type': 'message',
+            'role': 'assistant',
+            'model': model_id,
+            'content': [{'type': 'text', 'text': text}],
+            'stop_reason': stop_reason,
+            'stop_sequence': None,
+            'usage': {'input_tokens': input_tokens, 'output_tokens': output_tokens},
+        }
+
+    def stream(self, model_id: str, request: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        Events of ``invoke_model_with_response_stream``, in botocore's shape.
+
+        Admission errors are raised before the first event, as Bedrock
+        rejects the call. Mid-stream errors arrive as exception events.
+        """
+        settings = self._settings(model_id)
+        self._admit(settings)
+        return EventStream(self._stream_events(model_id, request, settings), self._done)
+
+    def _stream_events(self, model_id: str, request: Dict[str, Any],
+                       settings: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        start = time.perf_counter()
+        text, stop_reason, input_tokens = self._answer(request)
+        first_byte_ms = self._sample(settings['first_byte_ms'])
+        time.sleep(first_byte_ms / 1000)
+        yield _chunk({
+            'type': 'message_start',
+            'message': {'role': 'assistant', 'model': model_id, 'usage': {'input_tokens': input_tokens}},
+        })
+        yield _chunk({'type': 'content_block_start', 'index': 0, 'content_block': {'type': 'text', 'text': ''}})
+
+        deltas = re.findall(r'.{1,%d}' % CHARS_PER_TOKEN, text, flags=re.S)
+        fail_at = len(deltas) // 2 if self._chance(settings.get('stream_error_rate', 0)) else None
+        for index, delta in enumerate(deltas):
+            if index == fail_at:
+                error = self._choice(settings['stream_errors'])
+                yield {error: {'message': 'Injected by the Bedrock emulator.'}}
+                return
+            time.sleep(self._sample(settings['per_token_ms']) / 1000)
+            yield _chunk({'type': 'content_block_delta', 'index': 0, 'delta': {'type': 'text_delta', 'text': delta}})
+
+        yield _chunk({'type': 'content_block_stop', 'index': 0})
+        yield _chunk({
+            'type': 'message_delta',
+            'delta': {'stop_reason': stop_reason, 'stop_sequence': None},
+            'usage': {'output_tokens': len(deltas)},
+        })
+        yield _chunk({
+            'type': 'message_stop',
+            'amazon-bedrock-invocationMetrics': {
+                'inputTokenCount': input_tokens,
+                'outputTokenCount': len(deltas),
+                'invocationLatency': int((time.perf_counter() - start) * 1000),
+                'firstByteLatency': int(first_byte_ms),
+            },
+        })
+
+
+class EventStream:
+    """Iterable stream body; closing it, read or not, ends the call"""
+
+    def __init__(self, events: Iterator[Dict[str, Any]], on_close):
+        self._events = events
+        self._on_close = on_close
+        self._closed = False
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        try:
+            yield from self._events
+        finally:
+            self.close()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._events.close()
+            self._on_close()
+
+
+def _chunk(event: Dict[str, Any]) -> Dict[str, Any]:
+    return {'chunk': {'bytes': json.dumps(event).encode('utf-8')}}
+
+
+# In-process mode: answer botocore's HTTP requests without sending them
+
+_PATH_RE = re.compile(r'/model/([^/]+)/(invoke|invoke-with-response-stream)')
+
+
+class _RawBody:
+    """The parts of a urllib3 response that botocore reads a body through"""
+
+    def __init__(self, chunks: Iterator[bytes], on_close=None):
+        self._chunks = chunks
+        self._buffer = b''
+        self._on_close = on_close
+
+    def stream(self, amt: Optional[int] = None, decode_content: Optional[bool] = None) -> Iterator[bytes]:
+        if self._buffer:
+            data, self._buffer = self._buffer, b''
+            yield data
+        yield from self._chunks
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        while amt is None or len(self._buffer) < amt:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        size = len(self._buffer) if amt is None else amt
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def close(self):
+        if self._on_close is not None:
+            self._on_close()
+
+
+def _http_response(url: str, status: int, headers: Dict[str, str], chunks: Iterator[bytes], on_close=None):
+    from botocore.awsrequest import AWSResponse
+
+    return AWSResponse(url, status, headers, _RawBody(chunks, on_close))
+
+
+def _error_response(url: str, error: EmulatedError):
+    body = json.dumps({'message': error.message}).encode('utf-8')
+    headers = {'Content-Type': 'application/json', 'x-amzn-ErrorType': error.code, 'Content-Length': str(len(body))}
+    return _http_response(url, error.status, headers, iter([body]))
+
+
+def install(client, emulator: Optional[BedrockEmulator] = None):
+    """
+    Answer a ``bedrock-runtime`` client's model calls from the emulator.
+
+    Responses are injected at ``before-send``, in place of the HTTP round
+    trip, so botocore still parses them and runs its retry handler: injected
+    throttles are retried per the client's retry config and show up in
+    ``RetryAttempts``. Requests are left unsigned, so no credentials are needed.
+    """
+    from botocore import UNSIGNED
+
+    emulator = emulator or get_emulator()
+
+    def on_send(request, **kwargs):
+        match = _PATH_RE.fullmatch(urlsplit(request.url).path)
+        if match is None:
+            return None
+        model_id, operation = unquote(match.group(1)), match.group(2)
+        body = request.body.read() if hasattr(request.body, 'read') else request.body
+        payload = json.loads(body or b'{}')
+        try:
+            if operation == 'invoke':
+                data = json.dumps(emulator.invoke(model_id, payload)).encode('utf-8')
+                headers = {'Content-Type': 'application/json', 'Content-Length': str(len(data))}
+                return _http_response(request.url, 200, headers, iter([data]))
+            events = emulator.stream(model_id, payload)
+        except EmulatedError as e:
+            return _error_response(request.url, e)
+        headers = {'Content-Type': 'application/vnd.amazon.eventstream'}
+        frames = (encode_stream_event(event) for event in events)
+        return _http_response(request.url, 200, headers, frames, events.close)
+
+    client.meta.events.register('choose-signer.bedrock-runtime', lambda **kwargs: UNSIGNED)
+    client.meta.events.register('before-send.bedrock-runtime.InvokeModel', on_send)
+    client.meta.events.register('before-send.bedrock-runtime.InvokeModelWithResponseStream', on_send)
+    return client
+
+
+_emulator: Optional[BedrockEmulator] = None
+_emulator_lock = threading.Lock()
+
+
+def get_emulator() -> BedrockEmulator:
+    global _emulator
+    if _emulator is None:
+        with _emulator_lock:
+            if _emulator is None:
+                _emulator = BedrockEmulator()
+    return _emulator
+
+
+# HTTP mode: the bedrock-runtime REST API, including the binary event stream
+
+def _encode_headers(headers: Dict[str, str]) -> bytes:
+    encoded = b''
+    for name, value in headers.items():
+        name_bytes, value_bytes = name.encode('utf-8'), value.encode('utf-8')
+        encoded += struct.pack('>B', len(name_bytes)) + name_bytes
+        encoded += struct.pack('>BH', 7, len(value_bytes)) + value_bytes
+    return encoded
+
+
+def encode_message(headers: Dict[str, str], payload: bytes) -> bytes:
+    """One ``application/vnd.amazon.eventstream`` message"""
+    header_bytes = _encode_headers(headers)
+    total = 12 + len(header_bytes) + len(payload) + 4
+    prelude = struct.pack('>II', total, len(header_bytes))
+    prelude += struct.pack('>I', zlib.crc32(prelude) & 0xffffffff)
+    message = prelude + header_bytes + payload
+    return message + struct.pack('>I', zlib.crc32(message) & 0xffffffff)
+
+
+def encode_stream_event(event: Dict[str, Any]) -> bytes:
+    chunk = event.get('chunk')
+    if chunk is not None:
+        payload = json.dumps({'bytes': base64.b64encode(chunk['bytes']).decode('ascii')}).encode('utf-8')
+        headers = {':event-type': 'chunk', ':content-type': 'application/json', ':message-type': 'event'}
+        return encode_message(headers, payload)
+    (error, detail), = event.items()
+    headers = {':exception-type': error, ':content-type': 'application/json', ':message-type': 'exception'}
+    return encode_message(headers, json.dumps(detail).encode('utf-8'))
+
+
+class EmulatorRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    emulator: BedrockEmulator
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send(self, status: int, body: bytes, headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, error: EmulatedError):
+        self._send(error.status, json.dumps({'message': error.message}).encode('utf-8'), {
+            'Content-Type': 'application/json',
+            'x-amzn-ErrorType': error.code,
+        })
+
+    def do_POST(self):
+        match = _PATH_RE.fullmatch(self.path)
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if match is None:
+            self._send_error(EmulatedError('ValidationException', f"Unknown path {self.path}"))
+            return
+        model_id, operation = unquote(match.group(1)), match.group(2)
+        try:
+            if operation == 'invoke':
+                body = json.dumps(self.emulator.invoke(model_id, request)).encode('utf-8')
+                self._send(200, body, {'Content-Type': 'application/json'})
+                return
+            events = self.emulator.stream(model_id, request)
+        except EmulatedError as e:
+            self._send_error(e)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/vnd.amazon.eventstream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for event in events:
+                frame = encode_stream_event(event)
+                self.wfile.write(f"{len(frame):x}\r\n".encode('ascii') + frame + b'\r\n')
+                self.wfile.flush()
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug("Client closed the stream early")
+        finally:
+            events.close()
+
+
+def serve(port: int = DEFAULT_PORT, host: str = '127.0.0.1', emulator: Optional[BedrockEmulator] = None):
+    handler = type('Handler', (EmulatorRequestHandler,), {'emulator': emulator or get_emulator()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    logger.info(f"Bedrock emulator listening on http://{host}:{port}")
+    return server
+
+
+def record(cases: List[Dict[str, Any]], path: str = RECORDINGS_PATH) -> int:
+    """Call the real service for each case and append the answers to the recordings"""
+    import bedrock
+    import llm_cache
+
+    llm_cache.set_bypass(True)
+    recordings = load_recordings(path) if os.path.exists(path) else {}
+    for case in cases:
+        request = bedrock.build_request(case.get('system', ''), case['prompt'], prefill=case.get('prefill'))
+        text = bedrock.invoke_text(request, purpose=case['purpose'])
+        recordings.setdefault(case['purpose'], []).append({'text': text})
+    with open(path, 'w') as f:
+        json.dump(recordings, f, indent=2)
+    return len(cases)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Local Bedrock runtime emulator")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve_parser = subparsers.add_parser('serve', help="Serve the bedrock-runtime API over HTTP")
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument('--config', default=CONFIG_PATH, help="Emulator config JSON file")
+    serve_parser.add_argument('--recordings', default=RECORDINGS_PATH)
+    serve_parser.add_argument('--throttle-rate', type=float)
+    serve_parser.add_argument('--error-rate', type=float)
+    serve_parser.add_argument('--max-concurrency', type=int)
+    serve_parser.add_argument('--seed', type=int)
+    record_parser = subparsers.add_parser('record', help="Record real responses for the emulator to replay")
+    record_parser.add_argument('--cases', required=True, help="Cases JSON file, as for model_router --benchmark")
+    record_parser.add_argument('--recordings', default=RECORDINGS_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        with open(args.cases) as f:
+            cases = json.load(f)
+        print(f"Recorded {record(cases, args.recordings)} responses to {args.recordings}")
+        return 0
+
+    config = load_config(args.config)
+    for name in ('throttle_rate', 'error_rate', 'max_concurrency', 'seed'):
+        if getattr(args, name) is not None:
+            config[name] = getattr(args, name)
+    server = serve(args.port, args.host, BedrockEmulator(config, load_recordings(args.recordings)))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+Prompt context for the Well-Architected tool, built from the retrieved chunks.
+
+Retrieval returns more candidates than the prompt needs. Neighbouring chunks
+of the framework often repeat each other (overlap, running headers, the same
+best practice restated per pillar). ``build_context`` handles this in four
+steps:
+
+- chunks are picked by maximal marginal relevance (MMR). Each pick weighs
+  its retrieval rank against its term overlap with the chunks already
+  picked, and chunks at least ``CONTEXT_DUPLICATE_SIMILARITY`` similar to a
+  pick are dropped outright;
+- chunks are packed until ``CONTEXT_TOKEN_BUDGET`` tokens are used, counted
+  with ``estimate_tokens``, a local approximation with no tokenizer call;
+- each chunk in the prompt is wrapped in a ``<document>`` tag with its source
+  and page;
+- sources for the client are ``{source, snippet, score, page}`` records, not
+  the full chunk text. ``resource_lines`` keeps the older flat list of each
+  chunk's source followed by its text lines, for clients that read it.
+"""
+import logging
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import metrics
+from lexical_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+CANDIDATES = int(os.environ.get('CONTEXT_CANDIDATES', '8'))
+# Framework chunks run ~230 estimated tokens, so this fits every candidate that survives MMR
+TOKEN_BUDGET = int(os.environ.get('CONTEXT_TOKEN_BUDGET', '2400'))
+# 1.0 ranks by relevance only, 0.0 by novelty only
+MMR_LAMBDA = float(os.environ.get('CONTEXT_MMR_LAMBDA', '0.7'))
+DUPLICATE_SIMILARITY = float(os.environ.get('CONTEXT_DUPLICATE_SIMILARITY', '0.85'))
+SNIPPET_CHARS = int(os.environ.get('CONTEXT_SNIPPET_CHARS', '240'))
+# Don't bother packing a chunk into less room than this
+_MIN_TOKENS = 32
+
+_WORD_RE = re.compile(r'\w+|[^\w\s]')
+_ELLIPSIS = ' ...'
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate Claude token count: ~1 per short word or symbol, long words split every 5 characters"""
+    return sum(max(1, math.ceil(len(word) / 5)) for word in _WORD_RE.findall(text))
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    # The ellipsis counts against the budget too
+    max_tokens -= estimate_tokens(_ELLIPSIS)
+    used = 0
+    for match in _WORD_RE.finditer(text):
+        used += max(1, math.ceil(len(match.group()) / 5))
+        if used > max_tokens:
+            return text[:match.start()].rstrip() + _ELLIPSIS
+    return text
+
+
+def snippet(text: str, max_chars: int = SNIPPET_CHARS) -> str:
+    text = re.sub(r'\s+', ' ', text).strip()
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(' ', 1)[0] + ' ...'
+
+
+def _cosine(a: Counter, b: Counter) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    dot = sum(count * b[term] for term, count in a.items() if term in b)
+    if not dot:
+        return 0.0
+    return dot / math.sqrt(sum(v * v for v in a.values()) * sum(v * v for v in b.values()))
+
+
+def mmr_order(texts: Sequence[str], mmr_lambda: float = MMR_LAMBDA,
+              duplicate_similarity: float = DUPLICATE_SIMILARITY) -> Tuple[List[int], int]:
+    """
+    Order ``texts`` (given best first) by maximal marginal relevance; returns
+    (order, number of near-duplicates dropped). Relevance is the retrieval
+    rank, since scores are not comparable across retrieval paths.
+    """
+    vectors = [Counter(tokenize(text)) for text in texts]
+    relevance = [1 - rank / len(texts) for rank in range(len(texts))]
+    max_similarity = [0.0] * len(texts)
+    remaining = list(range(len(texts)))
+    order: List[int] = []
+    dropped = 0
+    while remaining:
+        best = max(remaining, key=lambda i: mmr_lambda * relevance[i] - (1 - mmr_lambda) * max_similarity[i])
+        remaining.remove(best)
+        order.append(best)
+        for i in list(remaining):
+            similarity = _cosine(vectors[best], vectors[i])
+            if similarity >= duplicate_similarity:
+                remaining.remove(i)
+                dropped += 1
+            else:
+                max_similarity[i] = max(max_similarity[i], similarity)
+    return order, dropped
+
+
+def _label(metadata: Dict[str, Any]) -> str:
+    label = f'source="{metadata.get("source", "unknown")}"'
+    if metadata.get('page') is not None:
+        label += f' page="{metadata["page"]}"'
+    return label
+
+
+class Context:
+    """Packed prompt context and the resources to return with the answer"""
+
+    def __init__(self, text: str, resources: List[Dict[str, Any]], tokens: int,
+                 resource_lines: Optional[List[str]] = None):
+        self.text = text
+        self.resources = resources
+        self.tokens = tokens
+        self.resource_lines = resource_lines or []
+
+
+def build_context(results: Sequence[Tuple[Any, float]], token_budget: int = TOKEN_BUDGET) -> Context:
+    """Select and pack ``(document, score)`` search results, best first, into at most ``token_budget`` tokens"""
+    order, dropped = mmr_order([document.page_content for document, _ in results])
+    blocks: List[str] = []
+    resources: List[Dict[str, Any]] = []
+    resource_lines: List[str] = []
+    used = 0
+    for i in order:
+        document, score = results[i]
+        remaining = token_budget - used
+        if remaining < _MIN_TOKENS:
+            break
+        text = document.page_content.strip()
+        tokens = estimate_tokens(text)
+        if tokens > remaining:
+            if blocks:
+                # Try the next, possibly shorter, chunk instead
+                continue
+            text = _truncate(text, remaining)
+            tokens = estimate_tokens(text)
+        blocks.append(f'<document index="{len(blocks) + 1}" {_label(document.metadata)}>\n{text}\n</document>')
+        resource = {
+            'source': document.metadata.get('source'),
+            'snippet': snippet(text),
+            'score': round(float(score), 4),
+        }
+        if document.metadata.get('page') is not None:
+            resource['page'] = document.metadata['page']
+        resources.append(resource)
+        resource_lines.append(str(document.metadata.get('source', 'unknown')))
+        resource_lines.extend(text.split('\n'))
+        used += tokens
+
+    metrics.increment('context_tokens', used)
+    metrics.increment('context_chunks', len(blocks))
+    metrics.increment('context_duplicates_dropped', dropped)
+    return Context('\n'.join(blocks), resources, used, resource_lines)
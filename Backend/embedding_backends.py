@@ -0,0 +1,271 @@
+"""
+Embedding backends for retrieval and ingestion.
+
+A backend has a ``model_id``, a ``dim`` (``None`` when it is only known after
+the first call), ``embed_query(text)`` and ``embed_documents(texts)``. The
+model ID picks the backend:
+
+- ``local-hashing-<dim>``: ``HashingBackend``. It hashes unigrams and
+  bigrams into a signed ``dim``-wide vector with sublinear term frequency,
+  then L2-normalizes it. It runs on the CPU in well under a millisecond
+  with no network, so retrieval works offline. It has no IDF weighting, so
+  a chunk's vector does not depend on the rest of the corpus and ingestion
+  stays incremental;
+- anything else: ``BedrockBackend``, i.e. that Bedrock embeddings model,
+  called on the shared ``bedrock`` client behind the model's ``limiter``
+  and recorded in ``usage`` like any other model call.
+
+``EMBEDDING_MODEL`` selects the model for queries. An index records the model
+its vectors came from (``embedding_model`` in the ``mmap_index`` manifest).
+``check_index`` refuses to search an index with query vectors from a
+different model, since the distances would be meaningless.
+
+Compare backends on the corpus (recall@k for known-item queries, query
+latency) with:
+
+    python embedding_backends.py compare local_index --models amazon.titan-embed-text-v1 local-hashing-768
+"""
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+import limiter
+import usage
+from lexical_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = 'amazon.titan-embed-text-v1'
+MODEL_ID = os.environ.get('EMBEDDING_MODEL', DEFAULT_MODEL)
+HASHING_PREFIX = 'local-hashing-'
+# Output sizes of the Bedrock models we have used, for checks before the first call
+BEDROCK_DIMS = {
+    'amazon.titan-embed-text-v1': 1536,
+    'amazon.titan-embed-text-v2:0': 1024,
+    'cohere.embed-english-v3': 1024,
+    'cohere.embed-multilingual-v3': 1024,
+}
+
+
+class EmbeddingMismatchError(ValueError):
+    """Raised when query embeddings would come from a different model than the index's vectors"""
+
+
+class BedrockBackend:
+    """Bedrock embeddings through LangChain, on the pooled runtime client"""
+
+    remote = True
+
+    def __init__(self, model_id: str = DEFAULT_MODEL):
+        from langchain_community.embeddings import BedrockEmbeddings
+
+        import bedrock
+
+        self.model_id = model_id
+        self.dim: Optional[int] = BEDROCK_DIMS.get(model_id)
+        self._client = BedrockEmbeddings(model_id=model_id, client=bedrock.get_bedrock_runtime())
+
+    def embed_query(self, text: str) -> List[float]:
+        permit = limiter.acquire(self.model_id)
+        start = time.perf_counter()
+        try:
+            vector = self._client.embed_query(text)
+        except Exception as e:
+            limiter.release(permit, error=e)
+            raise
+        limiter.release(permit)
+        usage.record_call(self.model_id, purpose='embedding', latency_ms=(time.perf_counter() - start) * 1000)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # One Bedrock call per text either way; this way each one waits for its own slot
+        return [self.embed_query(text) for text in texts]
+
+    # LangChain's FAISS calls non-``Embeddings`` objects as a function
+    __call__ = embed_query
+
+
+@lru_cache(maxsize=65536)
+def _bucket(feature: str, dim: int):
+    digest = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+    return digest % dim, 1.0 if digest >> 63 else -1.0
+
+
+class HashingBackend:
+    """Signed feature hashing of unigrams and bigrams; deterministic, local and offline"""
+
+    remote = False
+
+    def __init__(self, dim: int = 768):
+        self.dim = dim
+        self.model_id = f"{HASHING_PREFIX}{dim}"
+
+    def embed(self, text: str) -> np.ndarray:
+        tokens = tokenize(text)
+        features = Counter(tokens)
+        features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, count in features.items():
+            index, sign = _bucket(feature, self.dim)
+            vector[index] += sign * (1 + math.log(count))
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed(text).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed(text).tolist() for text in texts]
+
+    __call__ = embed_query
+
+
+def backend_for(model_id: str) -> Any:
+    """The backend that produces ``model_id`` embeddings"""
+    match = re.fullmatch(rf'{HASHING_PREFIX}(\d+)', model_id)
+    if match:
+        return HashingBackend(int(match.group(1)))
+    if model_id.startswith('local-'):
+        raise ValueError(f"Unknown local embedding model {model_id!r}; use {HASHING_PREFIX}<dim>")
+    return BedrockBackend(model_id)
+
+
+def get_backend() -> Any:
+    """The backend for ``EMBEDDING_MODEL``"""
+    return backend_for(MODEL_ID)
+
+
+def check_index(backend: Any, index_model: Optional[str], index_dim: Optional[int] = None, path: str = ''):
+    """Refuse an index whose vectors came from another model or have another size"""
+    if index_model is None:
+        logger.warning(f"Index {path} does not record its embedding model; assuming {backend.model_id}")
+    elif index_model != backend.model_id:
+        raise EmbeddingMismatchError(
+            f"Index {path} was built with {index_model} embeddings but queries use {backend.model_id}; "
+            f"set EMBEDDING_MODEL={index_model} or rebuild the index with ingest.py --embedding-model"
+        )
+    if index_dim is not None and backend.dim is not None and index_dim != backend.dim:
+        raise EmbeddingMismatchError(
+            f"Index {path} has {index_dim}-d vectors but {backend.model_id} produces {backend.dim}-d"
+        )
+
+
+def _known_item_queries(texts: Sequence[str], count: int, seed: int) -> List[Dict[str, Any]]:
+    """A sentence from each of ``count`` random chunks, which should find its own chunk"""
+    rng = random.Random(seed)
+    queries = []
+    for chunk in rng.sample(range(len(texts)), min(count, len(texts))):
+        sentences = [s.strip() for s in re.split(r'(?<=[.?!])\s+|\n+', texts[chunk]) if 40 <= len(s.strip()) <= 300]
+        if sentences:
+            queries.append({'query': rng.choice(sentences), 'relevant': [chunk]})
+    return queries
+
+
+def _corpus(index_path: str):
+    """(chunk texts, stored float vectors or None, the model that made them)"""
+    from mmap_index import VECTOR_DTYPES, MmapIndex, is_mmap_index, read_langchain_docstore
+
+    if is_mmap_index(index_path):
+        index = MmapIndex(index_path)
+        texts = [index.text(i) for i in range(len(index))]
+        if index.encoding in VECTOR_DTYPES:
+            return texts, np.asarray(index.vectors, dtype=np.float32), index.embedding_model
+        return texts, None, None
+    # A LangChain FAISS directory does not record its embedding model
+    texts, _ = read_langchain_docstore(os.path.join(index_path, 'index.pkl'))
+    return texts, None, None
+
+
+def compare(index_path: str, models: Sequence[str], k: int = 5, queries_path: Optional[str] = None,
+            query_count: int = 100, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Recall@k and latency of each embedding model over the chunks of an index.
+
+    Queries come from ``queries_path`` (JSON lines of ``{"query", "relevant":
+    [chunk indexes]}``) or are sampled sentences that should find their own
+    chunk. The index's stored (unquantized) vectors are reused for the model
+    that built it; other models embed the whole corpus first, which for
+    Bedrock models costs one call per chunk.
+    """
+    texts, stored, index_model = _corpus(index_path)
+    if queries_path:
+        with open(queries_path, 'r') as f:
+            queries = [json.loads(line) for line in f if line.strip()]
+    else:
+        queries = _known_item_queries(texts, query_count, seed)
+
+    results = []
+    for model_id in models:
+        backend = backend_for(model_id)
+        start = time.perf_counter()
+        if model_id == index_model:
+            corpus = stored.copy()
+        else:
+            logger.info(f"Embedding {len(texts)} chunks with {model_id}")
+            corpus = np.asarray(backend.embed_documents(list(texts)), dtype=np.float32)
+        corpus_s = time.perf_counter() - start
+        corpus /= np.maximum(np.linalg.norm(corpus, axis=1, keepdims=True), 1e-12)
+
+        embed_ms, search_ms, found = [], [], 0
+        for item in queries:
+            start = time.perf_counter()
+            vector = np.asarray(backend.embed_query(item['query']), dtype=np.float32)
+            embedded = time.perf_counter()
+            top = np.argsort(-(corpus @ vector), kind='stable')[:k]
+            embed_ms.append((embedded - start) * 1000)
+            search_ms.append((time.perf_counter() - embedded) * 1000)
+            found += len(set(top.tolist()) & set(item['relevant'])) / min(k, len(item['relevant']))
+        embed_ms.sort()
+        results.append({
+            'model': model_id,
+            f'recall@{k}': round(found / len(queries), 4) if queries else 0.0,
+            'embed_p50_ms': round(statistics.median(embed_ms), 3) if embed_ms else 0.0,
+            'embed_p95_ms': round(embed_ms[int(0.95 * (len(embed_ms) - 1))], 3) if embed_ms else 0.0,
+            'search_p50_ms': round(statistics.median(search_ms), 3) if search_ms else 0.0,
+            'dim': int(corpus.shape[1]),
+            'corpus_embed_s': round(corpus_s, 2),
+        })
+        logger.info(f"Compared {model_id}: {results[-1]}")
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare embedding backends on an index's chunks")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    compare_parser = subparsers.add_parser('compare', help="Recall@k and latency per embedding model")
+    compare_parser.add_argument('index', help="mmap index, or a LangChain FAISS directory")
+    compare_parser.add_argument('--models', nargs='+', default=[DEFAULT_MODEL, f'{HASHING_PREFIX}768'])
+    compare_parser.add_argument('-k', type=int, default=5)
+    compare_parser.add_argument('--queries', help="JSON lines of {query, relevant} (default: sampled sentences)")
+    compare_parser.add_argument('--query-count', type=int, default=100)
+    compare_parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = compare(args.index, args.models, args.k, args.queries, args.query_count)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    recall = f'recall@{args.k}'
+    print(f"{'model':<32} {recall:>10} {'embed p50':>10} {'embed p95':>10} {'search p50':>11} {'dim':>6}")
+    for row in results:
+        print(f"{row['model']:<32} {row[recall]:>10.4f} {row['embed_p50_ms']:>10.3f} {row['embed_p95_ms']:>10.3f} "
+              f"{row['search_p50_ms']:>11.3f} {row['dim']:>6}")
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+Cache of query embeddings for the Well-Architected retrieval.
+
+Users ask the same questions over and over ("how to secure S3", "multi-AZ
+RDS"), and each one costs a Bedrock embeddings round trip before the search
+can start. ``CachedEmbeddings`` wraps the embeddings client and keys each
+query vector by the embedding model ID and the normalized query text
+(lowercased, whitespace collapsed, trailing punctuation dropped). Lookups use
+the ``llm_cache`` tiers:
+
+- an in-process LRU (``EMBEDDING_CACHE_ITEMS``);
+- a ``/tmp`` directory (``EMBEDDING_CACHE_DIR``; set it empty to turn the
+  tier off).
+
+Hits and misses are counted per request as ``embedding_cache_hit_<tier>`` and
+``embedding_cache_miss``. ``embedding_ms_saved`` adds up the embedding latency
+each hit avoided. ``stats()`` gives the same numbers for the container's
+lifetime.
+"""
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+import struct
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import metrics
+from llm_cache import DirectoryTier, MemoryTier
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get('EMBEDDING_CACHE_ENABLED', 'true').lower() != 'false'
+TTL_SECONDS = int(os.environ.get('EMBEDDING_CACHE_TTL', str(7 * 86400)))
+MEMORY_MAX_ITEMS = int(os.environ.get('EMBEDDING_CACHE_ITEMS', '1024'))
+DISK_DIR = os.environ.get('EMBEDDING_CACHE_DIR', '/tmp/embedding_cache')
+DISK_MAX_BYTES = int(os.environ.get('EMBEDDING_CACHE_DISK_BYTES', str(64 * 1024 * 1024)))
+
+
+def normalize_query(text: str) -> str:
+    return re.sub(r'\s+', ' ', text).strip().lower().rstrip('?.!').rstrip()
+
+
+def embedding_key(model_id: str, text: str) -> str:
+    return hashlib.sha256(f"{model_id}\n{normalize_query(text)}".encode('utf-8')).hexdigest()
+
+
+def encode_vector(vector: List[float], embed_ms: float) -> bytes:
+    packed = base64.b64encode(struct.pack(f'<{len(vector)}f', *vector)).decode('ascii')
+    return json.dumps({'vector': packed, 'embed_ms': round(embed_ms, 1)}).encode('utf-8')
+
+
+def decode_vector(data: bytes):
+    record = json.loads(data)
+    packed = base64.b64decode(record['vector'])
+    return list(struct.unpack(f'<{len(packed) // 4}f', packed)), record.get('embed_ms', 0.0)
+
+
+class CachedEmbeddings:
+    """Embeddings client whose ``embed_query`` is answered from the cache when it can be"""
+
+    def __init__(self, embeddings: Any, model_id: Optional[str] = None, tiers: Optional[List[Any]] = None,
+                 ttl_seconds: int = TTL_SECONDS):
+        self.embeddings = embeddings
+        self.model_id = model_id or getattr(embeddings, 'model_id', None) or type(embeddings).__name__
+        self.tiers = list(tiers) if tiers is not None else _default_tiers()
+        self.ttl_seconds = ttl_seconds
+        self._stats = {'hits': 0, 'misses': 0, 'ms_saved': 0.0}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: str):
+        for index, tier in enumerate(self.tiers):
+            try:
+                entry = tier.get(key)
+            except Exception as e:
+                logger.warning(f"Embedding cache {tier.name} lookup failed: {e}")
+                continue
+            if entry is not None:
+                data, expires_at = entry
+                self._fill(self.tiers[:index], key, data, expires_at)
+                return tier.name, data
+        return None, None
+
+    def _fill(self, tiers, key: str, data: bytes, expires_at: float):
+        for tier in tiers:
+            try:
+                tier.put(key, data, expires_at)
+            except Exception as e:
+                logger.warning(f"Embedding cache {tier.name} write failed: {e}")
+
+    def embed_query(self, text: str) -> List[float]:
+        key = embedding_key(self.model_id, text)
+        tier_name, data = self._lookup(key)
+        if data is not None:
+            vector, embed_ms = decode_vector(data)
+            metrics.increment(f"embedding_cache_hit_{tier_name}")
+            metrics.increment('embedding_ms_saved', embed_ms)
+            with self._lock:
+                self._stats['hits'] += 1
+                self._stats['ms_saved'] += embed_ms
+            return vector
+
+        start = time.perf_counter()
+        with metrics.span('embed_query'):
+            vector = self.embeddings.embed_query(text)
+        embed_ms = (time.perf_counter() - start) * 1000
+        metrics.increment('embedding_cache_miss')
+        with self._lock:
+            self._stats['misses'] += 1
+        self._fill(self.tiers, key, encode_vector(vector, embed_ms), time.time() + self.ttl_seconds)
+        return vector
+
+    # LangChain's FAISS calls non-``Embeddings`` objects as a function
+    __call__ = embed_query
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        stats['ms_saved'] = round(stats['ms_saved'], 1)
+        return stats
+
+
+def _default_tiers() -> List[Any]:
+    tiers: List[Any] = [MemoryTier(max_items=MEMORY_MAX_ITEMS)]
+    if DISK_DIR:
+        try:
+            tiers.append(DirectoryTier(DISK_DIR, max_bytes=DISK_MAX_BYTES))
+        except OSError as e:
+            logger.warning(f"Embedding cache disk tier unavailable: {e}")
+    return tiers
+
+
+def cached_embeddings(embeddings: Any, model_id: Optional[str] = None) -> Any:
+    """Wrap an embeddings client with the query cache, unless caching is disabled"""
+    if not ENABLED:
+        return embeddings
+    return CachedEmbeddings(embeddings, model_id=model_id)
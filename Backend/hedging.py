@@ -0,0 +1,167 @@
+"""
+Hedged Bedrock calls for tail latency.
+
+A few slow model responses dominate the p99 of a call like ``call_claude_3``.
+With hedging on (``BEDROCK_HEDGE_ENABLED=true``), a call that has not
+completed within a percentile of recent latency for the same model and
+prompt type (``BEDROCK_HEDGE_PERCENTILE``) is sent a second time. The first
+attempt to succeed wins; the other is abandoned. It keeps running in the
+background, because botocore calls cannot be cancelled, but its result is
+ignored.
+
+Duplicate calls cost tokens, so hedges are paid for from a budget. Every
+eligible call adds ``BEDROCK_HEDGE_BUDGET_RATIO`` of a hedge to it, up to
+``BEDROCK_HEDGE_BUDGET_BURST``, and every hedge spends one. The default
+ratio of 0.05 keeps extra spend at or below about 5% of calls. Hedge, win
+and budget-exhausted counts go to the request metrics.
+"""
+import collections
+import contextvars
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Hashable, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get('BEDROCK_HEDGE_ENABLED', 'false').lower() == 'true'
+PURPOSES = {
+    purpose.strip() for purpose in os.environ.get('BEDROCK_HEDGE_PURPOSES', '').split(',') if purpose.strip()
+}
+PERCENTILE = float(os.environ.get('BEDROCK_HEDGE_PERCENTILE', '95'))
+MIN_SAMPLES = int(os.environ.get('BEDROCK_HEDGE_MIN_SAMPLES', '20'))
+MIN_DELAY_MS = float(os.environ.get('BEDROCK_HEDGE_MIN_DELAY_MS', '500'))
+WINDOW = int(os.environ.get('BEDROCK_HEDGE_WINDOW', '200'))
+BUDGET_RATIO = float(os.environ.get('BEDROCK_HEDGE_BUDGET_RATIO', '0.05'))
+BUDGET_BURST = float(os.environ.get('BEDROCK_HEDGE_BUDGET_BURST', '2'))
+MAX_WORKERS = int(os.environ.get('BEDROCK_HEDGE_MAX_WORKERS', '16'))
+
+
+class LatencyTracker:
+    """Recent call latencies per key, for picking the hedge delay"""
+
+    def __init__(self, window: int = WINDOW):
+        self.window = window
+        self._samples: Dict[Hashable, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: Hashable, latency_ms: float):
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = collections.deque(maxlen=self.window)
+            samples.append(latency_ms)
+
+    def percentile(self, key: Hashable, percentile: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < MIN_SAMPLES:
+            return None
+        index = min(len(samples) - 1, max(0, math.ceil(percentile / 100 * len(samples)) - 1))
+        return samples[index]
+
+
+class HedgeBudget:
+    """Token bucket that caps hedges at a fraction of eligible calls"""
+
+    def __init__(self, ratio: float = BUDGET_RATIO, burst: float = BUDGET_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class Hedger:
+    def __init__(self, percentile: float = PERCENTILE, tracker: Optional[LatencyTracker] = None,
+                 budget: Optional[HedgeBudget] = None, max_workers: int = MAX_WORKERS):
+        self.percentile = percentile
+        self.tracker = tracker or LatencyTracker()
+        self.budget = budget or HedgeBudget()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bedrock-hedge')
+
+    def hedge_delay_ms(self, key: Hashable) -> Optional[float]:
+        delay = self.tracker.percentile(key, self.percentile)
+        return None if delay is None else max(delay, MIN_DELAY_MS)
+
+    def _submit(self, call: Callable[[], Any], key: Hashable):
+        def attempt():
+            start = time.perf_counter()
+            result = call()
+            self.tracker.record(key, (time.perf_counter() - start) * 1000)
+            return result
+        # Attempts run in the caller's context so metrics and usage still apply
+        context = contextvars.copy_context()
+        return self._executor.submit(context.run, attempt)
+
+    def call(self, call: Callable[[], Any], key: Hashable) -> Any:
+        """Run ``call``, hedging it once if it is slower than usual"""
+        delay_ms = self.hedge_delay_ms(key)
+        if delay_ms is None:
+            # Not enough history yet: run inline and learn from it
+            start = time.perf_counter()
+            result = call()
+            self.tracker.record(key, (time.perf_counter() - start) * 1000)
+            return result
+
+        metrics.increment('bedrock_hedge_eligible')
+        self.budget.deposit()
+        primary = self._submit(call, key)
+        done, _ = wait([primary], timeout=delay_ms / 1000)
+        if done:
+            return primary.result()
+
+        if not self.budget.try_spend():
+            metrics.increment('bedrock_hedge_budget_exhausted')
+            return primary.result()
+
+        metrics.increment('bedrock_hedges')
+        logger.info(f"Hedging {key} after {delay_ms:.0f} ms")
+        hedge = self._submit(call, key)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                if future is hedge:
+                    metrics.increment('bedrock_hedge_wins')
+                return future.result()
+        raise error
+
+
+_hedger: Optional[Hedger] = None
+_hedger_lock = threading.Lock()
+
+
+def get_hedger() -> Hedger:
+    global _hedger
+    if _hedger is None:
+        with _hedger_lock:
+            if _hedger is None:
+                _hedger = Hedger()
+    return _hedger
+
+
+def call(fn: Callable[[], Any], model_id: str, purpose: Optional[str] = None) -> Any:
+    """Run a model call, hedged when enabled for its prompt type"""
+    if not ENABLED or (PURPOSES and purpose not in PURPOSES):
+        return fn()
+    return get_hedger().call(fn, (model_id, purpose))
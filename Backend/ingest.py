@@ -0,0 +1,326 @@
+"""
+Incremental ingestion of the Well-Architected source documents into ``local_index``.
+
+    python ingest.py sources/ --out local_index [--state local_index.ingest] [--dtype float16]
+
+Each source document (PDF, Markdown or text) is split page by page into
+overlapping chunks of about ``--chunk-size`` characters. Chunks are keyed by
+the SHA-256 of their whitespace-normalized text:
+
+- identical chunks (repeated boilerplate, the same page in two documents) are
+  indexed once;
+- the state directory keeps the embedding of every chunk seen so far, per
+  embedding model, so a rebuild embeds only chunks whose text is new;
+- files whose content hash is unchanged are not parsed again.
+
+Chunking restarts at every page, so an edit to one page changes only that
+page's chunks. New chunks are embedded in batches of ``--batch-size``, with
+``--workers`` batches in flight. The state is saved after each batch, so an
+interrupted run resumes where it stopped.
+
+The output is an ``mmap_index`` plus the BM25 ``lexical_index``, in the same
+chunk order. The manifest records ``index_version``, a digest of the
+embedding model and the ordered chunk hashes. It changes exactly when search
+results can change.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import mmap_index
+from embedding_backends import DEFAULT_MODEL, backend_for
+from lexical_index import LexicalIndex
+
+logger = logging.getLogger(__name__)
+
+STATE_FORMAT = 'smile-ingest-state'
+STATE_VERSION = 1
+FILES_STATE = 'files.json'
+VECTORS_STATE = 'vectors.f32'
+ROWS_STATE = 'rows.json'
+SOURCE_EXTENSIONS = ('.pdf', '.md', '.txt')
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+# Split on the coarsest boundary that brings pieces under the chunk size
+_SEPARATORS = ('\n\n', '\n', '. ', ' ')
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(re.sub(r'\s+', ' ', text).strip().encode('utf-8')).hexdigest()
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_pages(path: str) -> List[Tuple[Optional[int], str]]:
+    """(page number, text) for each page; text files split into pages on form feeds"""
+    if path.lower().endswith('.pdf'):
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            logger.error("Reading PDFs needs pypdf (pip install pypdf)")
+            raise
+        return [(number, page.extract_text() or '') for number, page in enumerate(PdfReader(path).pages)]
+    with open(path, 'r', encoding='utf-8') as f:
+        pages = f.read().split('\f')
+    return [(number if len(pages) > 1 else None, text) for number, text in enumerate(pages)]
+
+
+def _split(text: str, size: int, separators: Sequence[str]) -> List[str]:
+    if len(text) <= size:
+        return [text]
+    for position, separator in enumerate(separators):
+        if separator in text:
+            parts = text.split(separator)
+            pieces = []
+            for part in [part + separator for part in parts[:-1]] + parts[-1:]:
+                pieces.extend(_split(part, size, separators[position + 1:]))
+            return pieces
+    return [text[start:start + size] for start in range(0, len(text), size)]
+
+
+def chunk_text(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """Greedily pack paragraph/line/sentence pieces into chunks of at most ``size`` characters"""
+    chunks: List[str] = []
+    current: List[str] = []
+    length = 0
+    for piece in _split(text, size, _SEPARATORS):
+        if current and length + len(piece) > size:
+            chunks.append(''.join(current).strip())
+            # Carry the last pieces (up to ``overlap`` characters) into the next chunk
+            carried: List[str] = []
+            for previous in reversed(current):
+                if sum(map(len, carried)) + len(previous) > overlap:
+                    break
+                carried.insert(0, previous)
+            current, length = carried, sum(map(len, carried))
+        current.append(piece)
+        length += len(piece)
+    if current:
+        chunks.append(''.join(current).strip())
+    return [chunk for chunk in chunks if chunk]
+
+
+def discover(source: str) -> List[str]:
+    """Source documents under ``source`` (a file or a directory), in a stable order"""
+    if os.path.isfile(source):
+        return [source]
+    found = []
+    for root, _, names in os.walk(source):
+        found.extend(os.path.join(root, name) for name in names if name.lower().endswith(SOURCE_EXTENSIONS))
+    return sorted(found)
+
+
+def _model_dir(state_dir: str, model_id: str) -> str:
+    return os.path.join(state_dir, re.sub(r'[^A-Za-z0-9_.-]', '_', model_id))
+
+
+def _write_json(path: str, data: Any):
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(f"{path}.tmp", path)
+
+
+class EmbeddingStore:
+    """Append-only float32 vectors for one embedding model, keyed by chunk hash"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        rows_path = os.path.join(path, ROWS_STATE)
+        self.rows: Dict[str, int] = {}
+        self.dim: Optional[int] = None
+        if os.path.exists(rows_path):
+            with open(rows_path, 'r') as f:
+                state = json.load(f)
+            self.rows, self.dim = state['rows'], state['dim']
+        # Drop rows appended after the last saved checkpoint
+        with open(os.path.join(path, VECTORS_STATE), 'ab') as f:
+            f.truncate(len(self.rows) * (self.dim or 0) * 4)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.rows
+
+    def add(self, keys: Sequence[str], vectors: Sequence[Sequence[float]]):
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = int(matrix.shape[1])
+        elif matrix.shape[1] != self.dim:
+            raise ValueError(f"Embedding has {matrix.shape[1]} dimensions, the store has {self.dim}")
+        with open(os.path.join(self.path, VECTORS_STATE), 'ab') as f:
+            f.write(matrix.tobytes())
+        for key in keys:
+            self.rows[key] = len(self.rows)
+        _write_json(os.path.join(self.path, ROWS_STATE), {'dim': self.dim, 'rows': self.rows})
+
+    def vectors(self, keys: Sequence[str]) -> np.ndarray:
+        if not keys:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        matrix = np.fromfile(os.path.join(self.path, VECTORS_STATE), dtype=np.float32).reshape(-1, self.dim)
+        return matrix[[self.rows[key] for key in keys]]
+
+
+def load_chunks(paths: Sequence[str], base: str, state_dir: str, size: int,
+                overlap: int) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """Chunk every source file, reusing the chunks of files whose content is unchanged"""
+    files_path = os.path.join(state_dir, FILES_STATE)
+    previous: Dict[str, Any] = {}
+    if os.path.exists(files_path):
+        with open(files_path, 'r') as f:
+            state = json.load(f)
+        if state.get('format') == STATE_FORMAT and state.get('chunking') == [size, overlap]:
+            previous = state['files']
+
+    files: Dict[str, Any] = {}
+    counts = {'files_parsed': 0, 'files_reused': 0}
+    for path in paths:
+        name = os.path.relpath(path, base) if os.path.isdir(base) else os.path.basename(path)
+        digest = file_hash(path)
+        if previous.get(name, {}).get('sha256') == digest:
+            files[name] = previous[name]
+            counts['files_reused'] += 1
+            continue
+        chunks = [
+            [page, text]
+            for page, page_text in read_pages(path)
+            for text in chunk_text(page_text, size, overlap)
+        ]
+        files[name] = {'sha256': digest, 'chunks': chunks}
+        counts['files_parsed'] += 1
+        logger.info(f"Chunked {name}: {len(chunks)} chunks")
+    os.makedirs(state_dir, exist_ok=True)
+    _write_json(files_path, {
+        'format': STATE_FORMAT, 'version': STATE_VERSION, 'chunking': [size, overlap], 'files': files,
+    })
+
+    records = []
+    for name in sorted(files):
+        for page, text in files[name]['chunks']:
+            metadata: Dict[str, Any] = {'source': name}
+            if page is not None:
+                metadata['page'] = page
+            records.append({'text': text, 'metadata': metadata})
+    return records, counts
+
+
+def embed_missing(store: EmbeddingStore, texts: Dict[str, str], embeddings: Any, batch_size: int,
+                  workers: int) -> int:
+    """Embed the texts whose hash is not in the store yet; returns how many were embedded"""
+    missing = [key for key in texts if key not in store]
+    batches = [missing[start:start + batch_size] for start in range(0, len(missing), batch_size)]
+    if not batches:
+        return 0
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ingest-embed') as executor:
+        futures = {
+            executor.submit(embeddings.embed_documents, [texts[key] for key in batch]): batch
+            for batch in batches
+        }
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                vectors = future.result()
+            except Exception as e:
+                logger.error(f"Embedding a batch of {len(batch)} chunks failed: {e}")
+                raise
+            store.add(batch, vectors)
+            done += len(batch)
+            logger.info(f"Embedded {done}/{len(missing)} new chunks")
+    return done
+
+
+def index_version(model_id: str, keys: Sequence[str]) -> str:
+    digest = hashlib.sha256(model_id.encode('utf-8'))
+    for key in keys:
+        digest.update(bytes.fromhex(key))
+    return digest.hexdigest()[:16]
+
+
+def ingest(source: str, out_dir: str, state_dir: Optional[str] = None, model_id: str = DEFAULT_MODEL,
+           embeddings: Any = None, dtype: str = 'float16', size: int = CHUNK_SIZE,
+           overlap: int = CHUNK_OVERLAP, batch_size: int = 16, workers: int = 4) -> Dict[str, Any]:
+    """Build ``out_dir`` from the documents under ``source``; returns the build report"""
+    start = time.perf_counter()
+    state_dir = state_dir or f"{out_dir.rstrip(os.sep)}.ingest"
+    paths = discover(source)
+    if not paths:
+        raise FileNotFoundError(f"No {', '.join(SOURCE_EXTENSIONS)} documents under {source}")
+    records, report = load_chunks(paths, source, state_dir, size, overlap)
+
+    # One index entry per distinct chunk text, at its first occurrence
+    unique: Dict[str, Dict[str, Any]] = {}
+    for record in records:
+        unique.setdefault(content_hash(record['text']), record)
+    keys = list(unique)
+
+    store = EmbeddingStore(_model_dir(state_dir, model_id))
+    embedded = embed_missing(
+        store, {key: unique[key]['text'] for key in keys},
+        embeddings if embeddings is not None else backend_for(model_id), batch_size, workers,
+    )
+
+    previous_keys: List[str] = []
+    ingest_path = os.path.join(out_dir, 'ingest.json')
+    if os.path.exists(ingest_path):
+        with open(ingest_path, 'r') as f:
+            previous_keys = json.load(f).get('chunks', [])
+    version = index_version(model_id, keys)
+    texts = [unique[key]['text'] for key in keys]
+    report.update({
+        'index_version': version,
+        'chunks': len(keys),
+        'duplicates_dropped': len(records) - len(keys),
+        'embedded': embedded,
+        'reused': len(keys) - embedded,
+        'added': len(set(keys) - set(previous_keys)),
+        'removed': len(set(previous_keys) - set(keys)),
+    })
+    mmap_index.write_index(
+        out_dir, texts, [unique[key]['metadata'] for key in keys], store.vectors(keys),
+        dtype=dtype, embedding_model=model_id, extra={'index_version': version},
+    )
+    LexicalIndex.build(texts).save(out_dir)
+    _write_json(ingest_path, {'index_version': version, 'chunks': keys})
+    report['seconds'] = round(time.perf_counter() - start, 2)
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Chunk, embed and index the Well-Architected documents")
+    parser.add_argument('source', help="A document or a directory of .pdf/.md/.txt documents")
+    parser.add_argument('--out', default='local_index', help="Index directory to write")
+    parser.add_argument('--state', help="Ingest state directory (default: <out>.ingest)")
+    parser.add_argument('--embedding-model', default=DEFAULT_MODEL,
+                        help="Bedrock model ID, or local-hashing-<dim> to embed offline")
+    parser.add_argument('--dtype', choices=('float32', 'float16', 'int8'), default='float16')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--chunk-overlap', type=int, default=CHUNK_OVERLAP)
+    parser.add_argument('--batch-size', type=int, default=16, help="Chunks per embedding call")
+    parser.add_argument('--workers', type=int, default=4, help="Embedding batches in flight")
+    args = parser.parse_args(argv)
+
+    report = ingest(
+        args.source, args.out, args.state, args.embedding_model, dtype=args.dtype,
+        size=args.chunk_size, overlap=args.chunk_overlap, batch_size=args.batch_size, workers=args.workers,
+    )
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,217 @@
+"""
+Asynchronous tool jobs with result polling.
+
+A diagram request can take long enough that holding a synchronous invoke open
+for it is wasteful. Instead a client submits ``{"async": true, "tool_type":
+..., "query": ...}`` and gets a job ID back at once; the work runs in a second,
+asynchronous invocation of the same function (``InvocationType='Event'``), or
+in a background thread when running locally. The job record, including the
+tool's result, is written to an object store, and ``{"job_id": ...}`` returns
+it as it stands without re-running anything.
+
+Job records live in S3 when ``JOB_BUCKET_NAME`` is set, otherwise in a local
+directory (``JOB_STORE_DIR``) with the same layout, which is enough for local
+runs and tests where submit and poll hit the same process.
+
+A self-invoked job runs in whichever container picks up the event, so its
+record must go to the shared S3 store. ``JOB_DISPATCH`` therefore defaults to
+``lambda`` only on Lambda with ``JOB_BUCKET_NAME`` set, and ``submit`` refuses
+``JOB_DISPATCH=lambda`` without a bucket rather than lose the result in
+another container's ``/tmp``.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_BUCKET_NAME = os.environ.get('JOB_BUCKET_NAME')
+JOB_PREFIX = os.environ.get('JOB_PREFIX', 'smile-agent-jobs')
+JOB_STORE_DIR = os.environ.get('JOB_STORE_DIR', '/tmp/jobs')
+# 'lambda' self-invokes asynchronously, 'thread' runs in this process
+JOB_DISPATCH = os.environ.get(
+    'JOB_DISPATCH',
+    'lambda' if os.environ.get('AWS_LAMBDA_FUNCTION_NAME') and JOB_BUCKET_NAME else 'thread'
+)
+
+PENDING = 'pending'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+FINISHED = (SUCCEEDED, FAILED)
+
+
+class JobNotFoundError(KeyError):
+    """Raised when polling for a job ID the store does not know"""
+
+    def __str__(self):
+        return f"Unknown job: {self.args[0]}"
+
+
+class JobConfigError(RuntimeError):
+    """Raised when a job would run where its result cannot be polled"""
+
+
+class S3JobStore:
+    """Job records as JSON objects under ``s3://bucket/prefix/``"""
+
+    def __init__(self, bucket: str, prefix: str = JOB_PREFIX):
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self._s3 = boto3.client('s3')
+
+    def _key(self, job_id: str) -> str:
+        return f"{self.prefix}/{job_id}.json"
+
+    def put(self, record: Dict[str, Any]):
+        self._s3.put_object(
+            Bucket=self.bucket,
+            Key=self._key(record['job_id']),
+            Body=json.dumps(record).encode('utf-8'),
+            ContentType='application/json'
+        )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            response = self._s3.get_object(Bucket=self.bucket, Key=self._key(job_id))
+        except self._s3.exceptions.NoSuchKey:
+            return None
+        return json.loads(response['Body'].read())
+
+
+class LocalJobStore:
+    """Filesystem stand-in for ``S3JobStore`` with the same key layout"""
+
+    def __init__(self, root: str = JOB_STORE_DIR, prefix: str = JOB_PREFIX):
+        self.root = os.path.join(root, prefix.strip('/'))
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.root, f"{job_id}.json")
+
+    def put(self, record: Dict[str, Any]):
+        path = self._path(record['job_id'])
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(record, f)
+        # Readers never see a half-written record
+        os.replace(temp_path, path)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(job_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_job_store():
+    """Process-wide job store, S3 when a bucket is configured"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = S3JobStore(JOB_BUCKET_NAME) if JOB_BUCKET_NAME else LocalJobStore()
+    return _store
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _valid_job_id(job_id: Any) -> bool:
+    try:
+        return uuid.UUID(str(job_id)).hex == job_id
+    except ValueError:
+        return False
+
+
+def _dispatch_lambda(job: Dict[str, Any], context):
+    import boto3
+
+    function_name = getattr(context, 'invoked_function_arn', None) or os.environ['AWS_LAMBDA_FUNCTION_NAME']
+    boto3.client('lambda').invoke(
+        FunctionName=function_name,
+        InvocationType='Event',
+        Payload=json.dumps({'job': job}).encode('utf-8')
+    )
+
+
+def _dispatch_thread(job: Dict[str, Any], worker: Callable):
+    # New threads start with an empty context, so the job gets its own metrics
+    thread = threading.Thread(target=worker, args=(job, None), name=f"job-{job['job_id']}")
+    thread.start()
+
+
+def submit(tool_type: str, query: str, worker: Callable, context=None, no_cache: bool = False) -> Dict[str, Any]:
+    """Record a pending job and start it in the background; ``no_cache`` travels with the job"""
+    if JOB_DISPATCH == 'lambda' and not JOB_BUCKET_NAME:
+        raise JobConfigError("JOB_DISPATCH=lambda needs JOB_BUCKET_NAME, or results land in another container")
+    job_id = uuid.uuid4().hex
+    record = {
+        'job_id': job_id,
+        'status': PENDING,
+        'tool_type': tool_type,
+        'submitted_at': _now_ms(),
+    }
+    get_job_store().put(record)
+
+    job = {'job_id': job_id, 'tool_type': tool_type, 'query': query, 'no_cache': bool(no_cache)}
+    try:
+        if JOB_DISPATCH == 'lambda':
+            _dispatch_lambda(job, context)
+        else:
+            _dispatch_thread(job, worker)
+    except Exception as e:
+        logger.error(f"Failed to dispatch job {job_id}: {e}")
+        record.update(status=FAILED, finished_at=_now_ms(), error=f"Failed to start job: {e}")
+        get_job_store().put(record)
+        raise
+
+    logger.info(f"Submitted {tool_type} job {job_id} via {JOB_DISPATCH}")
+    return record
+
+
+def run_job(job: Dict[str, Any], run_tool: Callable[[str, str], Dict[str, Any]]) -> Dict[str, Any]:
+    """Execute a submitted job and store its result"""
+    store = get_job_store()
+    job_id = job['job_id']
+    record = store.get(job_id) or {
+        'job_id': job_id,
+        'tool_type': job['tool_type'],
+        'submitted_at': _now_ms(),
+    }
+    # Asynchronous invokes can be retried; never redo finished work
+    if record.get('status') in FINISHED:
+        logger.info(f"Job {job_id} already {record['status']}, skipping")
+        return record
+
+    record.update(status=RUNNING, started_at=_now_ms())
+    store.put(record)
+    try:
+        result = run_tool(job['tool_type'], job['query'])
+        record.update(status=SUCCEEDED, result=result)
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {str(e)}")
+        record.update(status=FAILED, error=str(e))
+    record['finished_at'] = _now_ms()
+    store.put(record)
+    return record
+
+
+def get_job(job_id: str) -> Dict[str, Any]:
+    """Current record for a job, including the result once it has finished"""
+    record = get_job_store().get(job_id) if _valid_job_id(job_id) else None
+    if record is None:
+        raise JobNotFoundError(job_id)
+    return record
@@ -1,231 +1,247 @@
 import json
-import os
 import logging
-import uuid
-from claude3_tools import (
-    aws_well_arch_tool,
-    code_gen_tool,
-    diagram_tool,
-    pil_to_base64,
-    gen_image_caption
-)
+import time
+
+import batch
+import jobs
+import llm_cache
+import metrics
+import structured_log
+import tools
+import usage
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
+log = structured_log.get_logger(__name__)
+
+_INIT_START = time.perf_counter()
+_reported_tools = set()
 
-# Set environment variables
-os.environ['DIAGRAMS_OUTPUT_DIR'] = '/tmp'
-
-os.makedirs('/tmp', exist_ok=True)
-os.chmod('/tmp', 0o777)
-
-def scan_aws_services():
-    """
-    Scans the installed diagrams library for all available AWS services
-    """
-    from diagrams.aws import (
-        analytics,
-        compute,
-        database,
-        network,
-        security,
-        storage,
-        integration
+
+def _log_init_report(tool_type):
+    """Log what loading a tool cost the first time this container uses it"""
+    if tool_type in _reported_tools:
+        return
+    _reported_tools.add(tool_type)
+    logger.info(
+        f"Init report after first {tool_type} request "
+        f"(container age {(time.perf_counter() - _INIT_START) * 1000:.0f} ms): "
+        f"{json.dumps(tools.init_report())}"
     )
-    
-    modules_to_scan = {
-        'analytics': analytics,
-        'compute': compute,
-        'database': database,
-        'network': network,
-        'security': security,
-        'storage': storage,
-        'integration': integration
+
+
+def _json_response(status_code, payload):
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps(payload)
     }
-    
-    service_mapping = {}
-    
-    for module_name, module in modules_to_scan.items():
-        try:
-            # Get all classes in the module
-            classes = [attr for attr in dir(module) 
-                      if not attr.startswith('_')]
-            
-            for class_name in classes:
-                service_mapping[class_name] = module_name
-                print(f"Found service: {class_name} in {module_name}")
-                
-        except Exception as e:
-            print(f"Error scanning module {module_name}: {str(e)}")
-    
-    return service_mapping
-
-def test_available_services():
-    """
-    Tests which services can actually be imported and used
-    """
-    import importlib
-    
-    service_mapping = scan_aws_services()
-    verified_services = {}
-    
-    for service, module in service_mapping.items():
+
+
+def _handle_warmup(event):
+    """Load tool dependencies ahead of real traffic, e.g. from a scheduled ping"""
+    requested = event.get('tools') or list(tools.TOOL_MODULES)
+    warmed = []
+    errors = {}
+    for tool_type in requested:
         try:
-            # Try to import and instantiate the service
-            module_path = f"diagrams.aws.{module}"
-            mod = importlib.import_module(module_path)
-            service_class = getattr(mod, service)
-            
-            # Try to create an instance (this will fail if the service isn't properly implemented)
-            _ = service_class("test")
-            
-            # If we get here, the service is available
-            verified_services[service] = module
-            print(f"Verified service: {service} in module {module}")
-            
+            tools.load_tool(tool_type).warm()
+            warmed.append(tool_type)
         except Exception as e:
-            print(f"Service {service} from {module} is not usable: {str(e)}")
-    
-    return verified_services
+            logger.warning(f"Failed to warm {tool_type}: {e}")
+            errors[tool_type] = str(e)
+
+    return _json_response(200, {
+        'success': not errors,
+        'warmed': warmed,
+        'errors': errors,
+        'init': tools.init_report()
+    })
+
+
+def _run_tool(tool_type, query):
+    """Dispatch a single query to its tool and return the response data"""
+    tool = tools.load_tool(tool_type)
+    with usage.tool_scope(tool_type), metrics.span('tool'):
+        response_data = tool.run(query)
+    _log_init_report(tool_type)
+    return response_data
+
+
+def _handle_batch(body, context):
+    """Run a batch of {tool_type, query} items concurrently"""
+    metrics.set_tool('batch')
+    try:
+        results = batch.run_batch(
+            body.get('batch'),
+            _run_tool,
+            context=context,
+            max_workers=body.get('max_concurrency'),
+            item_timeout_ms=body.get('item_timeout_ms')
+        )
+    except batch.BatchValidationError as e:
+        return _json_response(400, {
+            'success': False,
+            'message': str(e)
+        })
+
+    summary = batch.summarize(results)
+    log.info("Batch finished", summary=summary)
+    return _json_response(200, {
+        'success': True,
+        'type': 'batch',
+        'data': {
+            'results': results,
+            'summary': summary
+        },
+        'usage': usage.summary()
+    })
+
+
+def _submit_job(body, context):
+    """Start a tool request in the background and return its job ID at once"""
+    tool_type = body.get('tool_type')
+    query = body.get('query')
+    if not tool_type or not query:
+        return _json_response(400, {
+            'success': False,
+            'message': 'Missing required parameters: tool_type and query'
+        })
+    if tool_type not in tools.TOOL_MODULES:
+        return _json_response(400, {
+            'success': False,
+            'message': f'Unknown tool type: {tool_type}'
+        })
+
+    metrics.set_tool(tool_type)
+    metrics.set_property('Async', True)
+    record = jobs.submit(tool_type, query, _handle_job, context, no_cache=body.get('no_cache', False))
+    return _json_response(202, {'success': True, 'type': 'job', 'data': record})
+
+
+def _get_job(job_id):
+    """Return a job's status, and its result once finished"""
+    metrics.set_tool('job_status')
+    try:
+        record = jobs.get_job(job_id)
+    except jobs.JobNotFoundError as e:
+        return _json_response(404, {'success': False, 'message': str(e)})
+    return _json_response(200, {'success': True, 'type': 'job', 'data': record})
+
+
+def _run_tool_with_usage(tool_type, query):
+    return {**_run_tool(tool_type, query), 'usage': usage.summary()}
+
+
+def _handle_job(job, context):
+    """Run a submitted job; invoked asynchronously or from a local thread"""
+    request_metrics = metrics.start_request(
+        tool=job.get('tool_type'),
+        request_id=getattr(context, 'aws_request_id', None)
+    )
+    metrics.set_property('Async', True)
+    metrics.set_property('JobId', job.get('job_id'))
+    structured_log.begin_request(job.get('job_id'))
+    usage.start_request()
+    llm_cache.set_bypass(job.get('no_cache', False))
+    try:
+        record = jobs.run_job(job, _run_tool_with_usage)
+        metrics.set_property('JobStatus', record['status'])
+        return {'job_id': record['job_id'], 'status': record['status']}
+    finally:
+        structured_log.end_request()
+        metrics.emit(request_metrics)
+
 
 def handler(event, context):
     """Main Lambda handler"""
+    # A warm container keeps the previous request's flag; requests opt back in with "no_cache"
+    llm_cache.set_bypass(False)
+    if event.get('warmup'):
+        return _handle_warmup(event)
+    if 'job' in event:
+        return _handle_job(event['job'], context)
+
+    request_id = getattr(context, 'aws_request_id', None)
+    request_metrics = metrics.start_request(request_id=request_id)
+    structured_log.begin_request(request_id)
+    usage.start_request()
     try:
-        # Add this temporarily
-        print("Starting service scan...")
-        verified_services = test_available_services()
-        print("Complete verified services mapping:", verified_services)
-        
-        # Original handler code continues...
-        logger.info(f"Received event: {json.dumps(event)}")
+        response = _handle_request(event, context)
+        metrics.set_property('StatusCode', response['statusCode'])
+        metrics.record_size('response', response['body'])
+        return response
+    finally:
+        structured_log.end_request()
+        metrics.emit(request_metrics)
+
+
+def _handle_request(event, context):
+    try:
+        log.debug("Received event", event=event)
         
         # Parse the request body
         if isinstance(event.get('body'), str):
             body = json.loads(event['body'])
         else:
             body = event.get('body', {})
+
+        # "no_cache": true skips cached model responses for this request
+        llm_cache.set_bypass(body.get('no_cache', False))
+
+        if 'batch' in body:
+            return _handle_batch(body, context)
+        if 'job_id' in body:
+            return _get_job(body['job_id'])
+        if body.get('async'):
+            return _submit_job(body, context)
             
         tool_type = body.get('tool_type')
         query = body.get('query')
         
         
-        # Log parsed data
-        logger.info(f"Tool Type: {tool_type}")
-        logger.info(f"Query: {query}")
+        log.info("Request", tool_type=tool_type, query=query)
         
         # Validate input
         if not tool_type or not query:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'success': False,
-                    'message': 'Missing required parameters: tool_type and query'
-                })
-            }
+            return _json_response(400, {
+                'success': False,
+                'message': 'Missing required parameters: tool_type and query'
+            })
             
         # Process based on tool type
+        metrics.set_tool(tool_type)
         try:
-            if tool_type == "AWS Well Architected Tool":
-                result = aws_well_arch_tool(query)
-                response_data = {
-                    'success': True,
-                    'type': 'well-arch',
-                    'data': {
-                        'answer': result['ans'],
-                        'resources': result['docs'].split('\n')
-                    }
-                }
-                
-            elif tool_type == "Diagram Tool":
-                # Create unique temp directory for this request
-                temp_dir = f"/tmp/diagram_{uuid.uuid4()}"
-                os.makedirs(temp_dir, exist_ok=True)
-                os.environ['DIAGRAMS_OUTPUT_DIR'] = temp_dir
-                
-                try:
-                    image = diagram_tool(query)
-                    if image:
-                        image_base64 = pil_to_base64(image)
-                        caption = gen_image_caption(image_base64)
-                        response_data = {
-                            'success': True,
-                            'type': 'diagram',
-                            'data': {
-                                'image': image_base64,
-                                'caption': caption
-                            }
-                        }
-                    else:
-                        raise Exception("Failed to generate diagram")
-                finally:
-                    # Cleanup temp directory
-                    import shutil
-                    try:
-                        shutil.rmtree(temp_dir)
-                    except Exception as e:
-                        logger.warning(f"Failed to cleanup temp directory: {e}")
-                    
-            elif tool_type == "Code Gen Tool":
-                code = code_gen_tool(query)
-                response_data = {
-                    'success': True,
-                    'type': 'code',
-                    'data': {
-                        'code': code
-                    }
-                }
-                
-            else:
-                return {
-                    'statusCode': 400,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({
-                        'success': False,
-                        'message': f'Unknown tool type: {tool_type}'
-                    })
-                }
-                
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps(response_data)
-            }
+            try:
+                response_data = _run_tool_with_usage(tool_type, query)
+            except tools.UnknownToolError:
+                return _json_response(400, {
+                    'success': False,
+                    'message': f'Unknown tool type: {tool_type}'
+                })
+            except tools.InvalidQueryError as e:
+                return _json_response(400, {
+                    'success': False,
+                    'message': str(e)
+                })
+
+            with metrics.span('serialize'):
+                return _json_response(200, response_data)
             
         except Exception as e:
             logger.error(f"Error processing {tool_type} request: {str(e)}")
-            return {
-                'statusCode': 500,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'success': False,
-                    'message': f'Error processing request: {str(e)}'
-                })
-            }
+            return _json_response(500, {
+                'success': False,
+                'message': f'Error processing request: {str(e)}'
+            })
             
     except Exception as e:
         logger.error(f"Error processing request: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'success': False,
-                'message': f'Internal server error: {str(e)}'
-            })
-        }
\ No newline at end of file
+        return _json_response(500, {
+            'success': False,
+            'message': f'Internal server error: {str(e)}'
+        })
\ No newline at end of file
@@ -0,0 +1,225 @@
+"""
+BM25 inverted index over the Well-Architected chunks.
+
+Keyword-heavy questions ("REL09-BP03", "S3 Object Lock") are answered better
+by exact term matching than by dense embeddings, and need no embedding call
+at all. The index covers the same chunks, in the same order, as
+``local_index``, so chunk ``i`` here is vector ``i`` there. It is prebuilt
+into the index directory:
+
+- ``bm25.json``: parameters, document lengths and ``term -> [offset, df]``;
+- ``bm25_postings.bin``: ``(doc, tf)`` rows grouped by term, memory-mapped.
+
+Build it with:
+
+    python lexical_index.py build local_index
+
+Terms are lowercased alphanumeric runs. Compound identifiers like
+``rel09-bp03`` are indexed both whole and as their parts.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import re
+import sys
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT = 'smile-bm25'
+FORMAT_VERSION = 1
+TERMS_FILE = 'bm25.json'
+POSTINGS_FILE = 'bm25_postings.bin'
+POSTING_DTYPE = np.dtype([('doc', '<u4'), ('tf', '<u2')])
+K1 = 1.2
+B = 0.75
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'do', 'does', 'for', 'from', 'how', 'i',
+    'in', 'is', 'it', 'my', 'of', 'on', 'or', 'should', 'that', 'the', 'this', 'to', 'we', 'what',
+    'when', 'which', 'with', 'you', 'your',
+}
+_TOKEN_RE = re.compile(r'[a-z0-9]+(?:[-_./][a-z0-9]+)*')
+# Best-practice and question IDs, e.g. rel09-bp03, sec11
+_IDENTIFIER_RE = re.compile(r'^(?=.*\d)(?=.*[a-z])[a-z0-9]+(?:-[a-z0-9]+)*$')
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for match in _TOKEN_RE.findall(text.lower()):
+        parts = re.split(r'[-_./]', match)
+        if len(parts) > 1:
+            tokens.append(match)
+        tokens.extend(part for part in parts if part not in STOPWORDS)
+    return tokens
+
+
+def is_identifier(term: str) -> bool:
+    return '-' in term and bool(_IDENTIFIER_RE.match(term))
+
+
+def has_lexical_index(path: str) -> bool:
+    return os.path.exists(os.path.join(path, TERMS_FILE))
+
+
+class LexicalIndex:
+    """BM25 scoring over prebuilt postings"""
+
+    def __init__(self, terms: Dict[str, List[int]], postings: np.ndarray, doc_lengths: Sequence[int],
+                 k1: float = K1, b: float = B):
+        self.terms = terms
+        self.postings = postings
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.float32)
+        self.count = len(self.doc_lengths)
+        self.avgdl = float(self.doc_lengths.mean()) if self.count else 0.0
+        self.k1 = k1
+        self.b = b
+        self._length_norm = k1 * (1 - b + b * self.doc_lengths / max(self.avgdl, 1.0))
+
+    @classmethod
+    def build(cls, texts: Sequence[str], k1: float = K1, b: float = B) -> 'LexicalIndex':
+        term_postings: Dict[str, List[Tuple[int, int]]] = {}
+        doc_lengths = []
+        for doc, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                term_postings.setdefault(term, []).append((doc, min(tf, 65535)))
+
+        terms: Dict[str, List[int]] = {}
+        postings = np.zeros(sum(len(rows) for rows in term_postings.values()), dtype=POSTING_DTYPE)
+        offset = 0
+        for term in sorted(term_postings):
+            rows = term_postings[term]
+            postings[offset:offset + len(rows)] = rows
+            terms[term] = [offset, len(rows)]
+            offset += len(rows)
+        return cls(terms, postings, doc_lengths, k1, b)
+
+    @classmethod
+    def load(cls, path: str) -> 'LexicalIndex':
+        with open(os.path.join(path, TERMS_FILE), 'r') as f:
+            header = json.load(f)
+        if header.get('format') != FORMAT or header.get('version') != FORMAT_VERSION:
+            raise ValueError(f"{path} has no version {FORMAT_VERSION} {FORMAT} index")
+        postings_path = os.path.join(path, POSTINGS_FILE)
+        postings = (
+            np.memmap(postings_path, dtype=POSTING_DTYPE, mode='r')
+            if os.path.getsize(postings_path) else np.zeros(0, dtype=POSTING_DTYPE)
+        )
+        return cls(header['terms'], postings, header['doc_lengths'], header['k1'], header['b'])
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        postings_path = os.path.join(path, POSTINGS_FILE)
+        with open(f"{postings_path}.tmp", 'wb') as f:
+            f.write(np.ascontiguousarray(self.postings).tobytes())
+        os.replace(f"{postings_path}.tmp", postings_path)
+        header = {
+            'format': FORMAT,
+            'version': FORMAT_VERSION,
+            'k1': self.k1,
+            'b': self.b,
+            'count': self.count,
+            'doc_lengths': [int(length) for length in self.doc_lengths],
+            'terms': self.terms,
+        }
+        terms_path = os.path.join(path, TERMS_FILE)
+        with open(f"{terms_path}.tmp", 'w') as f:
+            json.dump(header, f, separators=(',', ':'))
+        os.replace(f"{terms_path}.tmp", terms_path)
+
+    def idf(self, term: str) -> float:
+        df = self.terms[term][1] if term in self.terms else 0
+        return math.log(1 + (self.count - df + 0.5) / (df + 0.5))
+
+    def scores(self, query_terms: Sequence[str]) -> np.ndarray:
+        scores = np.zeros(self.count, dtype=np.float32)
+        for term, weight in Counter(query_terms).items():
+            if term not in self.terms:
+                continue
+            offset, df = self.terms[term]
+            rows = self.postings[offset:offset + df]
+            docs = rows['doc'].astype(np.int64)
+            tf = rows['tf'].astype(np.float32)
+            scores[docs] += weight * self.idf(term) * tf * (self.k1 + 1) / (tf + self._length_norm[docs])
+        return scores
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[int, float]]:
+        """Best ``k`` (chunk index, BM25 score) pairs with a non-zero score"""
+        scores = self.scores(tokenize(query))
+        k = min(k, int(np.count_nonzero(scores)))
+        if k <= 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [(int(i), float(scores[i])) for i in best]
+
+    def coverage(self, query: str, doc: int) -> float:
+        """IDF-weighted share of the query's terms that appear in chunk ``doc``"""
+        total = matched = 0.0
+        for term in set(tokenize(query)):
+            weight = self.idf(term)
+            total += weight
+            if term in self.terms:
+                offset, df = self.terms[term]
+                docs = self.postings[offset:offset + df]['doc']
+                position = int(np.searchsorted(docs, doc))
+                if position < df and docs[position] == doc:
+                    matched += weight
+        return matched / total if total else 0.0
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """Fuse ranked lists of chunk indexes; each list adds 1 / (k + rank)"""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            fused[doc] = fused.get(doc, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def _corpus_texts(path: str) -> List[str]:
+    from mmap_index import MmapIndex, is_mmap_index, read_langchain_docstore
+
+    if is_mmap_index(path):
+        index = MmapIndex(path)
+        return [index.text(i) for i in range(len(index))]
+    texts, _ = read_langchain_docstore(os.path.join(path, 'index.pkl'))
+    return texts
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build or query the BM25 index for local_index")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help="Build the index from the chunks in an index directory")
+    build_parser.add_argument('path')
+    search_parser = subparsers.add_parser('search', help="Run a query against a built index")
+    search_parser.add_argument('path')
+    search_parser.add_argument('query')
+    search_parser.add_argument('-k', type=int, default=4)
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        index = LexicalIndex.build(_corpus_texts(args.path))
+        index.save(args.path)
+        print(f"Indexed {index.count} chunks, {len(index.terms)} terms in {time.perf_counter() - start:.1f}s")
+        return 0
+
+    index = LexicalIndex.load(args.path)
+    texts = _corpus_texts(args.path)
+    for doc, score in index.search(args.query, args.k):
+        print(f"{doc:>6} {score:8.2f} {index.coverage(args.query, doc):.2f}  {texts[doc][:100]!r}")
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
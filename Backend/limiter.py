@@ -0,0 +1,235 @@
+"""
+Adaptive client-side concurrency and rate limiting for Bedrock.
+
+Bedrock quotas are per model, so each model gets its own limiter. A call
+needs both a concurrency slot and a token from the model's token bucket
+before it is sent. Each limit adapts AIMD-style:
+
+- a call that completes cleanly, while its limit was the bottleneck, raises
+  that limit additively (about +1 per round trip at full use);
+- a throttled call (``ThrottlingException``, or a success that botocore only
+  got after retrying a throttle) multiplies both limits by
+  ``BEDROCK_LIMITER_BACKOFF``.
+
+botocore reports how many times it retried, not why, so ``bedrock`` hooks
+``count_throttled_attempt`` into each client's ``needs-retry`` event. It runs
+in the calling thread and counts throttled attempts on the permit acquired
+there, so a call that recovered from a 5xx or a dropped connection does not
+back off.
+
+Only the first throttle from calls admitted under the current limits backs
+off. Throttles still in flight from before a decrease do not cut the limits
+again. Because of this, the limits settle just under the quota ceiling
+instead of collapsing and recovering in a sawtooth.
+
+Calls over the limits wait in a FIFO queue for up to ``BEDROCK_QUEUE_TIMEOUT``
+seconds. Waiting longer raises ``LimiterTimeout``, which ``bedrock`` treats
+like a throttle and may answer from a fallback model. Limits and queue depth
+are sampled into the request metrics as ``bedrock_concurrency_limit``,
+``bedrock_rate_limit`` and ``bedrock_queue_depth``.
+"""
+import collections
+import contextvars
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import metrics
+from model_router import error_code
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get('BEDROCK_LIMITER_ENABLED', 'true').lower() != 'false'
+INITIAL_CONCURRENCY = float(os.environ.get('BEDROCK_INITIAL_CONCURRENCY', '8'))
+MIN_CONCURRENCY = float(os.environ.get('BEDROCK_MIN_CONCURRENCY', '1'))
+MAX_CONCURRENCY = float(os.environ.get('BEDROCK_MAX_CONCURRENCY', '32'))
+INITIAL_RATE = float(os.environ.get('BEDROCK_INITIAL_RATE', '5'))
+MIN_RATE = float(os.environ.get('BEDROCK_MIN_RATE', '0.5'))
+MAX_RATE = float(os.environ.get('BEDROCK_MAX_RATE', '50'))
+BACKOFF = float(os.environ.get('BEDROCK_LIMITER_BACKOFF', '0.7'))
+QUEUE_TIMEOUT = float(os.environ.get('BEDROCK_QUEUE_TIMEOUT', '30'))
+MAX_QUEUE = int(os.environ.get('BEDROCK_MAX_QUEUE', '256'))
+
+THROTTLE_ERROR_CODES = {
+    'ThrottlingException',
+    'TooManyRequestsException',
+    'ServiceQuotaExceededException',
+}
+
+
+class LimiterTimeout(TimeoutError):
+    """A call waited in the limiter queue past its deadline"""
+
+
+def is_throttle(error: Optional[Exception]) -> bool:
+    return error is not None and error_code(error) in THROTTLE_ERROR_CODES
+
+
+# Permit of the call this context is making, for the botocore retry hook
+_current_permit: contextvars.ContextVar = contextvars.ContextVar('limiter_permit', default=None)
+
+
+def count_throttled_attempt(response=None, **kwargs):
+    """botocore ``needs-retry`` handler: note a throttled attempt on the current permit"""
+    permit = _current_permit.get()
+    if permit is None or permit.released or response is None:
+        return None
+    if response[1].get('Error', {}).get('Code') in THROTTLE_ERROR_CODES:
+        permit.throttled_attempts += 1
+    # None leaves the retry decision to botocore
+    return None
+
+
+class Permit:
+    """One admitted call; hand it back to ``release`` when the call ends"""
+
+    def __init__(self, limiter: 'AdaptiveLimiter', generation: int):
+        self.limiter = limiter
+        self.generation = generation
+        self.released = False
+        self.throttled_attempts = 0
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit and token bucket for one model"""
+
+    def __init__(
+        self,
+        name: str,
+        concurrency: float = INITIAL_CONCURRENCY,
+        rate: float = INITIAL_RATE,
+        max_queue: int = MAX_QUEUE,
+    ):
+        self.name = name
+        self.concurrency = concurrency
+        self.rate = rate
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self._tokens = 1.0
+        self._refilled = time.monotonic()
+        # Bumped on every decrease; permits from older generations cannot back off again
+        self._generation = 0
+        self._concurrency_bound = False
+        self._rate_bound = False
+        self._waiters: collections.deque = collections.deque()
+        self._cond = threading.Condition()
+
+    def _refill(self, now: float):
+        burst = max(1.0, self.rate)
+        self._tokens = min(burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def _admit_wait(self, now: float) -> Optional[float]:
+        """Seconds until the head of the queue may go, 0 for now, None if it must wait for a slot"""
+        if self.in_flight >= int(self.concurrency):
+            self._concurrency_bound = True
+            return None
+        self._refill(now)
+        if self._tokens >= 1:
+            return 0.0
+        self._rate_bound = True
+        return (1 - self._tokens) / self.rate
+
+    def acquire(self, timeout: float = QUEUE_TIMEOUT) -> Permit:
+        start = time.monotonic()
+        deadline = start + timeout
+        with self._cond:
+            if len(self._waiters) >= self.max_queue:
+                metrics.increment('bedrock_limiter_timeouts')
+                raise LimiterTimeout(f"{self.name} queue is full ({self.max_queue} waiting)")
+            metrics.gauge('bedrock_queue_depth', len(self._waiters))
+            ticket = object()
+            self._waiters.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._admit_wait(now) if self._waiters[0] is ticket else None
+                    if wait == 0:
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        metrics.increment('bedrock_limiter_timeouts')
+                        raise LimiterTimeout(f"Waited {timeout:.0f}s for a {self.name} slot")
+                    self._cond.wait(remaining if wait is None else min(remaining, wait))
+                self._tokens -= 1
+                self.in_flight += 1
+                permit = Permit(self, self._generation)
+            finally:
+                self._waiters.remove(ticket)
+                self._cond.notify_all()
+
+        waited_ms = (time.monotonic() - start) * 1000
+        request_metrics = metrics.current()
+        if request_metrics is not None and waited_ms >= 1:
+            request_metrics.record_duration('bedrock_queue_wait', waited_ms)
+        metrics.gauge('bedrock_concurrency_limit', int(self.concurrency))
+        metrics.gauge('bedrock_rate_limit', round(self.rate, 2))
+        _current_permit.set(permit)
+        return permit
+
+    def release(self, permit: Permit, error: Optional[Exception] = None):
+        """Return a slot, learning from how the call went"""
+        if permit.released:
+            return
+        permit.released = True
+        throttled = is_throttle(error) or (error is None and permit.throttled_attempts > 0)
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                metrics.increment('bedrock_throttles')
+                if permit.generation == self._generation:
+                    self._generation += 1
+                    self.concurrency = max(MIN_CONCURRENCY, self.concurrency * BACKOFF)
+                    self.rate = max(MIN_RATE, self.rate * BACKOFF)
+                    logger.warning(
+                        f"{self.name} throttled, limits now {int(self.concurrency)} concurrent, "
+                        f"{self.rate:.2f}/s"
+                    )
+            elif error is None:
+                # Only grow a limit that is actually holding calls back
+                if self._concurrency_bound:
+                    self.concurrency = min(MAX_CONCURRENCY, self.concurrency + 1 / self.concurrency)
+                    self._concurrency_bound = False
+                if self._rate_bound:
+                    self.rate = min(MAX_RATE, self.rate + 1 / self.rate)
+                    self._rate_bound = False
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'concurrency_limit': int(self.concurrency),
+                'rate_limit': round(self.rate, 2),
+                'in_flight': self.in_flight,
+                'queue_depth': len(self._waiters),
+            }
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(model_id: str) -> AdaptiveLimiter:
+    """Shared limiter for a model, created on first use"""
+    limiter = _limiters.get(model_id)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(model_id)
+            if limiter is None:
+                limiter = _limiters[model_id] = AdaptiveLimiter(model_id)
+    return limiter
+
+
+def acquire(model_id: str, timeout: float = QUEUE_TIMEOUT) -> Optional[Permit]:
+    """Wait for a slot for ``model_id``; None when limiting is off"""
+    if not ENABLED:
+        return None
+    return get_limiter(model_id).acquire(timeout)
+
+
+def release(permit: Optional[Permit], error: Optional[Exception] = None):
+    if permit is not None:
+        permit.limiter.release(permit, error=error)
+
@@ -0,0 +1,277 @@
+"""
+Content-addressed cache for Bedrock responses.
+
+Responses are keyed by a hash of the model ID and the full request body
+(system prompt, messages, images, stop sequences, sampling parameters), so
+the same diagram prompt, code-gen prompt or byte-identical PNG caption is only
+sent to the model once. Lookups go through three tiers, fastest first:
+
+- an in-process LRU, bounded by entry count and bytes;
+- a ``/tmp`` tier that outlives a single invocation on a warm container;
+- an optional shared tier behind ``SharedTier``, e.g. a directory on EFS
+  (``LLM_CACHE_SHARED_DIR``) or anything plugged in with ``set_shared_tier``.
+
+A hit in a slower tier is copied into the faster ones. Every entry carries an
+expiry time (``LLM_CACHE_TTL``). ``set_bypass(True)`` makes the current
+request skip lookups; the fresh response still refreshes the cache.
+
+Only deterministic requests (``temperature`` 0) are cached by default.
+Claude samples at temperature 1 unless told otherwise, and replaying one
+sampled code, diagram or caption answer to every caller for a day changes
+what users get. ``LLM_CACHE_SAMPLED=true`` opts in to caching those too.
+"""
+import abc
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get('LLM_CACHE_ENABLED', 'true').lower() != 'false'
+TTL_SECONDS = int(os.environ.get('LLM_CACHE_TTL', '86400'))
+MEMORY_MAX_ITEMS = int(os.environ.get('LLM_CACHE_MEMORY_ITEMS', '256'))
+MEMORY_MAX_BYTES = int(os.environ.get('LLM_CACHE_MEMORY_BYTES', str(32 * 1024 * 1024)))
+DISK_DIR = os.environ.get('LLM_CACHE_DIR', '/tmp/llm_cache')
+DISK_MAX_BYTES = int(os.environ.get('LLM_CACHE_DISK_BYTES', str(128 * 1024 * 1024)))
+SHARED_DIR = os.environ.get('LLM_CACHE_SHARED_DIR')
+CACHE_SAMPLED = os.environ.get('LLM_CACHE_SAMPLED', 'false').lower() == 'true'
+
+_bypass: contextvars.ContextVar = contextvars.ContextVar('llm_cache_bypass', default=False)
+
+
+def set_bypass(bypass: bool):
+    """Skip cache lookups for the rest of the current request"""
+    _bypass.set(bool(bypass))
+
+
+def is_bypassed() -> bool:
+    return _bypass.get()
+
+
+def is_cacheable(request: Dict[str, Any]) -> bool:
+    """Whether a response may be replayed: only for temperature 0 unless ``LLM_CACHE_SAMPLED``"""
+    return CACHE_SAMPLED or request.get('temperature') == 0
+
+
+def cache_key(model_id: str, request: Dict[str, Any]) -> str:
+    """Stable hash of everything that determines a model response"""
+    canonical = json.dumps({'model_id': model_id, 'request': request}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class MemoryTier:
+    """Thread-safe LRU of serialized responses, bounded by items and bytes"""
+
+    name = 'memory'
+
+    def __init__(self, max_items: int = MEMORY_MAX_ITEMS, max_bytes: int = MEMORY_MAX_BYTES):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[str, Tuple[float, bytes]]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, data = entry
+            if expires_at < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return data, expires_at
+
+    def put(self, key: str, data: bytes, expires_at: float):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, data)
+            self._bytes += len(data)
+            while len(self._entries) > self.max_items or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        _, data = self._entries.pop(key)
+        self._bytes -= len(data)
+
+
+class DirectoryTier:
+    """
+    Entries stored as files under a directory, evicted oldest-first by bytes.
+
+    Used for the ``/tmp`` tier and as the local stand-in for a shared tier.
+    """
+
+    name = 'disk'
+
+    def __init__(self, directory: str = DISK_DIR, max_bytes: int = DISK_MAX_BYTES, name: Optional[str] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        if name:
+            self.name = name
+        self._bytes: Optional[int] = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                record = json.loads(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+        if record['expires_at'] < time.time():
+            self._delete(path)
+            return None
+        # Oldest access time is evicted first
+        os.utime(path, None)
+        return record['data'].encode('utf-8'), record['expires_at']
+
+    def put(self, key: str, data: bytes, expires_at: float):
+        payload = json.dumps({'expires_at': expires_at, 'data': data.decode('utf-8')}).encode('utf-8')
+        if len(payload) > self.max_bytes:
+            return
+        path = self._path(key)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(payload)
+        with self._lock:
+            try:
+                replaced = os.path.getsize(path)
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(temp_path, path)
+            if self._bytes is None:
+                # The first scan already sees the new file
+                self._used_bytes()
+            else:
+                self._bytes += len(payload) - replaced
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _used_bytes(self) -> int:
+        if self._bytes is None:
+            self._bytes = sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.is_file())
+        return self._bytes
+
+    def _delete(self, path: str) -> int:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            return size
+        except FileNotFoundError:
+            return 0
+
+    def _evict(self):
+        entries = sorted(
+            (entry.stat().st_mtime, entry.path) for entry in os.scandir(self.directory) if entry.is_file()
+        )
+        # Evict down to 80% so a full cache does not rescan on every put
+        target = self.max_bytes * 0.8
+        for _, path in entries:
+            if self._bytes <= target:
+                break
+            self._bytes -= self._delete(path)
+
+
+class SharedTier(abc.ABC):
+    """Interface for a cache shared between containers (EFS, S3, DynamoDB, ...)"""
+
+    name = 'shared'
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """Return ``(data, expires_at)`` for a live entry, else None"""
+
+    @abc.abstractmethod
+    def put(self, key: str, data: bytes, expires_at: float):
+        """Store ``data`` until ``expires_at``"""
+
+
+class LLMCache:
+    """Tiered response cache with hit/miss metrics"""
+
+    def __init__(self, tiers, ttl_seconds: int = TTL_SECONDS):
+        self.tiers = list(tiers)
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if _bypass.get():
+            metrics.increment('llm_cache_bypass')
+            return None
+        for index, tier in enumerate(self.tiers):
+            try:
+                entry = tier.get(key)
+            except Exception as e:
+                logger.warning(f"LLM cache {tier.name} lookup failed: {e}")
+                continue
+            if entry is not None:
+                data, expires_at = entry
+                metrics.increment(f"llm_cache_hit_{tier.name}")
+                # Promoted copies keep the original expiry
+                self._fill(self.tiers[:index], key, data, expires_at)
+                return json.loads(data)
+        metrics.increment('llm_cache_miss')
+        return None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        data = json.dumps(value).encode('utf-8')
+        self._fill(self.tiers, key, data, time.time() + self.ttl_seconds)
+
+    def _fill(self, tiers, key: str, data: bytes, expires_at: float):
+        for tier in tiers:
+            try:
+                tier.put(key, data, expires_at)
+            except Exception as e:
+                logger.warning(f"LLM cache {tier.name} write failed: {e}")
+
+
+_cache: Optional[LLMCache] = None
+_shared_tier = None
+_cache_lock = threading.Lock()
+
+
+def set_shared_tier(tier):
+    """Plug in a shared tier; takes effect for the next ``get_llm_cache``"""
+    global _cache, _shared_tier
+    with _cache_lock:
+        _shared_tier = tier
+        _cache = None
+
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """Process-wide cache, or None when caching is disabled"""
+    global _cache
+    if not ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                tiers = [MemoryTier()]
+                try:
+                    tiers.append(DirectoryTier())
+                except OSError as e:
+                    logger.warning(f"LLM cache disk tier unavailable: {e}")
+                shared = _shared_tier
+                if shared is None and SHARED_DIR:
+                    shared = DirectoryTier(SHARED_DIR, name='shared')
+                if shared is not None:
+                    tiers.append(shared)
+                _cache = LLMCache(tiers)
+    return _cache
@@ -0,0 +1,233 @@
+"""
+Per-request latency and payload metrics emitted in CloudWatch Embedded Metric
+Format (EMF).
+
+The handler opens a request with ``start_request`` and calls ``emit`` once at
+the end. In between, any code can time a stage with ``span`` (or the ``timed``
+decorator) and record payload sizes with ``record_size``; outside a request
+these calls are no-ops. The emitted log line carries one metric per stage, so
+CloudWatch can chart p50/p99 per tool and stage without a custom pipeline.
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'SmileAgent')
+ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() != 'false'
+# EMF accepts at most 100 values per metric in one record
+MAX_VALUES = 100
+
+_current: contextvars.ContextVar = contextvars.ContextVar('request_metrics', default=None)
+_cold_start = True
+_cold_start_lock = threading.Lock()
+
+
+def _metric_value(samples: List[float]):
+    if len(samples) == 1:
+        return samples[0]
+    return samples[:MAX_VALUES]
+
+
+class RequestMetrics:
+    """Stage durations, sizes and properties collected for one request"""
+
+    def __init__(self, tool: Optional[str] = None, request_id: Optional[str] = None, cold_start: bool = False):
+        self.tool = tool
+        self.request_id = request_id
+        self.cold_start = cold_start
+        self.started = time.perf_counter()
+        self.durations: Dict[str, List[float]] = {}
+        self.sizes: Dict[str, List[int]] = {}
+        self.counts: Dict[str, float] = {}
+        self.gauges: Dict[str, List[float]] = {}
+        self.properties: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def record_duration(self, stage: str, duration_ms: float):
+        with self._lock:
+            self.durations.setdefault(stage, []).append(round(duration_ms, 2))
+
+    def record_size(self, name: str, size: int):
+        with self._lock:
+            self.sizes.setdefault(name, []).append(int(size))
+
+    def increment(self, name: str, value: float = 1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def record_gauge(self, name: str, value: float):
+        with self._lock:
+            self.gauges.setdefault(name, []).append(value)
+
+    def set_property(self, name: str, value: Any):
+        with self._lock:
+            self.properties[name] = value
+
+    def merge(self, other: 'RequestMetrics'):
+        """Add another collector's samples and counts; properties already set here win"""
+        with other._lock:
+            durations = {name: list(values) for name, values in other.durations.items()}
+            sizes = {name: list(values) for name, values in other.sizes.items()}
+            counts = dict(other.counts)
+            gauges = {name: list(values) for name, values in other.gauges.items()}
+            properties = dict(other.properties)
+        with self._lock:
+            for name, values in durations.items():
+                self.durations.setdefault(name, []).extend(values)
+            for name, values in sizes.items():
+                self.sizes.setdefault(name, []).extend(values)
+            for name, value in counts.items():
+                self.counts[name] = self.counts.get(name, 0) + value
+            for name, values in gauges.items():
+                self.gauges.setdefault(name, []).extend(values)
+            for name, value in properties.items():
+                self.properties.setdefault(name, value)
+
+    def to_emf(self) -> Dict[str, Any]:
+        total_ms = round((time.perf_counter() - self.started) * 1000, 2)
+        with self._lock:
+            metric_definitions = [{'Name': 'request_ms', 'Unit': 'Milliseconds'}]
+            values: Dict[str, Any] = {'request_ms': total_ms}
+            for stage, durations in self.durations.items():
+                name = f"{stage}_ms"
+                metric_definitions.append({'Name': name, 'Unit': 'Milliseconds'})
+                values[name] = _metric_value(durations)
+            for size_name, sizes in self.sizes.items():
+                name = f"{size_name}_bytes"
+                metric_definitions.append({'Name': name, 'Unit': 'Bytes'})
+                values[name] = _metric_value(sizes)
+            for count_name, count in self.counts.items():
+                metric_definitions.append({'Name': count_name, 'Unit': 'Count'})
+                values[count_name] = count
+            for gauge_name, samples in self.gauges.items():
+                metric_definitions.append({'Name': gauge_name, 'Unit': 'Count'})
+                values[gauge_name] = _metric_value(samples)
+            properties = dict(self.properties)
+
+        return {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': NAMESPACE,
+                    'Dimensions': [['Tool'], ['Tool', 'ColdStart']],
+                    'Metrics': metric_definitions,
+                }],
+            },
+            'Tool': self.tool or 'unknown',
+            'ColdStart': 'true' if self.cold_start else 'false',
+            'RequestId': self.request_id,
+            **properties,
+            **values,
+        }
+
+
+def _take_cold_start() -> bool:
+    global _cold_start
+    with _cold_start_lock:
+        cold, _cold_start = _cold_start, False
+    return cold
+
+
+def start_request(tool: Optional[str] = None, request_id: Optional[str] = None) -> RequestMetrics:
+    """Begin collecting metrics for the current request"""
+    request_metrics = RequestMetrics(tool=tool, request_id=request_id, cold_start=_take_cold_start())
+    _current.set(request_metrics)
+    return request_metrics
+
+
+def start_part(tool: Optional[str] = None) -> RequestMetrics:
+    """Collect part of a request (such as one batch item) apart, to ``merge`` into the request later"""
+    part_metrics = RequestMetrics(tool=tool)
+    _current.set(part_metrics)
+    return part_metrics
+
+
+def current() -> Optional[RequestMetrics]:
+    return _current.get()
+
+
+def set_tool(tool: str):
+    request_metrics = _current.get()
+    if request_metrics is not None:
+        request_metrics.tool = tool
+
+
+def set_property(name: str, value: Any):
+    request_metrics = _current.get()
+    if request_metrics is not None:
+        request_metrics.set_property(name, value)
+
+
+def record_size(name: str, value: Any):
+    """Record a payload size; strings and bytes are measured for you"""
+    request_metrics = _current.get()
+    if request_metrics is None or value is None:
+        return
+    if isinstance(value, str):
+        value = len(value.encode('utf-8'))
+    elif isinstance(value, (bytes, bytearray)):
+        value = len(value)
+    request_metrics.record_size(name, value)
+
+
+def increment(name: str, value: float = 1):
+    request_metrics = _current.get()
+    if request_metrics is not None:
+        request_metrics.increment(name, value)
+
+
+def gauge(name: str, value: float):
+    """Sample a level, such as a queue depth, at this point in the request"""
+    request_metrics = _current.get()
+    if request_metrics is not None:
+        request_metrics.record_gauge(name, value)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a stage of the current request"""
+    request_metrics = _current.get()
+    if request_metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        request_metrics.record_duration(stage, (time.perf_counter() - start) * 1000)
+
+
+def timed(stage: Optional[str] = None) -> Callable:
+    """Decorator form of ``span``; the stage defaults to the function name"""
+    def decorator(func: Callable) -> Callable:
+        name = stage or func.__name__.lstrip('_')
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def emit(request_metrics: Optional[RequestMetrics] = None):
+    """Write the request's EMF record to stdout and stop collecting"""
+    request_metrics = request_metrics or _current.get()
+    _current.set(None)
+    if request_metrics is None or not ENABLED:
+        return
+    try:
+        # EMF records must be bare JSON lines, so bypass the logging formatter
+        sys.stdout.write(json.dumps(request_metrics.to_emf()) + '\n')
+        sys.stdout.flush()
+    except Exception as e:
+        logger.warning(f"Failed to emit metrics: {e}")
@@ -0,0 +1,557 @@
+"""
+Memory-mapped on-disk index for the Well-Architected corpus.
+
+``local_index/index.pkl`` has to be unpickled into Python objects in every
+container before the first search. This format is opened with ``mmap``
+instead, so loading costs a few page-table entries. The pages themselves live
+in the OS page cache and are shared by every process that opens the same
+files. An index directory holds:
+
+- ``manifest.json``: format version, chunk count, dimension, vector dtype,
+  distance metric, embedding model and the table of source names;
+- ``vectors.bin``: the embeddings as one row-major matrix, either float32,
+  float16, int8 (with per-row ``scales.bin``) or PQ codes (with
+  ``pq_codebooks.bin``), see ``quantization``;
+- ``ivf_centroids.bin`` / ``ivf_lists.bin``: optional IVF partitioning, so a
+  search scans only the ``nprobe`` nearest lists;
+- ``chunks.bin``: a fixed-width table with one row per chunk (text offset and
+  length, source, page, vector norm);
+- ``text.bin``: the UTF-8 chunk texts back to back, located by the offsets.
+
+Convert an existing LangChain FAISS index with:
+
+    python mmap_index.py convert local_index [--out local_index] [--dtype float16]
+        [--ivf-nlist 44 --ivf-nprobe 8] [--pq-m 96]
+
+The vectors come from ``index.faiss`` (or a ``.npy`` matrix given with
+``--vectors``). The text and metadata come from ``index.pkl``.
+
+To choose an encoding, compare recall@k against exact search, query latency
+and the size of the vector files for several configurations:
+
+    python mmap_index.py bench local_index [--configs float16 int8 pq96 ivf44x8-int8]
+"""
+import argparse
+import io
+import json
+import logging
+import mmap
+import os
+import pickle
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import quantization
+
+logger = logging.getLogger(__name__)
+
+FORMAT = 'smile-mmap-index'
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+VECTORS_FILE = 'vectors.bin'
+CHUNKS_FILE = 'chunks.bin'
+TEXT_FILE = 'text.bin'
+SCALES_FILE = 'scales.bin'
+CODEBOOKS_FILE = 'pq_codebooks.bin'
+IVF_CENTROIDS_FILE = 'ivf_centroids.bin'
+IVF_LISTS_FILE = 'ivf_lists.bin'
+VECTOR_FILES = (VECTORS_FILE, SCALES_FILE, CODEBOOKS_FILE, IVF_CENTROIDS_FILE, IVF_LISTS_FILE)
+
+CHUNK_DTYPE = np.dtype([
+    ('text_offset', '<u8'),
+    ('text_length', '<u4'),
+    ('source', '<u2'),
+    ('page', '<i4'),
+    ('norm', '<f4'),
+])
+VECTOR_DTYPES = {'float16': np.float16, 'float32': np.float32}
+ENCODINGS = ('float32', 'float16', 'int8', 'pq')
+# Rows scored per matrix product, so float16 vectors are upcast a block at a time
+SEARCH_BLOCK = 8192
+
+
+def is_mmap_index(path: str) -> bool:
+    return os.path.exists(os.path.join(path, MANIFEST))
+
+
+class Chunk:
+    """A retrieved chunk; quacks like a LangChain ``Document``"""
+
+    __slots__ = ('index', 'page_content', 'metadata')
+
+    def __init__(self, index: int, page_content: str, metadata: Dict[str, Any]):
+        self.index = index
+        self.page_content = page_content
+        self.metadata = metadata
+
+    def __repr__(self):
+        return f"Chunk({self.index}, {self.metadata!r})"
+
+
+class MmapIndex:
+    """Read-only view of an index directory"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, MANIFEST), 'r') as f:
+            self.manifest: Dict[str, Any] = json.load(f)
+        if self.manifest.get('format') != FORMAT or self.manifest.get('version') != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} {FORMAT} directory")
+
+        self.count: int = self.manifest['count']
+        self.dim: int = self.manifest['dim']
+        self.metric: str = self.manifest.get('metric', 'l2')
+        self.sources: List[str] = self.manifest.get('sources', [])
+        self.embedding_model: Optional[str] = self.manifest.get('embedding_model')
+        self.encoding: str = self.manifest['dtype']
+        self.scales = self.codebooks = None
+        if self.encoding in VECTOR_DTYPES:
+            self.vectors = self._map(VECTORS_FILE, VECTOR_DTYPES[self.encoding], (self.count, self.dim))
+        elif self.encoding == 'int8':
+            self.vectors = self._map(VECTORS_FILE, np.int8, (self.count, self.dim))
+            self.scales = self._map(SCALES_FILE, np.float32, (self.count,))
+        elif self.encoding == 'pq':
+            m = self.manifest['pq_m']
+            self.vectors = self._map(VECTORS_FILE, np.uint8, (self.count, m))
+            self.codebooks = np.fromfile(os.path.join(path, CODEBOOKS_FILE), dtype=np.float32).reshape(
+                m, quantization.PQ_CENTROIDS, self.dim // m
+            )
+        else:
+            raise ValueError(f"Unknown vector encoding {self.encoding!r} in {path}")
+
+        ivf = self.manifest.get('ivf')
+        self.ivf_offsets: Optional[List[int]] = ivf['offsets'] if ivf else None
+        self.nprobe: int = ivf['nprobe'] if ivf else 0
+        if ivf:
+            self.ivf_centroids = np.fromfile(
+                os.path.join(path, IVF_CENTROIDS_FILE), dtype=np.float32
+            ).reshape(ivf['nlist'], self.dim)
+            self.ivf_lists = self._map(IVF_LISTS_FILE, np.uint32, (self.count,))
+        self.chunks = np.memmap(os.path.join(path, CHUNKS_FILE), dtype=CHUNK_DTYPE, mode='r', shape=(self.count,))
+        with open(os.path.join(path, TEXT_FILE), 'rb') as f:
+            self._text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b''
+
+    def _map(self, name: str, dtype, shape):
+        return np.memmap(os.path.join(self.path, name), dtype=dtype, mode='r', shape=shape)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def footprint(self) -> int:
+        """Bytes of vector data a search may touch"""
+        return sum(
+            os.path.getsize(os.path.join(self.path, name))
+            for name in VECTOR_FILES if os.path.exists(os.path.join(self.path, name))
+        )
+
+    def text(self, index: int) -> str:
+        row = self.chunks[index]
+        start = int(row['text_offset'])
+        return self._text[start:start + int(row['text_length'])].decode('utf-8')
+
+    def metadata(self, index: int) -> Dict[str, Any]:
+        row = self.chunks[index]
+        metadata: Dict[str, Any] = {'source': self.sources[int(row['source'])]}
+        if row['page'] >= 0:
+            metadata['page'] = int(row['page'])
+        return metadata
+
+    def chunk(self, index: int) -> Chunk:
+        return Chunk(index, self.text(index), self.metadata(index))
+
+    def scores(self, vector: Sequence[float], rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Distance (``l2``, lower is closer) or similarity (``ip``, higher is
+        closer) from ``vector`` to every chunk, or to the chunks in ``rows``.
+        Quantized encodings give approximate scores.
+        """
+        query = np.asarray(vector, dtype=np.float32)
+        if query.shape != (self.dim,):
+            raise ValueError(f"Query has {query.size} dimensions, index has {self.dim}")
+        if self.encoding == 'pq':
+            codes = self.vectors if rows is None else self.vectors[rows]
+            return quantization.pq_scores(codes, quantization.pq_tables(query, self.codebooks, self.metric))
+
+        count = self.count if rows is None else len(rows)
+        products = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SEARCH_BLOCK):
+            selected = slice(start, start + SEARCH_BLOCK) if rows is None else rows[start:start + SEARCH_BLOCK]
+            block = np.asarray(self.vectors[selected], dtype=np.float32)
+            products[start:start + len(block)] = block @ query
+        if self.encoding == 'int8':
+            scales = self.scales if rows is None else self.scales[rows]
+            products *= np.asarray(scales, dtype=np.float32) / 127
+        if self.metric == 'ip':
+            return products
+        norms = np.asarray(self.chunks['norm'] if rows is None else self.chunks['norm'][rows], dtype=np.float32)
+        return np.maximum(norms * norms - 2 * products + float(query @ query), 0)
+
+    def probe(self, vector: Sequence[float], nprobe: Optional[int] = None) -> np.ndarray:
+        """Chunk indexes in the ``nprobe`` IVF lists nearest to ``vector``"""
+        query = np.asarray(vector, dtype=np.float32)
+        if self.metric == 'ip':
+            nearest = np.argsort(-(self.ivf_centroids @ query))
+        else:
+            nearest = np.argsort(quantization.squared_distances(query[None, :], self.ivf_centroids)[0])
+        lists = [
+            self.ivf_lists[self.ivf_offsets[i]:self.ivf_offsets[i + 1]]
+            for i in nearest[:nprobe or self.nprobe]
+        ]
+        return np.sort(np.concatenate(lists)).astype(np.int64) if lists else np.zeros(0, dtype=np.int64)
+
+    def top_k(self, scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """Best ``k`` (index, score) pairs for scores from ``scores``"""
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        ordered = scores if self.metric == 'l2' else -scores
+        best = np.argpartition(ordered, k - 1)[:k]
+        best = best[np.argsort(ordered[best], kind='stable')]
+        return [(int(i), float(scores[i])) for i in best]
+
+    def nearest(self, vector: Sequence[float], k: int = 4, nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """(chunk index, score) of the ``k`` nearest chunks, scanning only probed lists under IVF"""
+        if self.ivf_offsets is None:
+            return self.top_k(self.scores(vector), k)
+        rows = self.probe(vector, nprobe)
+        return [(int(rows[i]), score) for i, score in self.top_k(self.scores(vector, rows), k)]
+
+    def search(self, vector: Sequence[float], k: int = 4) -> List[Tuple[Chunk, float]]:
+        return [(self.chunk(i), score) for i, score in self.nearest(vector, k)]
+
+
+class MmapVectorStore:
+    """``similarity_search`` over an ``MmapIndex``, embedding queries with ``embeddings``"""
+
+    def __init__(self, index: MmapIndex, embeddings: Any):
+        self.index = index
+        self.embeddings = embeddings
+
+    @classmethod
+    def load(cls, path: str, embeddings: Any) -> 'MmapVectorStore':
+        return cls(MmapIndex(path), embeddings)
+
+    def similarity_search_with_score(self, query: str, k: int = 4) -> List[Tuple[Chunk, float]]:
+        return self.index.search(self.embeddings.embed_query(query), k=k)
+
+    def similarity_search(self, query: str, k: int = 4) -> List[Chunk]:
+        return [chunk for chunk, _ in self.similarity_search_with_score(query, k=k)]
+
+
+def _replace(path: str, data_writer) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        data_writer(f)
+    os.replace(tmp_path, path)
+
+
+def write_index(
+    path: str,
+    texts: Sequence[str],
+    metadatas: Sequence[Dict[str, Any]],
+    vectors: Any,
+    dtype: str = 'float16',
+    metric: str = 'l2',
+    embedding_model: Optional[str] = None,
+    extra: Optional[Dict[str, Any]] = None,
+    pq_m: Optional[int] = None,
+    ivf_nlist: int = 0,
+    ivf_nprobe: int = 8,
+) -> Dict[str, Any]:
+    """
+    Write an index directory; the manifest goes last so readers never see a
+    partial index. ``dtype`` is one of ``ENCODINGS``; ``pq`` needs ``pq_m``
+    sub-vectors, and ``ivf_nlist`` > 0 adds IVF partitioning.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim != 2 or len(vectors) != len(texts) or len(texts) != len(metadatas):
+        raise ValueError("Need one vector and one metadata dict per text")
+    if dtype not in ENCODINGS:
+        raise ValueError(f"Unknown vector encoding {dtype!r}; use one of {', '.join(ENCODINGS)}")
+    os.makedirs(path, exist_ok=True)
+
+    sources: List[str] = []
+    source_ids: Dict[str, int] = {}
+    chunks = np.zeros(len(texts), dtype=CHUNK_DTYPE)
+    encoded = [text.encode('utf-8') for text in texts]
+    offset = 0
+    for i, (data, metadata) in enumerate(zip(encoded, metadatas)):
+        source = str(metadata.get('source', ''))
+        if source not in source_ids:
+            source_ids[source] = len(sources)
+            sources.append(source)
+        page = metadata.get('page')
+        chunks[i] = (offset, len(data), source_ids[source], -1 if page is None else int(page), 0.0)
+        offset += len(data)
+    chunks['norm'] = np.linalg.norm(vectors, axis=1)
+
+    written = _write_vectors(path, vectors, dtype, pq_m)
+    ivf = None
+    if ivf_nlist:
+        centroids, lists, offsets = quantization.ivf_partition(vectors, ivf_nlist)
+        _replace(os.path.join(path, IVF_CENTROIDS_FILE), lambda f: f.write(centroids.astype(np.float32).tobytes()))
+        _replace(os.path.join(path, IVF_LISTS_FILE), lambda f: f.write(lists.tobytes()))
+        written += [IVF_CENTROIDS_FILE, IVF_LISTS_FILE]
+        ivf = {'nlist': len(centroids), 'nprobe': min(ivf_nprobe, len(centroids)), 'offsets': offsets}
+    for name in VECTOR_FILES:
+        # Drop files left by a previous build with another encoding
+        if name not in written and os.path.exists(os.path.join(path, name)):
+            os.remove(os.path.join(path, name))
+    _replace(os.path.join(path, CHUNKS_FILE), lambda f: f.write(chunks.tobytes()))
+    _replace(os.path.join(path, TEXT_FILE), lambda f: f.writelines(encoded))
+    manifest = {
+        'format': FORMAT,
+        'version': FORMAT_VERSION,
+        'count': len(texts),
+        'dim': int(vectors.shape[1]) if len(vectors) else 0,
+        'dtype': dtype,
+        'metric': metric,
+        **({'pq_m': pq_m} if dtype == 'pq' else {}),
+        **({'ivf': ivf} if ivf else {}),
+        'embedding_model': embedding_model,
+        'sources': sources,
+        'created': int(time.time()),
+        **(extra or {}),
+    }
+    _replace(os.path.join(path, MANIFEST), lambda f: f.write(json.dumps(manifest, indent=2).encode('utf-8')))
+    return manifest
+
+
+def _write_vectors(path: str, vectors: np.ndarray, dtype: str, pq_m: Optional[int]) -> List[str]:
+    """Write the vector files for an encoding and return their names"""
+    if dtype in VECTOR_DTYPES:
+        data = vectors.astype(VECTOR_DTYPES[dtype])
+        _replace(os.path.join(path, VECTORS_FILE), lambda f: f.write(data.tobytes()))
+        return [VECTORS_FILE]
+    if dtype == 'int8':
+        codes, scales = quantization.quantize_int8(vectors)
+        _replace(os.path.join(path, VECTORS_FILE), lambda f: f.write(codes.tobytes()))
+        _replace(os.path.join(path, SCALES_FILE), lambda f: f.write(scales.tobytes()))
+        return [VECTORS_FILE, SCALES_FILE]
+    if not pq_m:
+        raise ValueError("PQ encoding needs pq_m")
+    codebooks = quantization.pq_train(vectors, pq_m)
+    codes = quantization.pq_encode(vectors, codebooks)
+    _replace(os.path.join(path, VECTORS_FILE), lambda f: f.write(codes.tobytes()))
+    _replace(os.path.join(path, CODEBOOKS_FILE), lambda f: f.write(codebooks.tobytes()))
+    return [VECTORS_FILE, CODEBOOKS_FILE]
+
+
+class _PickledObject:
+    """Stand-in for the LangChain classes in ``index.pkl``; keeps only their state"""
+
+    def __init__(self, *args, **kwargs):
+        self.state: Dict[str, Any] = {}
+
+    def __setstate__(self, state):
+        self.state = state.get('__dict__', state) if isinstance(state, dict) else state
+
+
+class _DocstoreUnpickler(pickle.Unpickler):
+    """Reads a LangChain docstore pickle without importing (or executing) LangChain"""
+
+    def find_class(self, module, name):
+        if module.startswith(('langchain', 'pydantic')):
+            return _PickledObject
+        if module == 'builtins' and name in ('set', 'frozenset', 'dict', 'list', 'tuple'):
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError(f"Refusing to load {module}.{name} from an index pickle")
+
+
+def read_langchain_docstore(path: str) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """Texts and metadata from a LangChain FAISS ``index.pkl``, in index order"""
+    with open(path, 'rb') as f:
+        docstore, index_to_id = _DocstoreUnpickler(io.BytesIO(f.read())).load()
+    documents = docstore.state['_dict']
+    texts, metadatas = [], []
+    for i in range(len(index_to_id)):
+        document = documents[index_to_id[i]].state
+        texts.append(document['page_content'])
+        metadatas.append(dict(document.get('metadata') or {}))
+    return texts, metadatas
+
+
+def read_faiss_vectors(path: str) -> np.ndarray:
+    import faiss
+
+    index = faiss.read_index(path)
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def read_source(source_dir: str, vectors_path: Optional[str] = None) -> Tuple[List[str], List[Dict[str, Any]], np.ndarray]:
+    """(texts, metadatas, float32 vectors) from a LangChain FAISS directory or an unquantized mmap index"""
+    if is_mmap_index(source_dir) and not os.path.exists(os.path.join(source_dir, 'index.pkl')):
+        index = MmapIndex(source_dir)
+        if index.encoding not in VECTOR_DTYPES and not vectors_path:
+            raise ValueError(f"{source_dir} is {index.encoding}-encoded; pass the original vectors with --vectors")
+        texts = [index.text(i) for i in range(len(index))]
+        metadatas = [index.metadata(i) for i in range(len(index))]
+        vectors = np.load(vectors_path) if vectors_path else np.asarray(index.vectors, dtype=np.float32)
+        return texts, metadatas, vectors
+
+    texts, metadatas = read_langchain_docstore(os.path.join(source_dir, 'index.pkl'))
+    if vectors_path:
+        return texts, metadatas, np.load(vectors_path)
+    faiss_path = os.path.join(source_dir, 'index.faiss')
+    if not os.path.exists(faiss_path):
+        raise FileNotFoundError(f"{faiss_path} not found; pass the vectors with --vectors")
+    return texts, metadatas, read_faiss_vectors(faiss_path)
+
+
+def convert(source_dir: str, out_dir: Optional[str] = None, dtype: str = 'float16',
+            vectors_path: Optional[str] = None, embedding_model: Optional[str] = None,
+            pq_m: Optional[int] = None, ivf_nlist: int = 0, ivf_nprobe: int = 8) -> Dict[str, Any]:
+    """Convert a LangChain FAISS index directory (or re-encode an mmap index) to the mmap format"""
+    texts, metadatas, vectors = read_source(source_dir, vectors_path)
+    return write_index(
+        out_dir or source_dir, texts, metadatas, vectors,
+        dtype=dtype, embedding_model=embedding_model,
+        pq_m=pq_m, ivf_nlist=ivf_nlist, ivf_nprobe=ivf_nprobe,
+    )
+
+
+def _iter_sizes(path: str) -> Iterator[Tuple[str, int]]:
+    for name in (MANIFEST, CHUNKS_FILE, TEXT_FILE) + VECTOR_FILES:
+        if os.path.exists(os.path.join(path, name)):
+            yield name, os.path.getsize(os.path.join(path, name))
+
+
+_CONFIG_RE = re.compile(r'^(?:ivf(\d+)x(\d+)-)?(float32|float16|int8|pq(\d+))$')
+
+
+def parse_config(config: str) -> Dict[str, Any]:
+    """Benchmark config like ``float16``, ``int8``, ``pq96`` or ``ivf44x8-int8`` as write_index arguments"""
+    match = _CONFIG_RE.match(config)
+    if not match:
+        raise ValueError(f"Bad index config {config!r}; expected e.g. float16, int8, pq96, ivf44x8-int8")
+    nlist, nprobe, encoding, pq_m = match.groups()
+    return {
+        'dtype': 'pq' if pq_m else encoding,
+        'pq_m': int(pq_m) if pq_m else None,
+        'ivf_nlist': int(nlist or 0),
+        'ivf_nprobe': int(nprobe or 0),
+    }
+
+
+def exact_neighbours(vectors: np.ndarray, queries: np.ndarray, k: int, metric: str = 'l2') -> np.ndarray:
+    """Indexes of the true ``k`` nearest vectors to each query, nearest first"""
+    if metric == 'ip':
+        order = -(queries @ vectors.T)
+    else:
+        order = quantization.squared_distances(queries, vectors)
+    return np.argsort(order, axis=1, kind='stable')[:, :k]
+
+
+def bench(source_dir: str, configs: Sequence[str], k: int = 4, queries_path: Optional[str] = None,
+          query_count: int = 200, vectors_path: Optional[str] = None, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Build each config from the source vectors and report recall@k against
+    exact float32 search, per-query latency, vector bytes and build time.
+
+    Without ``queries_path`` (a .npy matrix of real query embeddings), the
+    queries are corpus vectors with a little noise added, which is close to
+    how questions land near the chunks that answer them.
+    """
+    texts, metadatas, vectors = read_source(source_dir, vectors_path)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if queries_path:
+        queries = np.asarray(np.load(queries_path), dtype=np.float32)
+    else:
+        rng = np.random.default_rng(seed)
+        picked = vectors[rng.choice(len(vectors), size=min(query_count, len(vectors)), replace=False)]
+        noise = rng.normal(size=picked.shape).astype(np.float32)
+        noise *= 0.1 * np.linalg.norm(picked, axis=1, keepdims=True) / np.linalg.norm(noise, axis=1, keepdims=True)
+        queries = picked + noise
+    truth = exact_neighbours(vectors, queries, k)
+
+    results = []
+    workdir = tempfile.mkdtemp(prefix='mmap-bench-')
+    try:
+        for config in configs:
+            path = os.path.join(workdir, re.sub(r'\W', '_', config))
+            start = time.perf_counter()
+            write_index(path, texts, metadatas, vectors, **parse_config(config))
+            build_s = time.perf_counter() - start
+            index = MmapIndex(path)
+            latencies, found = [], 0
+            for query, expected in zip(queries, truth):
+                start = time.perf_counter()
+                hits = index.nearest(query, k)
+                latencies.append((time.perf_counter() - start) * 1000)
+                found += len(set(i for i, _ in hits) & set(expected.tolist()))
+            latencies.sort()
+            results.append({
+                'config': config,
+                f'recall@{k}': round(found / (len(queries) * k), 4),
+                'p50_ms': round(statistics.median(latencies), 3),
+                'p95_ms': round(latencies[int(0.95 * (len(latencies) - 1))], 3),
+                'vector_bytes': index.footprint(),
+                'build_s': round(build_s, 2),
+            })
+            logger.info(f"Benchmarked {config}: {results[-1]}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build or inspect a memory-mapped index")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    convert_parser = subparsers.add_parser('convert', help="Convert a LangChain FAISS index directory")
+    convert_parser.add_argument('source', help="Directory with index.pkl (and index.faiss)")
+    convert_parser.add_argument('--out', help="Output directory (default: the source directory)")
+    convert_parser.add_argument('--dtype', choices=ENCODINGS, default='float16')
+    convert_parser.add_argument('--pq-m', type=int, help="PQ sub-vectors; must divide the dimension")
+    convert_parser.add_argument('--ivf-nlist', type=int, default=0, help="IVF lists (0: no partitioning)")
+    convert_parser.add_argument('--ivf-nprobe', type=int, default=8, help="IVF lists scanned per query")
+    convert_parser.add_argument('--vectors', help="Embeddings as a .npy matrix instead of index.faiss")
+    convert_parser.add_argument('--embedding-model', default='amazon.titan-embed-text-v1')
+    bench_parser = subparsers.add_parser('bench', help="Compare recall, latency and size of index configs")
+    bench_parser.add_argument('source', help="Directory with index.pkl and index.faiss, or an unquantized mmap index")
+    bench_parser.add_argument('--configs', nargs='+', default=['float32', 'float16', 'int8', 'pq96', 'ivf44x8-float16'])
+    bench_parser.add_argument('-k', type=int, default=4)
+    bench_parser.add_argument('--queries', help="Query embeddings as a .npy matrix (default: noisy corpus vectors)")
+    bench_parser.add_argument('--query-count', type=int, default=200)
+    bench_parser.add_argument('--vectors', help="Embeddings as a .npy matrix instead of index.faiss")
+    bench_parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    info_parser = subparsers.add_parser('info', help="Show an index's manifest and file sizes")
+    info_parser.add_argument('path')
+    args = parser.parse_args(argv)
+
+    if args.command == 'convert':
+        manifest = convert(args.source, args.out, args.dtype, args.vectors, args.embedding_model,
+                           args.pq_m, args.ivf_nlist, args.ivf_nprobe)
+        print(f"Wrote {manifest['count']} chunks ({manifest['dim']}-d {manifest['dtype']}) to {args.out or args.source}")
+        return 0
+
+    if args.command == 'bench':
+        results = bench(args.source, args.configs, args.k, args.queries, args.query_count, args.vectors)
+        if args.json:
+            print(json.dumps(results, indent=2))
+            return 0
+        recall = f'recall@{args.k}'
+        print(f"{'config':<20} {recall:>10} {'p50 ms':>8} {'p95 ms':>8} {'vector bytes':>14} {'build s':>8}")
+        for row in results:
+            print(f"{row['config']:<20} {row[recall]:>10.4f} {row['p50_ms']:>8.3f} {row['p95_ms']:>8.3f} "
+                  f"{row['vector_bytes']:>14,} {row['build_s']:>8.2f}")
+        return 0
+
+    start = time.perf_counter()
+    index = MmapIndex(args.path)
+    print(f"Opened in {(time.perf_counter() - start) * 1000:.2f} ms")
+    print(json.dumps(index.manifest, indent=2))
+    for name, size in _iter_sizes(args.path):
+        print(f"{name:<14} {size:>12,} bytes")
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
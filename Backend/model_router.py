@@ -0,0 +1,229 @@
+"""
+Per-tool and per-prompt model routing with automatic fallback.
+
+Which model serves a call is configured in ``model_routes.json`` (or the file
+named by ``MODEL_ROUTES_PATH``), not in code. Routes are looked up by the
+call's ``purpose`` (``call_claude_3``, ``gen_image_caption``, ...) and the tool
+making it, most specific first:
+
+    "<tool>:<purpose>"  ->  "<purpose>"  ->  "<tool>"  ->  "default"
+
+A route names a primary model and fallbacks. ``short_prompt`` sends prompts up
+to ``max_chars`` characters of user text to a faster model. When a model is
+throttled, times out or fails on the service side, ``bedrock`` retries the
+call on the next model in the route. To compare routes on latency and output
+size, run:
+
+    python model_router.py --benchmark [--cases model_routes_bench.json] [--runs 3]
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROUTES_PATH = os.environ.get('MODEL_ROUTES_PATH', os.path.join(BASE_DIR, 'model_routes.json'))
+BENCH_CASES_PATH = os.path.join(BASE_DIR, 'model_routes_bench.json')
+DEFAULT_MODEL_ID = os.environ.get('BEDROCK_MODEL_ID', 'anthropic.claude-3-sonnet-20240229-v1:0')
+
+# Errors worth retrying on a different model; anything else (bad request,
+# access denied) would fail the same way everywhere
+FALLBACK_ERROR_CODES = {
+    'ThrottlingException',
+    'TooManyRequestsException',
+    'ServiceQuotaExceededException',
+    'ServiceUnavailableException',
+    'InternalServerException',
+    'ModelTimeoutException',
+    'ModelNotReadyException',
+    'ModelErrorException',
+}
+FALLBACK_ERROR_TYPES = {
+    'ReadTimeoutError',
+    'ConnectTimeoutError',
+    'EndpointConnectionError',
+    'StreamError',
+    'LimiterTimeout',
+}
+
+
+def error_code(error: Exception) -> Optional[str]:
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        return response.get('Error', {}).get('Code')
+    return None
+
+
+def should_fall_back(error: Exception) -> bool:
+    """Whether a failed call may succeed on another model"""
+    return error_code(error) in FALLBACK_ERROR_CODES or type(error).__name__ in FALLBACK_ERROR_TYPES
+
+
+def prompt_chars(request: Dict[str, Any]) -> int:
+    """Characters of user text in a request, ignoring the system prompt and images"""
+    total = 0
+    for message in request.get('messages', []):
+        if message.get('role') != 'user':
+            continue
+        content = message.get('content')
+        if isinstance(content, str):
+            total += len(content)
+            continue
+        for block in content or []:
+            if block.get('type') == 'text':
+                total += len(block.get('text', ''))
+    return total
+
+
+class ModelRouter:
+    """Resolves the ordered list of models to try for a call"""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.models: Dict[str, str] = config.get('models', {})
+        self.default: Dict[str, Any] = config.get('default') or {'primary': DEFAULT_MODEL_ID}
+        self.routes: Dict[str, Dict[str, Any]] = config.get('routes', {})
+
+    def model_id(self, name: str) -> str:
+        """Model ID for a model alias; full model IDs pass through"""
+        return self.models.get(name, name)
+
+    def route(self, purpose: Optional[str] = None, tool: Optional[str] = None) -> Dict[str, Any]:
+        for key in (f"{tool}:{purpose}", purpose, tool):
+            if key and key in self.routes:
+                return self.routes[key]
+        return self.default
+
+    def candidates(self, purpose: Optional[str] = None, tool: Optional[str] = None,
+                   request: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Model IDs to try for a call, primary first"""
+        route = self.route(purpose, tool)
+        primary = route.get('primary', self.default.get('primary', DEFAULT_MODEL_ID))
+        short_prompt = route.get('short_prompt')
+        if short_prompt and request is not None and prompt_chars(request) <= short_prompt.get('max_chars', 0):
+            primary = short_prompt['model']
+
+        ordered: List[str] = []
+        for name in [primary, *route.get('fallbacks', [])]:
+            model_id = self.model_id(name)
+            if model_id not in ordered:
+                ordered.append(model_id)
+        return ordered
+
+
+def load_router(path: str = ROUTES_PATH) -> ModelRouter:
+    try:
+        with open(path, 'r') as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        logger.warning(f"Model routes not found at {path}, using {DEFAULT_MODEL_ID} for everything")
+        config = {}
+    return ModelRouter(config)
+
+
+_router: Optional[ModelRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ModelRouter:
+    """Load the routing config on first use and cache it for the container"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = load_router()
+    return _router
+
+
+def benchmark(cases: List[Dict[str, Any]], runs: int = 3) -> List[Dict[str, Any]]:
+    """
+    Run every case on every model of its route and report latency and output size.
+
+    Calls go to Bedrock (or whatever endpoint the client is configured for)
+    with the response cache bypassed.
+    """
+    import bedrock
+    import llm_cache
+
+    llm_cache.set_bypass(True)
+    router = get_router()
+    rows = []
+    for case in cases:
+        request = bedrock.build_request(
+            case.get('system', ''),
+            case['prompt'],
+            prefill=case.get('prefill'),
+            stop_sequences=case.get('stop_sequences'),
+        )
+        routed = router.candidates(case['purpose'], case.get('tool'), request)
+        for model_id in dict.fromkeys([*routed, *router.models.values()]):
+            latencies, output_tokens, output_chars = [], [], []
+            error = None
+            for _ in range(runs):
+                start = time.perf_counter()
+                try:
+                    body = bedrock.invoke(request, model_id=model_id, purpose=case['purpose'])
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                    break
+                latencies.append((time.perf_counter() - start) * 1000)
+                output_tokens.append((body.get('usage') or {}).get('output_tokens') or 0)
+                output_chars.append(len(bedrock.response_text(body) or ''))
+            rows.append({
+                'purpose': case['purpose'],
+                'model_id': model_id,
+                'routed': model_id == routed[0],
+                'runs': len(latencies),
+                'p50_ms': round(statistics.median(latencies), 1) if latencies else None,
+                'max_ms': round(max(latencies), 1) if latencies else None,
+                'output_tokens': round(statistics.mean(output_tokens), 1) if output_tokens else None,
+                'output_chars': round(statistics.mean(output_chars), 1) if output_chars else None,
+                'error': error,
+            })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Show or benchmark model routes")
+    parser.add_argument('--benchmark', action='store_true', help="Call each model of each route")
+    parser.add_argument('--cases', default=BENCH_CASES_PATH, help="Benchmark cases JSON file")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args(argv)
+
+    router = get_router()
+    if not args.benchmark:
+        for key in ['default', *router.routes]:
+            route = router.default if key == 'default' else router.routes[key]
+            print(f"{key}: {json.dumps(route)}")
+        return 0
+
+    with open(args.cases) as f:
+        cases = json.load(f)
+    rows = benchmark(cases, args.runs)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return 0
+    print(f"{'purpose':<22} {'model':<45} {'p50 ms':>8} {'max ms':>8} {'out tok':>8} {'out chr':>8}")
+    for row in rows:
+        marker = '*' if row['routed'] else ' '
+        if row['error']:
+            print(f"{row['purpose']:<22} {row['model_id']:<44}{marker} {row['error']}")
+            continue
+        print(
+            f"{row['purpose']:<22} {row['model_id']:<44}{marker} {row['p50_ms']:>8} {row['max_ms']:>8} "
+            f"{row['output_tokens']:>8} {row['output_chars']:>8}"
+        )
+    print("* = model the route currently picks")
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(main())
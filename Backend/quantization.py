@@ -0,0 +1,116 @@
+"""
+Vector compression and partitioning for ``mmap_index``, in plain numpy.
+
+- int8: each vector scaled by its largest component into -127..127 (4x
+  smaller than float32);
+- product quantization (PQ): each vector split into ``m`` sub-vectors, each
+  stored as the one-byte ID of its nearest of 256 trained centroids
+  (``4 * dim / m`` times smaller);
+- IVF: vectors partitioned by k-means into ``nlist`` lists, with only the
+  ``nprobe`` lists closest to the query scanned.
+
+All of these trade recall for memory and speed. ``mmap_index.py bench``
+measures the trade for the corpus at hand.
+"""
+import logging
+from typing import List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PQ_CENTROIDS = 256
+# Rows per block when computing distances to centroids, to bound temporaries
+_BLOCK = 4096
+
+
+def squared_distances(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Squared L2 distance from every row of ``x`` to every centroid"""
+    centroid_norms = (centroids * centroids).sum(axis=1)
+    out = np.empty((len(x), len(centroids)), dtype=np.float32)
+    for start in range(0, len(x), _BLOCK):
+        block = x[start:start + _BLOCK]
+        out[start:start + len(block)] = (
+            (block * block).sum(axis=1, keepdims=True) - 2 * block @ centroids.T + centroid_norms
+        )
+    return out
+
+
+def kmeans(x: np.ndarray, k: int, iterations: int = 20, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Lloyd's k-means; returns (centroids, assignment of each row)"""
+    x = np.asarray(x, dtype=np.float32)
+    k = min(k, len(x))
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), size=k, replace=False)].copy()
+    assignment = np.zeros(len(x), dtype=np.int64)
+    for _ in range(iterations):
+        assignment = squared_distances(x, centroids).argmin(axis=1)
+        counts = np.bincount(assignment, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, x)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Re-seed empty clusters on random points so every list gets used
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = x[rng.choice(len(x), size=len(empty), replace=False)]
+    return centroids, assignment
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(int8 codes, float32 per-row scale) with ``vector ~= codes * scale / 127``"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1)
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None] * 127), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def pq_train(vectors: np.ndarray, m: int, iterations: int = 15, seed: int = 0) -> np.ndarray:
+    """Codebooks of shape (m, 256, dim / m)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    dim = vectors.shape[1]
+    if dim % m:
+        raise ValueError(f"PQ needs m to divide the dimension ({dim} % {m} != 0)")
+    sub = dim // m
+    codebooks = np.zeros((m, PQ_CENTROIDS, sub), dtype=np.float32)
+    for part in range(m):
+        centroids, _ = kmeans(vectors[:, part * sub:(part + 1) * sub], PQ_CENTROIDS, iterations, seed + part)
+        codebooks[part, :len(centroids)] = centroids
+        if len(centroids) < PQ_CENTROIDS:
+            # Fewer vectors than centroids: pad with copies that are never the unique nearest
+            codebooks[part, len(centroids):] = centroids[0]
+    return codebooks
+
+
+def pq_encode(vectors: np.ndarray, codebooks: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    m, _, sub = codebooks.shape
+    codes = np.zeros((len(vectors), m), dtype=np.uint8)
+    for part in range(m):
+        codes[:, part] = squared_distances(vectors[:, part * sub:(part + 1) * sub], codebooks[part]).argmin(axis=1)
+    return codes
+
+
+def pq_tables(query: np.ndarray, codebooks: np.ndarray, metric: str) -> np.ndarray:
+    """Per-sub-vector lookup tables: squared distance (l2) or dot product (ip) to each centroid"""
+    m, _, sub = codebooks.shape
+    query_parts = np.asarray(query, dtype=np.float32).reshape(m, 1, sub)
+    if metric == 'ip':
+        return (codebooks * query_parts).sum(axis=2)
+    diff = codebooks - query_parts
+    return (diff * diff).sum(axis=2)
+
+
+def pq_scores(codes: np.ndarray, tables: np.ndarray) -> np.ndarray:
+    """Asymmetric distance (or similarity) of each coded row from the query"""
+    return tables[np.arange(tables.shape[0]), codes.astype(np.int64)].sum(axis=1)
+
+
+def ivf_partition(vectors: np.ndarray, nlist: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray, List[int]]:
+    """(centroids, row ids grouped by list, list offsets of length nlist + 1)"""
+    centroids, assignment = kmeans(vectors, nlist, seed=seed)
+    order = np.argsort(assignment, kind='stable').astype(np.uint32)
+    counts = np.bincount(assignment, minlength=len(centroids))
+    offsets = [0] + np.cumsum(counts).tolist()
+    return centroids, order, [int(offset) for offset in offsets]
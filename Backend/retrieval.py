@@ -0,0 +1,275 @@
+"""
+Container-lifetime retrieval over the Well-Architected vector index.
+
+The embeddings client and the index are loaded once per container and shared
+by every request (and every thread) afterwards, so a query only pays for the
+query embedding and the search itself; repeated questions skip even the
+embedding, through ``embedding_cache``. When the index directory holds a
+``mmap_index`` (``manifest.json``), it is memory-mapped instead of unpickling
+the FAISS docstore. Queries are embedded by the ``embedding_backends`` model
+in ``EMBEDDING_MODEL``, which must match the model the index was built with.
+
+Search is hybrid (``RETRIEVAL_MODE=hybrid``). A BM25 ``lexical_index`` over
+the same chunks runs first. If its top hit covers a short keyword query or a
+best-practice ID outright, the hit is returned without embedding the query.
+BM25 and chunk lookups read the chunk text straight from the index directory,
+so they never load the vector store or the embeddings client.
+Otherwise the BM25 and vector rankings are fused by reciprocal rank. If the
+embedding call fails or takes longer than ``RETRIEVAL_EMBED_TIMEOUT_MS``, the
+BM25 ranking is used on its own.
+"""
+import contextvars
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional, Sequence, Tuple
+
+import metrics
+from metrics import span
+from tools.lazy import record_init
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INDEX_PATH = os.environ.get('LOCAL_INDEX_PATH', os.path.join(BASE_DIR, 'local_index'))
+# hybrid, vector (embeddings only) or lexical (BM25 only)
+MODE = os.environ.get('RETRIEVAL_MODE', 'hybrid').lower()
+CANDIDATES = int(os.environ.get('RETRIEVAL_CANDIDATES', '20'))
+EMBED_TIMEOUT_MS = float(os.environ.get('RETRIEVAL_EMBED_TIMEOUT_MS', '1500'))
+# Lexical fast path: short keyword queries whose top hit has (nearly) every term
+LEXICAL_MAX_TERMS = int(os.environ.get('RETRIEVAL_LEXICAL_MAX_TERMS', '4'))
+LEXICAL_MIN_COVERAGE = float(os.environ.get('RETRIEVAL_LEXICAL_MIN_COVERAGE', '0.9'))
+
+
+class RetrievalService:
+    """Lazily loaded, thread-safe wrapper around the vector store and BM25 index"""
+
+    def __init__(self, index_path: str = INDEX_PATH):
+        self.index_path = index_path
+        self._vectorstore = None
+        self._embeddings = None
+        self._lexical = None
+        self._chunks = None
+        self._index_version: Optional[str] = None
+        self._lock = threading.Lock()
+        self._chunks_lock = threading.Lock()
+        self._embed_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='embed-query')
+
+    @property
+    def loaded(self) -> bool:
+        return self._vectorstore is not None
+
+    def _load(self):
+        from embedding_backends import check_index, get_backend
+        from embedding_cache import cached_embeddings
+        from mmap_index import MmapVectorStore, is_mmap_index
+
+        start = time.perf_counter()
+        backend = get_backend()
+        # Local embedders are cheaper than a cache lookup
+        embeddings = cached_embeddings(backend, model_id=backend.model_id) if backend.remote else backend
+        if is_mmap_index(self.index_path):
+            vectorstore = MmapVectorStore.load(self.index_path, embeddings)
+            check_index(backend, vectorstore.index.embedding_model, vectorstore.index.dim, self.index_path)
+        else:
+            from langchain_community.vectorstores import FAISS
+
+            vectorstore = FAISS.load_local(self.index_path, embeddings)
+            check_index(backend, None, vectorstore.index.d, self.index_path)
+        self._embeddings = embeddings
+        record_init('retrieval', 'load_index', time.perf_counter() - start)
+        return vectorstore
+
+    def vectorstore(self):
+        """Return the shared vector store, loading it on first use"""
+        if self._vectorstore is None:
+            with self._lock:
+                if self._vectorstore is None:
+                    try:
+                        self._vectorstore = self._load()
+                    except Exception as e:
+                        logger.error(f"Failed to load vector index from {self.index_path}: {e}")
+                        raise
+        return self._vectorstore
+
+    def _load_chunks(self):
+        from mmap_index import Chunk, MmapIndex, is_mmap_index, read_langchain_docstore
+
+        start = time.perf_counter()
+        if is_mmap_index(self.index_path):
+            chunks = MmapIndex(self.index_path)
+        else:
+            # Read the pickled docstore directly, without LangChain or FAISS
+            texts, metadatas = read_langchain_docstore(os.path.join(self.index_path, 'index.pkl'))
+            chunks = [Chunk(i, text, metadata) for i, (text, metadata) in enumerate(zip(texts, metadatas))]
+        record_init('retrieval', 'load_chunks', time.perf_counter() - start)
+        return chunks
+
+    def chunks(self):
+        """
+        Chunk text and metadata, loaded on first use independently of the
+        vector store, so BM25 retrieval works when the vector index or the
+        embeddings client cannot load
+        """
+        if self._chunks is None:
+            with self._chunks_lock:
+                if self._chunks is None:
+                    self._chunks = self._load_chunks()
+        return self._chunks
+
+    def _load_lexical(self):
+        from lexical_index import LexicalIndex, has_lexical_index
+
+        start = time.perf_counter()
+        if has_lexical_index(self.index_path):
+            lexical = LexicalIndex.load(self.index_path)
+        else:
+            logger.warning(f"No BM25 index in {self.index_path}, building one in memory")
+            lexical = LexicalIndex.build(self._corpus_texts())
+        record_init('retrieval', 'load_lexical_index', time.perf_counter() - start)
+        return lexical
+
+    def lexical(self):
+        """Return the shared BM25 index, loading it on first use"""
+        if self._lexical is None:
+            with self._lock:
+                if self._lexical is None:
+                    self._lexical = self._load_lexical()
+        return self._lexical
+
+    def warm(self):
+        """Load the indexes ahead of the first query, e.g. from a warm-up event"""
+        self.chunks()
+        if MODE != 'lexical':
+            self.vectorstore()
+        if MODE != 'vector':
+            self.lexical()
+
+    def _is_mmap(self) -> bool:
+        from mmap_index import MmapVectorStore
+
+        return isinstance(self.vectorstore(), MmapVectorStore)
+
+    def _corpus_texts(self) -> List[str]:
+        chunks = self.chunks()
+        return [self.document(i).page_content for i in range(len(chunks))]
+
+    def document(self, index: int) -> Any:
+        """The chunk at position ``index`` of the index"""
+        chunks = self.chunks()
+        return chunks[index] if isinstance(chunks, list) else chunks.chunk(index)
+
+    def index_version(self) -> str:
+        """Identifies the index contents; changes whenever the index is rebuilt"""
+        if self._index_version is None:
+            chunks = self.chunks()
+            if not isinstance(chunks, list) and chunks.manifest.get('index_version'):
+                self._index_version = chunks.manifest['index_version']
+            else:
+                # Indexes not built by ingest.py: fingerprint the files
+                digest = hashlib.sha256()
+                for name in sorted(os.listdir(self.index_path)):
+                    stat = os.stat(os.path.join(self.index_path, name))
+                    digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode('utf-8'))
+                self._index_version = digest.hexdigest()[:16]
+        return self._index_version
+
+    def embed_query(self, query: str, timeout_ms: Optional[float] = EMBED_TIMEOUT_MS) -> List[float]:
+        """Embed a query; raises ``TimeoutError`` if it takes longer than ``timeout_ms``"""
+        self.vectorstore()
+        if not timeout_ms:
+            return self._embeddings.embed_query(query)
+        context = contextvars.copy_context()
+        future = self._embed_executor.submit(context.run, self._embeddings.embed_query, query)
+        # A late embedding still finishes in the background and lands in the embedding cache
+        return future.result(timeout=timeout_ms / 1000)
+
+    def vector_search(self, vector: Sequence[float], k: int = 4) -> List[Tuple[int, float]]:
+        """(chunk index, distance) pairs for the ``k`` nearest chunks"""
+        vectorstore = self.vectorstore()
+        with span('vector_search'):
+            if self._is_mmap():
+                return vectorstore.index.nearest(vector, k)
+            import numpy as np
+
+            distances, ids = vectorstore.index.search(np.asarray([vector], dtype=np.float32), k)
+            return [(int(i), float(d)) for i, d in zip(ids[0], distances[0]) if i >= 0]
+
+    def lexical_search(self, query: str, k: int = 4) -> List[Tuple[int, float]]:
+        with span('lexical_search'):
+            return self.lexical().search(query, k)
+
+    def lexically_confident(self, query: str, hits: List[Tuple[int, float]]) -> bool:
+        """Whether BM25 alone can answer: an ID or short keyword query fully matched by its top hit"""
+        from lexical_index import is_identifier, tokenize
+
+        if not hits:
+            return False
+        lexical = self.lexical()
+        terms = set(tokenize(query))
+        if any(is_identifier(term) and term in lexical.terms for term in terms):
+            return True
+        return len(terms) <= LEXICAL_MAX_TERMS and lexical.coverage(query, hits[0][0]) >= LEXICAL_MIN_COVERAGE
+
+    def rank(self, query: str, k: int = 4,
+             mode: Optional[str] = None) -> Tuple[str, List[Tuple[int, float]], Optional[List[float]]]:
+        """
+        The retrieval path taken, the top ``k`` (chunk index, score) pairs and
+        the query embedding, or None when the path did not need one.
+
+        Scores depend on the path: BM25 score (``lexical``,
+        ``lexical_fallback``), vector distance (``vector``) or fused rank score
+        (``hybrid``). ``mode`` overrides ``RETRIEVAL_MODE`` for this query.
+        """
+        from lexical_index import reciprocal_rank_fusion
+
+        mode = mode or MODE
+        vector = None
+        with span('retrieval'):
+            if mode == 'vector':
+                vector = self.embed_query(query, timeout_ms=None)
+                path, ranked = 'vector', self.vector_search(vector, k)
+            else:
+                hits = self.lexical_search(query, max(k, CANDIDATES))
+                if mode == 'lexical' or self.lexically_confident(query, hits):
+                    path, ranked = 'lexical', hits[:k]
+                else:
+                    try:
+                        vector = self.embed_query(query)
+                    except Exception as e:
+                        if not hits:
+                            raise
+                        logger.warning(f"Query embedding failed or timed out ({type(e).__name__}), using BM25 only")
+                        path, ranked = 'lexical_fallback', hits[:k]
+                    else:
+                        vector_hits = self.vector_search(vector, max(k, CANDIDATES))
+                        fused = reciprocal_rank_fusion([[i for i, _ in hits], [i for i, _ in vector_hits]])
+                        path, ranked = 'hybrid', fused[:k]
+            metrics.increment(f"retrieval_{path}")
+            metrics.set_property('retrieval_path', path)
+            return path, ranked, vector
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[Any, float]]:
+        """Top ``k`` chunks with their scores; see ``rank`` for what the scores mean"""
+        _, ranked, _ = self.rank(query, k)
+        return [(self.document(i), score) for i, score in ranked]
+
+    def similarity_search(self, query: str, k: int = 4) -> List[Any]:
+        return [document for document, _ in self.search(query, k=k)]
+
+
+_service: Optional[RetrievalService] = None
+_service_lock = threading.Lock()
+
+
+def get_retrieval_service() -> RetrievalService:
+    """Process-wide retrieval service shared by all requests in the container"""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = RetrievalService()
+    return _service
@@ -0,0 +1,145 @@
+"""
+Semantic cache of Well-Architected answers, keyed by question meaning.
+
+"How do I make RDS highly available" and "RDS HA best practice" differ as
+text, so the exact-match ``llm_cache`` misses. Their embeddings, however, are
+close. ``SemanticCache`` keeps the unit-normalized embedding of each answered
+question as a row of one matrix. A lookup is a single matrix-vector product,
+and the stored answer is returned when the best cosine similarity reaches
+``SEMANTIC_CACHE_THRESHOLD``.
+
+Every entry belongs to a version: the retrieval index version plus whatever
+else shapes the answer (prompt, context settings). A lookup or store with a
+new version clears the cache, so a rebuilt index never serves stale answers.
+Entries also expire after ``SEMANTIC_CACHE_TTL``, and the least recently used
+entry makes room once ``SEMANTIC_CACHE_ITEMS`` is reached.
+
+The embedding is the one retrieval already computed for the query, so the
+cache costs no extra model call. Queries that retrieval answers from BM25
+alone (``RetrievalService.rank`` returns no embedding) skip the cache.
+
+Per request, ``semantic_cache_hit``/``semantic_cache_miss`` are counted and
+the best similarity is recorded as ``semantic_cache_similarity``. ``stats()``
+gives hit rate and size for the container's lifetime. A request with
+``no_cache`` (``llm_cache.set_bypass``) skips lookups but still stores its
+answer.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+import llm_cache
+import metrics
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get('SEMANTIC_CACHE_ENABLED', 'true').lower() != 'false'
+THRESHOLD = float(os.environ.get('SEMANTIC_CACHE_THRESHOLD', '0.95'))
+MAX_ITEMS = int(os.environ.get('SEMANTIC_CACHE_ITEMS', '1024'))
+TTL_SECONDS = int(os.environ.get('SEMANTIC_CACHE_TTL', '86400'))
+
+
+class SemanticCache:
+    """Thread-safe nearest-question cache over a preallocated embedding matrix"""
+
+    def __init__(self, threshold: float = THRESHOLD, max_items: int = MAX_ITEMS, ttl_seconds: int = TTL_SECONDS):
+        self.threshold = threshold
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self.version: Optional[str] = None
+        self._matrix: Optional[np.ndarray] = None
+        self._values: list = [None] * max_items
+        self._expires = np.zeros(max_items, dtype=np.float64)
+        self._used = np.zeros(max_items, dtype=np.float64)
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'invalidations': 0}
+        self._lock = threading.Lock()
+
+    def _check_version(self, version: str):
+        if version != self.version:
+            if self.version is not None:
+                self._stats['invalidations'] += 1
+                logger.info(f"Semantic cache version changed from {self.version} to {version}, clearing it")
+            self.version = version
+            self._expires[:] = 0
+            self._values = [None] * self.max_items
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> Optional[np.ndarray]:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else None
+
+    def lookup(self, vector: Sequence[float], version: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """(stored value, similarity) of the closest live question, if it is close enough"""
+        if llm_cache.is_bypassed():
+            metrics.increment('semantic_cache_bypass')
+            return None
+        query = self._normalize(vector)
+        with self._lock:
+            self._check_version(version)
+            live = self._expires > time.time()
+            best, similarity, value = None, 0.0, None
+            if query is not None and self._matrix is not None and live.any():
+                if self._matrix.shape[1] != query.size:
+                    raise ValueError(f"Query has {query.size} dimensions, cached questions have {self._matrix.shape[1]}")
+                similarities = np.where(live, self._matrix @ query, -1.0)
+                best = int(np.argmax(similarities))
+                similarity = float(similarities[best])
+            hit = best is not None and similarity >= self.threshold
+            self._stats['hits' if hit else 'misses'] += 1
+            if hit:
+                self._used[best] = time.monotonic()
+                value = self._values[best]
+        metrics.increment('semantic_cache_hit' if hit else 'semantic_cache_miss')
+        metrics.gauge('semantic_cache_similarity', round(similarity, 4))
+        return (value, similarity) if hit else None
+
+    def store(self, vector: Sequence[float], version: str, value: Dict[str, Any]):
+        query = self._normalize(vector)
+        if query is None:
+            return
+        with self._lock:
+            self._check_version(version)
+            if self._matrix is None or self._matrix.shape[1] != query.size:
+                self._matrix = np.zeros((self.max_items, query.size), dtype=np.float32)
+                self._expires[:] = 0
+            now = time.time()
+            expired = np.flatnonzero(self._expires <= now)
+            slot = int(expired[0]) if len(expired) else int(np.argmin(self._used))
+            self._matrix[slot] = query
+            self._values[slot] = value
+            self._expires[slot] = now + self.ttl_seconds
+            self._used[slot] = time.monotonic()
+            self._stats['stores'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = int((self._expires > time.time()).sum())
+            stats['version'] = self.version
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+_caches: Dict[str, SemanticCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_semantic_cache(name: str) -> Optional[SemanticCache]:
+    """Process-wide cache for one tool, or None when disabled"""
+    if not ENABLED:
+        return None
+    if name not in _caches:
+        with _caches_lock:
+            if name not in _caches:
+                _caches[name] = SemanticCache()
+    return _caches[name]
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    return {name: cache.stats() for name, cache in list(_caches.items())}
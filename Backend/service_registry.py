@@ -0,0 +1,223 @@
+"""
+Registry of the AWS node classes available in the installed diagrams library.
+
+The registry is generated once when the image is built:
+
+    python service_registry.py --output service_registry.json
+
+Generation imports every ``diagrams.aws`` module, instantiates each node class
+inside a throwaway diagram context and records class -> module -> icon path for
+the classes that work. At runtime the artifact is loaded lazily on first use, so
+requests never scan or instantiate the library themselves.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REGISTRY_PATH = os.environ.get(
+    'SERVICE_REGISTRY_PATH',
+    os.path.join(BASE_DIR, 'service_registry.json')
+)
+FALLBACK_MAPPING_PATH = os.path.join(BASE_DIR, 'diag_mapping.json')
+REGISTRY_VERSION = 1
+
+# Service names the model tends to produce that are not diagrams classes,
+# mapped to the class that should be used instead
+SERVICE_ALIASES = {
+    'DynamoDB': 'Dynamodb',
+    'DynamoDb': 'Dynamodb',
+    'EventBridge': 'Eventbridge',
+    'CloudWatch': 'Cloudwatch',
+    'CloudWatchAlarm': 'CloudwatchAlarm',
+    'CloudTrail': 'Cloudtrail',
+    'SecretManager': 'SecretsManager',
+}
+
+
+class ServiceRegistry:
+    """Read-only view over the generated service registry"""
+
+    def __init__(self, services: Dict[str, Tuple[str, Optional[str]]],
+                 aliases: Dict[str, str], source: str):
+        self._services = services
+        self._aliases = {
+            alias: target for alias, target in aliases.items()
+            if target in services and alias not in services
+        }
+        self.source = source
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._services or name in self._aliases
+
+    def __len__(self) -> int:
+        return len(self._services)
+
+    def resolve(self, name: str) -> Optional[Tuple[str, str]]:
+        """Return ``(module, class_name)`` for a service or alias name"""
+        class_name = self._aliases.get(name, name)
+        entry = self._services.get(class_name)
+        if entry is None:
+            return None
+        return entry[0], class_name
+
+    def module_for(self, name: str) -> Optional[str]:
+        resolved = self.resolve(name)
+        return resolved[0] if resolved else None
+
+    def icon_path(self, name: str) -> Optional[str]:
+        """Icon path relative to the diagrams package root, if known"""
+        resolved = self.resolve(name)
+        if resolved is None:
+            return None
+        return self._services[resolved[1]][1]
+
+    def service_modules(self) -> Dict[str, str]:
+        """Mapping of class name -> ``diagrams.aws`` module name"""
+        return {name: entry[0] for name, entry in self._services.items()}
+
+    def aliases(self) -> Dict[str, str]:
+        return dict(self._aliases)
+
+
+_registry: Optional[ServiceRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def _load_registry_file(path: str) -> ServiceRegistry:
+    with open(path, 'r') as f:
+        data = json.load(f)
+    if data.get('version') != REGISTRY_VERSION:
+        raise ValueError(f"Unsupported service registry version: {data.get('version')}")
+    services = {
+        name: (entry[0], entry[1] if len(entry) > 1 else None)
+        for name, entry in data['services'].items()
+    }
+    return ServiceRegistry(services, data.get('aliases', {}), source=path)
+
+
+def _load_fallback_mapping(path: str) -> ServiceRegistry:
+    with open(path, 'r') as f:
+        mapping = json.load(f)
+    services = {
+        name: (module, None) for name, module in mapping.items()
+        if not name.startswith('_')
+    }
+    return ServiceRegistry(services, SERVICE_ALIASES, source=path)
+
+
+def get_registry() -> ServiceRegistry:
+    """Load the service registry on first use and cache it for the container"""
+    global _registry
+    if _registry is not None:
+        return _registry
+    with _registry_lock:
+        if _registry is None:
+            try:
+                _registry = _load_registry_file(REGISTRY_PATH)
+            except FileNotFoundError:
+                # Local runs without a built image only have the static mapping
+                logger.warning(
+                    f"Service registry not found at {REGISTRY_PATH}, "
+                    f"falling back to {FALLBACK_MAPPING_PATH}"
+                )
+                _registry = _load_fallback_mapping(FALLBACK_MAPPING_PATH)
+            logger.info(f"Loaded {len(_registry)} AWS services from {_registry.source}")
+    return _registry
+
+
+def build_registry(module_names: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Scan the installed diagrams library and verify every AWS node class.
+
+    This is the only place the library is scanned; it is meant to run at
+    build time, not in the request path.
+    """
+    import importlib
+    import pkgutil
+    import tempfile
+    from importlib.metadata import version
+
+    import diagrams
+    import diagrams.aws
+    from diagrams import Diagram, Node, setdiagram
+
+    if module_names is None:
+        module_names = sorted(
+            info.name for info in pkgutil.iter_modules(diagrams.aws.__path__)
+            if not info.name.startswith('_')
+        )
+
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(diagrams.__file__)))
+    services: Dict[str, List[Optional[str]]] = {}
+    rejected: Dict[str, str] = {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Nodes need a diagram context; setting it directly avoids rendering
+        setdiagram(Diagram("registry", filename=os.path.join(tmp_dir, "registry"), show=False))
+        try:
+            for module_name in module_names:
+                module = importlib.import_module(f"diagrams.aws.{module_name}")
+                for class_name in dir(module):
+                    if class_name.startswith('_'):
+                        continue
+                    service_class = getattr(module, class_name)
+                    if not isinstance(service_class, type) or not issubclass(service_class, Node):
+                        continue
+                    try:
+                        service_class("test")
+                    except Exception as e:
+                        rejected[f"{module_name}.{class_name}"] = str(e)
+                        continue
+
+                    icon = None
+                    if service_class._icon_dir and service_class._icon:
+                        icon = os.path.join(service_class._icon_dir, service_class._icon)
+                        if not os.path.exists(os.path.join(package_root, icon)):
+                            rejected[f"{module_name}.{class_name}"] = f"missing icon {icon}"
+                            continue
+                    services[class_name] = [module_name, icon]
+        finally:
+            setdiagram(None)
+
+    return {
+        'version': REGISTRY_VERSION,
+        'diagrams_version': version('diagrams'),
+        'modules': module_names,
+        'services': dict(sorted(services.items())),
+        'aliases': {
+            alias: target for alias, target in SERVICE_ALIASES.items()
+            if target in services and alias not in services
+        },
+        'rejected': rejected,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate the AWS diagrams service registry")
+    parser.add_argument('--output', default=REGISTRY_PATH, help="Path of the registry artifact")
+    parser.add_argument('--module', action='append', dest='modules',
+                        help="Only scan this diagrams.aws module (repeatable)")
+    args = parser.parse_args(argv)
+
+    registry = build_registry(args.modules)
+    with open(args.output, 'w') as f:
+        json.dump(registry, f, separators=(',', ':'))
+
+    print(
+        f"Wrote {len(registry['services'])} services from {len(registry['modules'])} modules "
+        f"to {args.output} ({len(registry['rejected'])} rejected)"
+    )
+    for name, reason in sorted(registry['rejected'].items()):
+        print(f"  rejected {name}: {reason}")
+    return 0 if registry['services'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,339 @@
+"""
+Query-aware selection of the AWS services shown to the diagram model.
+
+The full catalog has over 500 node classes; interpolating all of them into the
+system prompt costs thousands of input tokens per diagram. ``select_services``
+instead scores every registry class against the query, using the words in
+its class name, curated keywords, aliases and its category (the diagrams
+module), and returns the few dozen best matches plus a fixed core set that
+almost every architecture uses. Names outside the subset still resolve when
+imports are corrected, so a subset miss costs accuracy, not a crash.
+
+The index is built once per container from the service registry. To measure
+the token reduction and how often a query's expected services are missing
+from its subset (each one a likely import error), run:
+
+    python service_selector.py --benchmark [--cases service_selector_cases.json]
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import re
+import sys
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+from service_registry import get_registry
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ENABLED = os.environ.get('SERVICE_SELECTOR_ENABLED', 'true').lower() != 'false'
+MAX_SERVICES = int(os.environ.get('SERVICE_SELECTOR_MAX', '30'))
+CASES_PATH = os.path.join(BASE_DIR, 'service_selector_cases.json')
+
+# Always offered: the building blocks of most request/response, data and
+# messaging architectures
+CORE_SERVICES = [
+    'Users', 'Client', 'APIGateway', 'Lambda', 'EC2', 'ECS', 'ELB', 'S3',
+    'Dynamodb', 'RDS', 'SQS', 'SNS', 'CloudFront', 'Route53', 'Cognito',
+    'IAM', 'Cloudwatch', 'VPC',
+]
+
+# Words people use for a service that do not appear in its class name
+SERVICE_KEYWORDS = {
+    'APIGateway': ['api', 'rest', 'http', 'endpoint', 'gateway', 'websocket'],
+    'Appsync': ['graphql'],
+    'Lambda': ['function', 'functions', 'serverless', 'faas'],
+    'S3': ['bucket', 'object', 'storage', 'static', 'website', 'file', 'files', 'upload', 'datalake'],
+    'Dynamodb': ['dynamo', 'nosql', 'table', 'keyvalue'],
+    'RDS': ['sql', 'relational', 'database', 'db'],
+    'RDSPostgresqlInstance': ['postgres', 'postgresql'],
+    'RDSMysqlInstance': ['mysql'],
+    'Aurora': ['sql', 'relational'],
+    'DocumentDB': ['mongo', 'mongodb', 'document'],
+    'ElastiCache': ['cache', 'caching', 'redis', 'memcached'],
+    'SQS': ['queue', 'queues', 'buffer', 'decouple'],
+    'SNS': ['notification', 'notifications', 'topic', 'pubsub', 'fanout', 'email', 'sms'],
+    'Eventbridge': ['event', 'events', 'eventbridge', 'bus', 'schedule', 'cron'],
+    'StepFunctions': ['workflow', 'orchestration', 'state', 'machine'],
+    'MQ': ['activemq', 'rabbitmq', 'broker'],
+    'ManagedStreamingForKafka': ['kafka', 'msk'],
+    'Kinesis': ['stream', 'streaming', 'realtime', 'clickstream'],
+    'KinesisDataFirehose': ['firehose', 'delivery', 'ingest'],
+    'CloudFront': ['cdn', 'edge', 'cache', 'distribution'],
+    'Route53': ['dns', 'domain'],
+    'ELB': ['load', 'balancer', 'balancing'],
+    'ALB': ['load', 'balancer', 'application'],
+    'NLB': ['load', 'balancer', 'network'],
+    'EC2': ['server', 'servers', 'vm', 'instance', 'instances', 'compute'],
+    'EC2AutoScaling': ['autoscaling', 'scaling', 'scale'],
+    'ECS': ['container', 'containers', 'docker'],
+    'EKS': ['kubernetes', 'k8s', 'container', 'containers'],
+    'Fargate': ['container', 'containers', 'serverless'],
+    'EC2ContainerRegistry': ['ecr', 'registry', 'image', 'images'],
+    'Cognito': ['auth', 'authentication', 'login', 'signin', 'signup', 'users', 'identity'],
+    'IAM': ['permission', 'permissions', 'role', 'roles', 'policy', 'access'],
+    'SecretsManager': ['secret', 'secrets', 'credential', 'credentials', 'password'],
+    'KMS': ['encryption', 'encrypt', 'key', 'keys'],
+    'WAF': ['firewall', 'protection'],
+    'Shield': ['ddos'],
+    'CertificateManager': ['certificate', 'tls', 'ssl', 'https', 'acm'],
+    'Cloudwatch': ['monitoring', 'monitor', 'metrics', 'logs', 'logging', 'alarm', 'alarms', 'observability'],
+    'Cloudtrail': ['audit', 'auditing'],
+    'XRay': ['tracing', 'trace'],
+    'Redshift': ['warehouse', 'warehousing', 'analytics', 'bi'],
+    'Athena': ['query', 'sql', 'adhoc'],
+    'Glue': ['etl', 'catalog', 'crawler'],
+    'Quicksight': ['dashboard', 'dashboards', 'visualization', 'bi', 'reporting'],
+    'EMR': ['hadoop', 'spark', 'bigdata'],
+    'ElasticsearchService': ['search', 'opensearch', 'elasticsearch', 'fulltext'],
+    'Sagemaker': ['ml', 'machine', 'learning', 'model', 'training', 'inference', 'ai'],
+    'Rekognition': ['image', 'video', 'face', 'vision'],
+    'Comprehend': ['nlp', 'sentiment', 'text'],
+    'Textract': ['ocr', 'document', 'extract'],
+    'Transcribe': ['speech', 'audio', 'transcription'],
+    'Polly': ['tts', 'voice'],
+    'Lex': ['chatbot', 'bot', 'conversational'],
+    'SES': ['email', 'mail'],
+    'Amplify': ['frontend', 'web', 'mobile', 'app'],
+    'Users': ['user', 'users', 'customer', 'customers', 'browser'],
+    'Client': ['client', 'frontend'],
+    'MobileClient': ['mobile', 'ios', 'android', 'phone'],
+    'VPC': ['network', 'subnet', 'private', 'vpc'],
+    'NATGateway': ['nat', 'outbound'],
+    'InternetGateway': ['internet'],
+    'DirectConnect': ['onprem', 'onpremises', 'datacenter', 'hybrid'],
+    'TransitGateway': ['multivpc', 'hub'],
+    'EFS': ['nfs', 'shared', 'filesystem'],
+    'Backup': ['backup', 'backups', 'restore', 'dr'],
+    'Codepipeline': ['cicd', 'ci', 'cd', 'pipeline', 'deployment'],
+    'Codebuild': ['build', 'cicd'],
+    'Codecommit': ['git', 'repository'],
+    'Cloudformation': ['iac', 'infrastructure', 'template'],
+    'IotCore': ['iot', 'device', 'devices', 'sensor', 'sensors'],
+}
+
+# Category words in a query pull in that diagrams module, weakly
+CATEGORY_KEYWORDS = {
+    'analytics': ['analytics', 'analysis', 'etl'],
+    'compute': ['compute', 'server', 'servers'],
+    'database': ['database', 'databases', 'db', 'datastore'],
+    'devtools': ['devops', 'cicd'],
+    'integration': ['integration', 'messaging', 'queue', 'events'],
+    'iot': ['iot', 'device', 'devices', 'sensor', 'sensors'],
+    'management': ['monitoring', 'management', 'governance', 'observability'],
+    'ml': ['ml', 'ai', 'machine', 'learning'],
+    'network': ['network', 'networking', 'vpc'],
+    'security': ['security', 'secure', 'compliance'],
+    'storage': ['storage', 'backup', 'archive'],
+}
+
+# Connective words that appear in class names (ApacheMxnetOnAWS, ToolsAndSdks)
+# but say nothing about which service a query wants
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'aws', 'amazon', 'be', 'behind', 'by',
+    'for', 'from', 'in', 'into', 'is', 'it', 'of', 'on', 'or', 'that', 'the',
+    'their', 'then', 'through', 'to', 'using', 'via', 'when', 'which', 'with',
+}
+
+_NAME_PART = re.compile(r'[A-Z]+[0-9]*(?=[A-Z][a-z]|$)|[A-Z]?[a-z]+[0-9]*|[0-9]+')
+_WORD = re.compile(r'[A-Za-z0-9]+')
+
+
+def _normalize(token: str) -> str:
+    token = token.lower()
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        token = token[:-1]
+    return token
+
+
+def name_tokens(class_name: str) -> List[str]:
+    """Words of a CamelCase class name, e.g. EC2AutoScaling -> ec2, auto, scaling"""
+    return [_normalize(part) for part in _NAME_PART.findall(class_name)]
+
+
+def query_tokens(query: str) -> Set[str]:
+    """Normalized query words plus adjacent pairs joined (route 53 -> route53)"""
+    tokens: Set[str] = set()
+    words = _WORD.findall(query)
+    for word in words:
+        tokens.add(_normalize(word))
+        tokens.update(name_tokens(word))
+    lowered = [word.lower() for word in words]
+    for first, second in zip(lowered, lowered[1:]):
+        tokens.add(_normalize(first + second))
+    return tokens - STOPWORDS
+
+
+class ServiceSelector:
+    """Inverted index from query words to diagrams classes"""
+
+    def __init__(self, services: Dict[str, str], aliases: Optional[Dict[str, str]] = None,
+                 core: Iterable[str] = CORE_SERVICES, max_services: int = MAX_SERVICES):
+        self.services = services
+        self.max_services = max_services
+        self.core = [name for name in core if name in services]
+        self._postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._name_lengths = {name: max(len(name_tokens(name)), 1) for name in services}
+
+        aliases_by_target: Dict[str, List[str]] = defaultdict(list)
+        for alias, target in (aliases or {}).items():
+            aliases_by_target[target].append(alias)
+
+        for name, module in services.items():
+            self._add(name, _normalize(name), 3.0)
+            for token in name_tokens(name):
+                self._add(name, token, 1.0)
+            for alias in aliases_by_target.get(name, []):
+                self._add(name, _normalize(alias), 3.0)
+            for keyword in SERVICE_KEYWORDS.get(name, []):
+                self._add(name, _normalize(keyword), 1.5)
+            for keyword in CATEGORY_KEYWORDS.get(module, []):
+                self._add(name, _normalize(keyword), 0.2)
+
+        # Rare words identify a service better than words shared by dozens
+        total = len(services)
+        self._idf = {
+            token: math.log(1 + total / len(posting))
+            for token, posting in self._postings.items()
+        }
+
+    def _add(self, name: str, token: str, weight: float):
+        posting = self._postings[token]
+        posting[name] = max(posting.get(name, 0.0), weight)
+
+    def scores(self, query: str) -> Dict[str, float]:
+        scores: Dict[str, float] = defaultdict(float)
+        for token in query_tokens(query):
+            posting = self._postings.get(token)
+            if not posting:
+                continue
+            idf = self._idf[token]
+            for name, weight in posting.items():
+                scores[name] += weight * idf
+        # Prefer the plain service over its sub-resources (Dynamodb over DynamodbGSI)
+        return {name: score / math.sqrt(self._name_lengths[name]) for name, score in scores.items()}
+
+    def select(self, query: str, max_services: Optional[int] = None) -> Dict[str, str]:
+        """Class name -> module for the core set plus the best matches"""
+        limit = self.max_services if max_services is None else max_services
+        ranked = sorted(self.scores(query).items(), key=lambda item: (-item[1], item[0]))
+        selected = [name for name, _ in ranked[:limit]]
+        for name in self.core:
+            if name not in selected:
+                selected.append(name)
+        return {name: self.services[name] for name in sorted(selected)}
+
+
+_selector: Optional[ServiceSelector] = None
+_selector_lock = threading.Lock()
+
+
+def get_selector() -> ServiceSelector:
+    """Build the selection index on first use and cache it for the container"""
+    global _selector
+    if _selector is None:
+        with _selector_lock:
+            if _selector is None:
+                registry = get_registry()
+                _selector = ServiceSelector(registry.service_modules(), registry.aliases())
+    return _selector
+
+
+def select_services(query: str) -> Dict[str, str]:
+    """Services to offer the model for this query; the full catalog if disabled"""
+    if not ENABLED:
+        return get_registry().service_modules()
+    try:
+        return get_selector().select(query)
+    except Exception as e:
+        logger.error(f"Service selection failed, using the full catalog: {e}")
+        return get_registry().service_modules()
+
+
+def _approx_tokens(text: str) -> int:
+    # Claude averages roughly 3.5 characters per token on code-like text
+    return math.ceil(len(text) / 3.5)
+
+
+def benchmark(cases: List[Dict[str, object]], max_services: int = MAX_SERVICES) -> Dict[str, object]:
+    """
+    Compare full-catalog and subset prompts on ``{query, expected}`` cases.
+
+    A case misses when one of its expected services is not in the subset; the
+    model then has to guess the import, which is where import errors come from.
+    """
+    selector = get_selector()
+    registry = get_registry()
+    full_tokens = _approx_tokens(str(registry.service_modules()))
+
+    results = []
+    for case in cases:
+        subset = selector.select(case['query'], max_services)
+        expected = [registry.resolve(name)[1] if registry.resolve(name) else name for name in case['expected']]
+        missing = [name for name in expected if name not in subset]
+        results.append({
+            'query': case['query'],
+            'services': len(subset),
+            'tokens': _approx_tokens(str(subset)),
+            'missing': missing,
+        })
+
+    expected_total = sum(len(case['expected']) for case in cases)
+    missing_total = sum(len(result['missing']) for result in results)
+    subset_tokens = sum(result['tokens'] for result in results) / max(len(results), 1)
+    return {
+        'cases': len(results),
+        'catalog_services': len(registry),
+        'full_prompt_tokens': full_tokens,
+        'mean_subset_tokens': round(subset_tokens, 1),
+        'token_reduction': round(1 - subset_tokens / full_tokens, 3) if full_tokens else 0,
+        'service_miss_rate': round(missing_total / expected_total, 3) if expected_total else 0,
+        'cases_with_miss': sum(1 for result in results if result['missing']),
+        'results': results,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Select or benchmark diagram services for a query")
+    parser.add_argument('query', nargs='?', help="Show the services selected for this query")
+    parser.add_argument('--benchmark', action='store_true', help="Run the offline benchmark")
+    parser.add_argument('--cases', default=CASES_PATH, help="Benchmark cases JSON file")
+    parser.add_argument('--max-services', type=int, default=MAX_SERVICES)
+    parser.add_argument('--json', action='store_true', help="Print the full benchmark report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        with open(args.cases) as f:
+            cases = json.load(f)
+        report = benchmark(cases, args.max_services)
+        if args.json:
+            print(json.dumps(report, indent=2))
+            return 0
+        print(
+            f"{report['cases']} cases, catalog of {report['catalog_services']} services\n"
+            f"full prompt ~{report['full_prompt_tokens']} tokens, "
+            f"subset ~{report['mean_subset_tokens']} tokens "
+            f"({report['token_reduction']:.1%} reduction)\n"
+            f"expected services missing from subset: {report['service_miss_rate']:.1%} "
+            f"({report['cases_with_miss']} cases)"
+        )
+        for result in report['results']:
+            if result['missing']:
+                print(f"  missing {', '.join(result['missing'])}: {result['query']}")
+        return 0
+
+    if not args.query:
+        parser.error("a query or --benchmark is required")
+    selector = get_selector()
+    for name, score in sorted(selector.scores(args.query).items(), key=lambda item: -item[1])[:args.max_services]:
+        print(f"{score:6.2f}  {name} ({selector.services[name]})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
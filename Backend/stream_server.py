@@ -0,0 +1,175 @@
+"""
+HTTP entry point used for Lambda response streaming.
+
+The managed Python runtime cannot stream a response, so the streaming image
+(``Dockerfile.stream``) runs this server behind the AWS Lambda Web Adapter with
+``AWS_LWA_INVOKE_MODE=response_stream``. Behind a function URL in
+``RESPONSE_STREAM`` mode every chunk written here reaches the client as soon as
+it is flushed.
+
+    POST /stream  {"tool_type": ..., "query": ...}  -> newline-delimited JSON events
+    POST /        any handler request body           -> the regular handler response
+    GET  /health                                      -> readiness check
+
+Stream events are ``resources`` (well-architected sources), ``delta`` (answer or
+code text), ``result`` (full response data for tools that cannot stream),
+``error`` and a final ``done`` carrying ``ttfb_ms`` and ``duration_ms``.
+"""
+import json
+import logging
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator
+
+import lambda_function
+import llm_cache
+import metrics
+import tools
+import usage
+from streaming import encode_event, split_first
+
+logger = logging.getLogger(__name__)
+
+PORT = int(os.environ.get('AWS_LWA_PORT', os.environ.get('PORT', '8080')))
+
+
+def stream_tool(tool_type: str, query: str) -> Iterator[Dict[str, Any]]:
+    """Run a tool in streaming mode, ending with a ``done`` event"""
+    tool = tools.load_tool(tool_type)
+    start = time.perf_counter()
+    ttfb_ms = None
+
+    with usage.tool_scope(tool_type):
+        if hasattr(tool, 'stream'):
+            events = tool.stream(query)
+        else:
+            events = ({'type': 'result', **response} for response in (tool.run(query),))
+
+        for event in events:
+            if ttfb_ms is None and event['type'] in ('delta', 'result'):
+                ttfb_ms = round((time.perf_counter() - start) * 1000, 1)
+                request_metrics = metrics.current()
+                if request_metrics is not None:
+                    request_metrics.record_duration('ttfb', ttfb_ms)
+                logger.info(f"{tool_type} time to first byte: {ttfb_ms} ms")
+            yield event
+
+    yield {
+        'type': 'done',
+        'ttfb_ms': ttfb_ms,
+        'duration_ms': round((time.perf_counter() - start) * 1000, 1),
+        'usage': usage.summary(),
+    }
+
+
+class StreamingRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.info(format % args)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _send_json(self, status: int, payload: Dict[str, Any]):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        else:
+            self._send_json(404, {'success': False, 'message': 'Not found'})
+
+    def do_POST(self):
+        try:
+            body = self._read_json()
+        except json.JSONDecodeError:
+            self._send_json(400, {'success': False, 'message': 'Invalid JSON body'})
+            return
+
+        if self.path == '/stream':
+            self._stream(body)
+            return
+
+        response = lambda_function.handler({'body': body}, None)
+        self._send_json(response['statusCode'], json.loads(response['body']))
+
+    def _stream(self, body: Dict[str, Any]):
+        tool_type = body.get('tool_type')
+        query = body.get('query')
+        if not tool_type or not query:
+            self._send_json(400, {'success': False, 'message': 'Missing required parameters: tool_type and query'})
+            return
+
+        request_metrics = metrics.start_request(tool=tool_type)
+        metrics.set_property('Streaming', True)
+        usage.start_request()
+        llm_cache.set_bypass(body.get('no_cache', False))
+        try:
+            self._stream_events(tool_type, query)
+        finally:
+            metrics.emit(request_metrics)
+
+    def _stream_events(self, tool_type: str, query: str):
+        # Errors before the first event can still be reported with a status code
+        try:
+            first, events = split_first(stream_tool(tool_type, query))
+        except (tools.UnknownToolError, tools.InvalidQueryError) as e:
+            self._send_json(400, {'success': False, 'message': str(e)})
+            return
+        except Exception as e:
+            logger.error(f"Error starting {tool_type} stream: {str(e)}")
+            self._send_json(500, {'success': False, 'message': f'Error processing request: {str(e)}'})
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        streamed_bytes = 0
+        try:
+            if first is not None:
+                data = encode_event(first)
+                streamed_bytes += len(data)
+                self._send_chunk(data)
+            for event in events:
+                data = encode_event(event)
+                streamed_bytes += len(data)
+                self._send_chunk(data)
+        except (BrokenPipeError, ConnectionResetError):
+            logger.warning(f"Client disconnected from {tool_type} stream")
+            events.close()
+            return
+        except Exception as e:
+            logger.error(f"Error in {tool_type} stream: {str(e)}")
+            self._send_chunk(encode_event({'type': 'error', 'message': str(e)}))
+        finally:
+            metrics.record_size('response', streamed_bytes)
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def main():
+    server = ThreadingHTTPServer(('0.0.0.0', PORT), StreamingRequestHandler)
+    logger.info(f"Streaming server listening on port {PORT}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,162 @@
+"""
+Helpers for streaming Claude responses from Bedrock.
+
+``invoke_model_with_response_stream`` returns an event stream of Anthropic
+message events. ``iter_text`` turns it into plain text deltas and, when stop
+sequences are given, stops reading (and closes the stream) as soon as one is
+seen, without ever emitting the stop sequence itself.
+"""
+import json
+import logging
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Exception events Bedrock can send in place of a chunk
+_STREAM_ERRORS = (
+    'internalServerException',
+    'modelStreamErrorException',
+    'modelTimeoutException',
+    'serviceUnavailableException',
+    'throttlingException',
+    'validationException',
+)
+
+
+class StreamError(Exception):
+    """Raised when Bedrock reports an error in the middle of a stream"""
+
+
+class StopSequenceFilter:
+    """
+    Pass text through until a stop sequence appears.
+
+    Text that could be the start of a stop sequence split across two deltas
+    is held back until the next delta shows whether it really is one.
+    """
+
+    def __init__(self, stop_sequences: List[str]):
+        self.stop_sequences = [stop for stop in stop_sequences if stop]
+        self._held = ''
+        self.stopped = False
+
+    def feed(self, text: str) -> str:
+        if self.stopped:
+            return ''
+        buffer = self._held + text
+        cut = min(
+            (buffer.find(stop) for stop in self.stop_sequences if stop in buffer),
+            default=-1
+        )
+        if cut >= 0:
+            self.stopped = True
+            self._held = ''
+            return buffer[:cut]
+
+        hold = 0
+        for stop in self.stop_sequences:
+            for size in range(min(len(stop) - 1, len(buffer)), 0, -1):
+                if buffer.endswith(stop[:size]):
+                    hold = max(hold, size)
+                    break
+        self._held = buffer[len(buffer) - hold:] if hold else ''
+        return buffer[:len(buffer) - hold]
+
+    def flush(self) -> str:
+        held, self._held = self._held, ''
+        return '' if self.stopped else held
+
+
+def iter_events(response: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Decode the message events of an ``invoke_model_with_response_stream`` response"""
+    for event in response['body']:
+        chunk = event.get('chunk')
+        if chunk:
+            yield json.loads(chunk['bytes'])
+            continue
+        for error in _STREAM_ERRORS:
+            if error in event:
+                raise StreamError(f"{error}: {event[error].get('message', '')}")
+
+
+def iter_text(
+    response: Dict[str, Any],
+    stop_sequences: Optional[List[str]] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+) -> Iterator[str]:
+    """
+    Yield the text deltas of a streamed response.
+
+    If ``metadata`` is given it is filled with the stop reason and the usage
+    reported by the stream as they arrive.
+    """
+    stop_filter = StopSequenceFilter(stop_sequences) if stop_sequences else None
+    try:
+        for event in iter_events(response):
+            event_type = event.get('type')
+            if event_type == 'content_block_delta':
+                text = event.get('delta', {}).get('text', '')
+                if stop_filter is not None:
+                    text = stop_filter.feed(text)
+                if text:
+                    yield text
+                if stop_filter is not None and stop_filter.stopped:
+                    if metadata is not None:
+                        metadata['stop_reason'] = 'stop_sequence'
+                    return
+            elif metadata is not None:
+                _collect_metadata(event, metadata)
+
+        if stop_filter is not None:
+            remaining = stop_filter.flush()
+            if remaining:
+                yield remaining
+    finally:
+        body = response.get('body')
+        if hasattr(body, 'close'):
+            body.close()
+
+
+def _collect_metadata(event: Dict[str, Any], metadata: Dict[str, Any]):
+    event_type = event.get('type')
+    if event_type == 'message_start':
+        usage = event.get('message', {}).get('usage', {})
+        metadata['input_tokens'] = usage.get('input_tokens')
+    elif event_type == 'message_delta':
+        metadata['stop_reason'] = event.get('delta', {}).get('stop_reason')
+        metadata['output_tokens'] = event.get('usage', {}).get('output_tokens')
+    elif event_type == 'message_stop':
+        invocation_metrics = event.get('amazon-bedrock-invocationMetrics')
+        if invocation_metrics:
+            metadata['invocation_metrics'] = invocation_metrics
+
+
+def skip_first_line(deltas: Iterable[str]) -> Iterator[str]:
+    """Streaming counterpart of ``remove_first_line``"""
+    buffered = ''
+    skipping = True
+    for text in deltas:
+        if not skipping:
+            yield text
+            continue
+        buffered += text
+        if '\n' in buffered:
+            skipping = False
+            rest = buffered.split('\n', 1)[1]
+            if rest:
+                yield rest
+    if skipping and buffered:
+        # A single-line response is returned as-is, like remove_first_line
+        yield buffered
+
+
+def encode_event(event: Dict[str, Any]) -> bytes:
+    """Encode one stream event as a newline-delimited JSON record"""
+    return (json.dumps(event) + '\n').encode('utf-8')
+
+
+def split_first(events: Iterator[Dict[str, Any]]) -> Tuple[Optional[Dict[str, Any]], Iterator[Dict[str, Any]]]:
+    """Pull the first event so errors before any output can still change the status code"""
+    for first in events:
+        return first, events
+    return None, events
@@ -0,0 +1,174 @@
+"""
+Structured, bounded logging for the request hot path.
+
+``get_logger(name)`` returns a logger whose calls take a message plus keyword
+fields and write one JSON line. Compared to f-string logging:
+
+- nothing is formatted unless the line is actually going to be written, and
+  field values may be zero-argument callables that are only evaluated then;
+- long strings are truncated and very long ones (base64 images, whole
+  generated programs) are replaced by their length and a short hash;
+- ``debug`` lines are written only for a sampled subset of request IDs, so
+  full detail is still available for some requests without paying for all;
+- each request has a byte budget; once spent, further non-error lines are
+  dropped and counted, and a single summary line is written at the end.
+"""
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+from typing import Any, Dict, Optional
+
+import metrics
+
+MAX_FIELD_CHARS = int(os.environ.get('LOG_MAX_FIELD_CHARS', '256'))
+HASH_ONLY_CHARS = int(os.environ.get('LOG_HASH_ONLY_CHARS', '4096'))
+MAX_ITEMS = int(os.environ.get('LOG_MAX_ITEMS', '20'))
+DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '0.01'))
+BYTE_BUDGET = int(os.environ.get('LOG_BYTE_BUDGET', '16384'))
+
+
+class _RequestLogState:
+    def __init__(self, request_id: Optional[str], debug_sampled: bool, budget: int):
+        self.request_id = request_id
+        self.debug_sampled = debug_sampled
+        self.remaining = budget
+        self.dropped_lines = 0
+        self.dropped_bytes = 0
+        self.lock = threading.Lock()
+
+    def consume(self, size: int, force: bool = False) -> bool:
+        with self.lock:
+            if force or size <= self.remaining:
+                self.remaining -= size
+                return True
+            self.dropped_lines += 1
+            self.dropped_bytes += size
+            return False
+
+
+_state: contextvars.ContextVar = contextvars.ContextVar('request_log_state', default=None)
+
+
+def is_debug_sampled(request_id: Optional[str], rate: float = DEBUG_SAMPLE_RATE) -> bool:
+    """Deterministically decide whether a request gets debug logging"""
+    if rate >= 1:
+        return True
+    if rate <= 0:
+        return False
+    if request_id is None:
+        return random.random() < rate
+    digest = hashlib.sha256(request_id.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64 < rate
+
+
+def begin_request(request_id: Optional[str] = None, debug: Optional[bool] = None):
+    """Start the per-request sampling decision and byte budget"""
+    sampled = is_debug_sampled(request_id) if debug is None else debug
+    _state.set(_RequestLogState(request_id, sampled, BYTE_BUDGET))
+
+
+def end_request():
+    """Report dropped lines, if any, and clear the request state"""
+    state = _state.get()
+    _state.set(None)
+    if state is None or not state.dropped_lines:
+        return
+    get_logger(__name__).warning(
+        "Log budget exhausted",
+        _force=True,
+        dropped_lines=state.dropped_lines,
+        dropped_bytes=state.dropped_bytes,
+        budget=BYTE_BUDGET,
+        request_id=state.request_id,
+    )
+    metrics.increment('log_lines_dropped', state.dropped_lines)
+
+
+def _digest(value) -> str:
+    data = value.encode('utf-8', 'replace') if isinstance(value, str) else bytes(value)
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def summarize(value: Any, depth: int = 0) -> Any:
+    """Bound a field value: truncate long text, hash huge text, cap containers"""
+    if callable(value):
+        value = value()
+    if isinstance(value, (bytes, bytearray)):
+        return {'bytes': len(value), 'sha256': _digest(value)}
+    if isinstance(value, str):
+        if len(value) > HASH_ONLY_CHARS:
+            return {'chars': len(value), 'sha256': _digest(value)}
+        if len(value) > MAX_FIELD_CHARS:
+            return f"{value[:MAX_FIELD_CHARS]}...[+{len(value) - MAX_FIELD_CHARS} chars]"
+        return value
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if depth >= 3:
+        return summarize(repr(value), depth)
+    if isinstance(value, dict):
+        items = list(value.items())
+        summary = {str(key): summarize(item, depth + 1) for key, item in items[:MAX_ITEMS]}
+        if len(items) > MAX_ITEMS:
+            summary['...'] = f"+{len(items) - MAX_ITEMS} keys"
+        return summary
+    if isinstance(value, (list, tuple, set)):
+        items = list(value)
+        summary = [summarize(item, depth + 1) for item in items[:MAX_ITEMS]]
+        if len(items) > MAX_ITEMS:
+            summary.append(f"+{len(items) - MAX_ITEMS} items")
+        return summary
+    return summarize(repr(value), depth)
+
+
+class StructuredLogger:
+    """Logger that writes bounded JSON lines with lazily formatted fields"""
+
+    def __init__(self, name: str):
+        self._logger = logging.getLogger(name)
+
+    def debug_enabled(self) -> bool:
+        if self._logger.isEnabledFor(logging.DEBUG):
+            return True
+        state = _state.get()
+        return state is not None and state.debug_sampled and self._logger.isEnabledFor(logging.INFO)
+
+    def debug(self, msg: str, **fields):
+        if self.debug_enabled():
+            # Always written at INFO (labelled DEBUG) so sampled lines pass the Lambda log level
+            self._log(logging.INFO, 'DEBUG', msg, fields)
+
+    def info(self, msg: str, **fields):
+        if self._logger.isEnabledFor(logging.INFO):
+            self._log(logging.INFO, 'INFO', msg, fields)
+
+    def warning(self, msg: str, **fields):
+        if self._logger.isEnabledFor(logging.WARNING):
+            self._log(logging.WARNING, 'WARNING', msg, fields)
+
+    def error(self, msg: str, **fields):
+        if self._logger.isEnabledFor(logging.ERROR):
+            fields.setdefault('_force', True)
+            self._log(logging.ERROR, 'ERROR', msg, fields)
+
+    def _log(self, level: int, label: str, msg: str, fields: Dict[str, Any]):
+        force = fields.pop('_force', False)
+        state = _state.get()
+        record = {'level': label, 'msg': msg}
+        if state is not None and state.request_id:
+            record['request_id'] = state.request_id
+        for key, value in fields.items():
+            record[key] = summarize(value)
+        line = json.dumps(record, default=str)
+
+        if state is not None and not state.consume(len(line), force=force):
+            return
+        metrics.increment('log_bytes', len(line))
+        self._logger.log(level, line)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    return StructuredLogger(name)
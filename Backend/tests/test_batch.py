@@ -0,0 +1,106 @@
+import contextvars
+import threading
+import time
+
+import pytest
+
+import batch
+import metrics
+import usage
+
+
+class FakeLambdaContext:
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+@pytest.fixture
+def release():
+    # Lets abandoned items finish once the test is over
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def _runner(release):
+    def run_item(tool_type, query):
+        if tool_type == 'slow':
+            release.wait(5)
+        usage.record_call('model', input_tokens=len(query))
+        metrics.increment('items_run')
+        return {'success': True, 'query': query}
+    return run_item
+
+
+def test_results_keep_item_order_and_ids():
+    items = [{'id': 'a', 'tool_type': 't', 'query': 'one'}, {'tool_type': 't'}, {'tool_type': 't', 'query': 'two'}]
+    results = batch.run_batch(items, lambda tool_type, query: {'success': True, 'query': query})
+    assert [r['id'] for r in results] == ['a', 1, 2]
+    assert [r.get('query') for r in results] == ['one', None, 'two']
+    assert results[1]['error'] == 'invalid'
+    assert batch.summarize(results) == {'total': 3, 'succeeded': 2, 'failed': 1}
+
+
+def test_failed_item_does_not_fail_the_batch():
+    def run_item(tool_type, query):
+        if query == 'bad':
+            raise RuntimeError('boom')
+        return {'success': True}
+
+    results = batch.run_batch([{'tool_type': 't', 'query': 'bad'}, {'tool_type': 't', 'query': 'ok'}], run_item)
+    assert results[0]['error'] == 'failed' and results[0]['message'] == 'boom'
+    assert results[1]['success'] is True
+
+
+def test_item_timeout(release):
+    items = [{'tool_type': 'slow', 'query': 'q'}, {'tool_type': 'fast', 'query': 'q'}]
+    start = time.monotonic()
+    results = batch.run_batch(items, _runner(release), item_timeout_ms=100)
+    assert time.monotonic() - start < 2
+    assert results[0]['error'] == 'timeout'
+    assert results[0]['duration_ms'] >= 100
+    assert results[1]['success'] is True
+
+
+def test_invocation_deadline_keeps_the_margin(release):
+    context = FakeLambdaContext(batch.DEADLINE_MARGIN_MS + 100)
+    start = time.monotonic()
+    results = batch.run_batch([{'tool_type': 'slow', 'query': 'q'}], _runner(release), context=context)
+    elapsed = time.monotonic() - start
+    assert results[0]['error'] == 'timeout'
+    assert 0.1 <= elapsed < 1
+
+
+def test_past_deadline_times_out_at_once(release):
+    context = FakeLambdaContext(batch.DEADLINE_MARGIN_MS - 1)
+    results = batch.run_batch([{'tool_type': 'slow', 'query': 'q'}], _runner(release), context=context)
+    assert results[0]['error'] == 'timeout'
+
+
+def test_abandoned_item_records_nothing_after_timeout(release):
+    def handle_requests():
+        request_metrics = metrics.start_request()
+        ledger = usage.start_request()
+        items = [{'tool_type': 'slow', 'query': 'slow'}, {'tool_type': 'fast', 'query': 'fast'}]
+        results = batch.run_batch(items, _runner(release), item_timeout_ms=100)
+        assert results[0]['error'] == 'timeout'
+
+        # The abandoned item finishes after the batch returned, and after the next request started
+        next_ledger = usage.start_request()
+        release.set()
+        time.sleep(0.1)
+        assert [call['input_tokens'] for call in ledger.calls] == [len('fast')]
+        assert request_metrics.counts['items_run'] == 1
+        assert next_ledger.calls == []
+
+    contextvars.copy_context().run(handle_requests)
+
+
+@pytest.mark.parametrize('field', ['max_workers', 'item_timeout_ms'])
+@pytest.mark.parametrize('value', [0, -1, 1.5, True])
+def test_rejects_bad_limits(field, value):
+    with pytest.raises(batch.BatchValidationError):
+        batch.run_batch([{'tool_type': 't', 'query': 'q'}], lambda *a: {}, **{field: value})
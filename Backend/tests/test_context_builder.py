@@ -0,0 +1,48 @@
+from context_builder import build_context, estimate_tokens, mmr_order
+from mmap_index import Chunk
+
+SCALING = "Use Auto Scaling groups to match capacity to demand across Availability Zones."
+SCALING_COPY = "Use Auto Scaling groups to match capacity to demand across Availability Zones!"
+ENCRYPTION = "Encrypt data at rest with AWS KMS keys and rotate them regularly."
+BACKUPS = "Back up data with AWS Backup and test restores as part of recovery drills."
+
+
+def _results(*texts):
+    return [(Chunk(i, text, {'source': f'doc{i}.pdf', 'page': i}), 1.0 - i / 10) for i, text in enumerate(texts)]
+
+
+def test_mmr_drops_near_duplicates():
+    order, dropped = mmr_order([SCALING, SCALING_COPY, ENCRYPTION])
+    assert order == [0, 2]
+    assert dropped == 1
+
+
+def test_mmr_prefers_novel_chunks_over_rank():
+    overlap = SCALING + " Scaling groups match capacity."
+    order, _ = mmr_order([SCALING, overlap, ENCRYPTION], mmr_lambda=0.5, duplicate_similarity=1.1)
+    assert order == [0, 2, 1]
+
+
+def test_packs_chunks_into_budget():
+    long_backups = ' '.join([BACKUPS] * 3)
+    results = _results(SCALING, long_backups, ENCRYPTION)
+    budget = estimate_tokens(SCALING) + estimate_tokens(ENCRYPTION) + 40
+    context = build_context(results, token_budget=budget)
+    # The chunk that does not fit is skipped for a shorter one further down
+    assert [r['source'] for r in context.resources] == ['doc0.pdf', 'doc2.pdf']
+    assert context.tokens <= budget
+    assert '<document index="2" source="doc2.pdf" page="2">' in context.text
+    assert BACKUPS not in context.text
+
+
+def test_truncates_a_first_chunk_over_budget():
+    context = build_context(_results(SCALING * 20), token_budget=40)
+    assert context.tokens <= 40
+    assert context.text.count('<document') == 1
+    assert context.text.split('\n')[1].endswith(' ...')
+
+
+def test_resources_keep_the_flat_line_list():
+    context = build_context(_results(SCALING, ENCRYPTION))
+    assert context.resource_lines == ['doc0.pdf', SCALING, 'doc1.pdf', ENCRYPTION]
+    assert context.resources[1] == {'source': 'doc1.pdf', 'snippet': ENCRYPTION, 'score': 0.9, 'page': 1}
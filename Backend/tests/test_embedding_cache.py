@@ -0,0 +1,82 @@
+import pytest
+
+import embedding_cache
+from embedding_cache import CachedEmbeddings, decode_vector, embedding_key, encode_vector
+from llm_cache import DirectoryTier, MemoryTier
+
+
+class CountingEmbeddings:
+    model_id = 'test-embed'
+
+    def __init__(self):
+        self.queries = []
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [float(len(text)), 0.5, -1.25]
+
+
+class BrokenTier:
+    name = 'broken'
+
+    def get(self, key):
+        raise OSError('disk gone')
+
+    def put(self, key, data, expires_at):
+        raise OSError('disk gone')
+
+
+@pytest.fixture
+def tiers(tmp_path):
+    return [MemoryTier(max_items=8), DirectoryTier(str(tmp_path))]
+
+
+def test_repeated_question_is_embedded_once(tiers):
+    embeddings = CountingEmbeddings()
+    cached = CachedEmbeddings(embeddings, tiers=tiers)
+    first = cached.embed_query("How do I secure S3?")
+    assert cached.embed_query("  how do I  secure s3 ") == first
+    assert embeddings.queries == ["How do I secure S3?"]
+    stats = cached.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (1, 1, 0.5)
+
+
+def test_disk_hit_refills_memory(tiers, tmp_path):
+    CachedEmbeddings(CountingEmbeddings(), tiers=tiers).embed_query("multi-AZ RDS")
+    memory = MemoryTier(max_items=8)
+    embeddings = CountingEmbeddings()
+    cached = CachedEmbeddings(embeddings, tiers=[memory, DirectoryTier(str(tmp_path))])
+    assert cached.embed_query("multi-AZ RDS") == [12.0, 0.5, -1.25]
+    assert embeddings.queries == []
+    assert memory.get(embedding_key('test-embed', "multi-AZ RDS")) is not None
+
+
+def test_keys_depend_on_the_model():
+    assert embedding_key('model-a', 'q') != embedding_key('model-b', 'q')
+    assert embedding_key('model-a', 'What is IAM?') == embedding_key('model-a', 'what is iam')
+
+
+def test_expired_vectors_are_embedded_again(tiers):
+    embeddings = CountingEmbeddings()
+    cached = CachedEmbeddings(embeddings, tiers=tiers, ttl_seconds=-1)
+    cached.embed_query("q")
+    cached.embed_query("q")
+    assert len(embeddings.queries) == 2
+
+
+def test_broken_tier_falls_through_to_the_client():
+    embeddings = CountingEmbeddings()
+    cached = CachedEmbeddings(embeddings, tiers=[BrokenTier()])
+    assert cached.embed_query("q") == [1.0, 0.5, -1.25]
+
+
+def test_vector_encoding_round_trips():
+    vector, embed_ms = decode_vector(encode_vector([0.25, -3.5, 1e-3], 123.456))
+    assert vector == pytest.approx([0.25, -3.5, 1e-3])
+    assert embed_ms == 123.5
+
+
+def test_disabled_cache_returns_the_client(monkeypatch):
+    monkeypatch.setattr(embedding_cache, 'ENABLED', False)
+    embeddings = CountingEmbeddings()
+    assert embedding_cache.cached_embeddings(embeddings) is embeddings
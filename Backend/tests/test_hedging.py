@@ -0,0 +1,108 @@
+import contextvars
+import threading
+
+import pytest
+
+import hedging
+import metrics
+from hedging import HedgeBudget, Hedger, LatencyTracker
+
+KEY = ('model', 'answer')
+
+
+@pytest.fixture
+def hedger(monkeypatch):
+    monkeypatch.setattr(hedging, 'MIN_DELAY_MS', 10)
+    tracker = LatencyTracker()
+    for _ in range(hedging.MIN_SAMPLES):
+        tracker.record(KEY, 10.0)
+    return lambda budget: Hedger(tracker=tracker, budget=budget, max_workers=4)
+
+
+def _slow_then_fast(release):
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        if len(attempts) == 1:
+            release.wait(5)
+            return 'slow'
+        return 'fast'
+
+    return call, attempts
+
+
+def _in_request(fn):
+    def run():
+        request_metrics = metrics.start_request()
+        return fn(), request_metrics.counts
+    return contextvars.copy_context().run(run)
+
+
+def test_budget_caps_hedges_at_a_fraction_of_calls():
+    budget = HedgeBudget(ratio=0.05, burst=2)
+    assert budget.try_spend() and budget.try_spend()
+    assert not budget.try_spend()
+    for _ in range(19):
+        budget.deposit()
+    assert not budget.try_spend()
+    budget.deposit()
+    assert budget.try_spend()
+
+
+def test_budget_never_saves_past_the_burst():
+    budget = HedgeBudget(ratio=1, burst=2)
+    for _ in range(10):
+        budget.deposit()
+    assert [budget.try_spend() for _ in range(3)] == [True, True, False]
+
+
+def test_no_hedge_delay_until_enough_samples():
+    tracker = LatencyTracker()
+    for latency in range(1, hedging.MIN_SAMPLES):
+        tracker.record(KEY, float(latency))
+    assert tracker.percentile(KEY, 95) is None
+    tracker.record(KEY, float(hedging.MIN_SAMPLES))
+    assert tracker.percentile(KEY, 95) == 19.0
+
+
+def test_slow_call_is_hedged_and_the_hedge_wins(hedger):
+    release = threading.Event()
+    call, attempts = _slow_then_fast(release)
+    try:
+        result, counts = _in_request(lambda: hedger(HedgeBudget(ratio=0, burst=1)).call(call, KEY))
+    finally:
+        release.set()
+    assert result == 'fast'
+    assert len(attempts) == 2
+    assert counts == {'bedrock_hedge_eligible': 1, 'bedrock_hedges': 1, 'bedrock_hedge_wins': 1}
+
+
+def test_exhausted_budget_waits_for_the_first_attempt(hedger):
+    release = threading.Event()
+    call, attempts = _slow_then_fast(release)
+    threading.Timer(0.1, release.set).start()
+    result, counts = _in_request(lambda: hedger(HedgeBudget(ratio=0, burst=0)).call(call, KEY))
+    assert result == 'slow'
+    assert len(attempts) == 1
+    assert counts == {'bedrock_hedge_eligible': 1, 'bedrock_hedge_budget_exhausted': 1}
+
+
+def test_failed_attempt_falls_to_the_other(hedger):
+    release = threading.Event()
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        if len(attempts) == 1:
+            release.wait(0.1)
+            raise RuntimeError('primary failed')
+        return 'hedge'
+
+    assert hedger(HedgeBudget(ratio=0, burst=1)).call(call, KEY) == 'hedge'
+
+
+def test_disabled_hedging_calls_straight_through(monkeypatch):
+    monkeypatch.setattr(hedging, 'ENABLED', False)
+    monkeypatch.setattr(hedging, 'get_hedger', lambda: pytest.fail("hedger used while disabled"))
+    assert hedging.call(lambda: 'direct', 'model', 'answer') == 'direct'
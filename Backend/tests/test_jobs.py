@@ -0,0 +1,69 @@
+import os
+import threading
+
+import pytest
+
+import jobs
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = jobs.LocalJobStore(str(tmp_path))
+    monkeypatch.setattr(jobs, '_store', store)
+    monkeypatch.setattr(jobs, 'JOB_DISPATCH', 'thread')
+    return store
+
+
+def test_local_store_round_trip(store):
+    store.put({'job_id': 'abc', 'status': jobs.PENDING})
+    assert store.get('abc') == {'job_id': 'abc', 'status': jobs.PENDING}
+    assert store.get('missing') is None
+
+
+def test_submit_runs_job_in_background(store):
+    done = threading.Event()
+    seen = []
+
+    def worker(job, context):
+        seen.append(job)
+        jobs.run_job(job, lambda tool_type, query: {'answer': query.upper()})
+        done.set()
+
+    record = jobs.submit('well_arch', 'hello', worker, no_cache=True)
+    assert record['status'] == jobs.PENDING
+    assert done.wait(5)
+    assert seen[0]['no_cache'] is True
+    finished = jobs.get_job(record['job_id'])
+    assert finished['status'] == jobs.SUCCEEDED
+    assert finished['result'] == {'answer': 'HELLO'}
+
+
+def test_failed_job_records_error(store):
+    def fail(tool_type, query):
+        raise ValueError("boom")
+
+    record = jobs.run_job({'job_id': 'a' * 32, 'tool_type': 'diagram', 'query': 'q'}, fail)
+    assert record['status'] == jobs.FAILED
+    assert record['error'] == 'boom'
+
+
+def test_finished_job_is_not_rerun(store):
+    job = {'job_id': 'b' * 32, 'tool_type': 'diagram', 'query': 'q'}
+    jobs.run_job(job, lambda tool_type, query: {'n': 1})
+    record = jobs.run_job(job, lambda tool_type, query: {'n': 2})
+    assert record['result'] == {'n': 1}
+
+
+def test_unknown_or_malformed_job_id(store):
+    with pytest.raises(jobs.JobNotFoundError):
+        jobs.get_job('c' * 32)
+    with pytest.raises(jobs.JobNotFoundError):
+        jobs.get_job('../../etc/passwd')
+
+
+def test_lambda_dispatch_needs_a_bucket(store, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_DISPATCH', 'lambda')
+    monkeypatch.setattr(jobs, 'JOB_BUCKET_NAME', None)
+    with pytest.raises(jobs.JobConfigError):
+        jobs.submit('diagram', 'q', lambda job, context: None)
+    assert os.listdir(store.root) == []
@@ -0,0 +1,143 @@
+import math
+
+import pytest
+
+import retrieval
+from lexical_index import LexicalIndex, is_identifier, reciprocal_rank_fusion, tokenize
+from retrieval import RetrievalService
+
+TEXTS = [
+    "REL09-BP03 Perform data backup automatically with AWS Backup.",
+    "Deploy RDS in a Multi-AZ configuration for high availability.",
+    "Use S3 Object Lock to protect backup data from deletion.",
+    "Scale compute horizontally behind a load balancer for availability and availability zones.",
+]
+
+
+def test_tokenize_keeps_identifiers_whole_and_split():
+    tokens = tokenize("What is REL09-BP03 for Multi-AZ?")
+    assert {'rel09-bp03', 'rel09', 'bp03', 'multi-az', 'multi', 'az'} <= set(tokens)
+    assert 'what' not in tokens and 'is' not in tokens
+
+
+def test_is_identifier():
+    assert is_identifier('rel09-bp03')
+    assert not is_identifier('multi-az')
+    assert not is_identifier('rel09')
+
+
+def test_bm25_ranks_rare_matching_terms_first():
+    index = LexicalIndex.build(TEXTS)
+    hits = index.search("backup object lock", k=4)
+    assert [doc for doc, _ in hits][:2] == [2, 0]
+    assert all(score > 0 for _, score in hits)
+    assert 1 not in [doc for doc, _ in hits]
+
+
+def test_bm25_score_matches_formula():
+    index = LexicalIndex.build(TEXTS)
+    doc = 1
+    length = len(tokenize(TEXTS[doc]))
+    df = 1
+    idf = math.log(1 + (len(TEXTS) - df + 0.5) / (df + 0.5))
+    norm = index.k1 * (1 - index.b + index.b * length / index.avgdl)
+    expected = idf * (index.k1 + 1) / (1 + norm)
+    assert index.scores(['rds'])[doc] == pytest.approx(expected, rel=1e-5)
+
+
+def test_term_frequency_saturates():
+    index = LexicalIndex.build(["availability", "availability availability availability", "other words here"])
+    once, thrice = index.scores(['availability'])[:2]
+    assert once < thrice < 3 * once
+
+
+def test_search_skips_unmatched_and_caps_k():
+    index = LexicalIndex.build(TEXTS)
+    assert index.search("kubernetes", k=4) == []
+    assert len(index.search("availability", k=10)) == 2
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = LexicalIndex.build(TEXTS)
+    index.save(str(tmp_path))
+    loaded = LexicalIndex.load(str(tmp_path))
+    assert loaded.search("backup", k=3) == index.search("backup", k=3)
+
+
+def test_coverage_weights_terms_by_idf():
+    index = LexicalIndex.build(TEXTS)
+    assert index.coverage("rds multi-az", 1) == pytest.approx(1.0)
+    assert 0 < index.coverage("rds backup", 1) < 1
+    assert index.coverage("rds", 0) == 0
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]], k=60)
+    scores = dict(fused)
+    assert [doc for doc, _ in fused][:2] == [1, 3]
+    assert scores[1] == pytest.approx(1 / 61 + 1 / 62)
+    assert scores[4] == pytest.approx(1 / 63)
+    assert reciprocal_rank_fusion([]) == []
+
+
+@pytest.fixture
+def service():
+    service = RetrievalService(index_path='unused')
+    # Skip loading from disk: the vector store is only needed by the stubbed methods below
+    service._vectorstore = object()
+    service._lexical = LexicalIndex.build(TEXTS)
+    service.embedded = []
+
+    def embed_query(query, timeout_ms=None):
+        service.embedded.append(query)
+        return [1.0, 0.0]
+
+    service.embed_query = embed_query
+    service.vector_search = lambda vector, k: [(3, 0.1), (1, 0.2)]
+    return service
+
+
+def test_identifier_query_is_lexically_confident(service):
+    query = "REL09-BP03 backups"
+    assert service.lexically_confident(query, service.lexical_search(query))
+
+
+def test_long_or_partial_queries_are_not_lexically_confident(service):
+    long_query = "how should we design automatic backup scaling availability and recovery for databases"
+    assert not service.lexically_confident(long_query, service.lexical_search(long_query))
+    assert not service.lexically_confident("rds kubernetes", service.lexical_search("rds kubernetes"))
+    assert not service.lexically_confident("kubernetes", [])
+
+
+def test_short_fully_matched_query_is_lexically_confident(service):
+    assert service.lexically_confident("rds multi-az", service.lexical_search("rds multi-az"))
+
+
+def test_rank_lexical_fast_path_skips_embedding(service, monkeypatch):
+    monkeypatch.setattr(retrieval, 'MODE', 'hybrid')
+    path, ranked, vector = service.rank("REL09-BP03", k=2)
+    assert (path, vector, service.embedded) == ('lexical', None, [])
+    assert ranked[0][0] == 0
+
+
+def test_rank_hybrid_fuses_and_returns_vector(service, monkeypatch):
+    monkeypatch.setattr(retrieval, 'MODE', 'hybrid')
+    path, ranked, vector = service.rank("availability of backup data", k=3)
+    assert path == 'hybrid'
+    assert vector == [1.0, 0.0]
+    assert service.embedded == ["availability of backup data"]
+    lexical = [doc for doc, _ in service.lexical_search("availability of backup data", retrieval.CANDIDATES)]
+    assert ranked == reciprocal_rank_fusion([lexical, [3, 1]])[:3]
+
+
+def test_rank_falls_back_to_bm25_when_embedding_fails(service, monkeypatch):
+    monkeypatch.setattr(retrieval, 'MODE', 'hybrid')
+
+    def embed_query(query, timeout_ms=None):
+        raise TimeoutError()
+
+    service.embed_query = embed_query
+    path, ranked, vector = service.rank("availability of backup data", k=3)
+    assert path == 'lexical_fallback'
+    assert vector is None
+    assert ranked == service.lexical_search("availability of backup data", 3)
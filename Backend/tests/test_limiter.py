@@ -0,0 +1,111 @@
+import time
+
+import pytest
+
+import limiter
+from limiter import AdaptiveLimiter, LimiterTimeout
+
+
+class ThrottlingError(Exception):
+    def __init__(self, code='ThrottlingException'):
+        super().__init__(code)
+        self.response = {'Error': {'Code': code}}
+
+
+def test_throttle_backs_off_both_limits():
+    lim = AdaptiveLimiter('model', concurrency=10, rate=10)
+    lim.release(lim.acquire(), error=ThrottlingError())
+    assert lim.concurrency == pytest.approx(10 * limiter.BACKOFF)
+    assert lim.rate == pytest.approx(10 * limiter.BACKOFF)
+    assert lim.in_flight == 0
+
+
+def test_success_after_throttled_retry_backs_off():
+    lim = AdaptiveLimiter('model', concurrency=10, rate=10)
+    permit = lim.acquire()
+    limiter.count_throttled_attempt(response=(None, {'Error': {'Code': 'ThrottlingException'}}))
+    lim.release(permit)
+    assert lim.concurrency == pytest.approx(10 * limiter.BACKOFF)
+
+
+def test_success_after_server_error_retry_does_not_back_off():
+    lim = AdaptiveLimiter('model', concurrency=10, rate=10)
+    permit = lim.acquire()
+    limiter.count_throttled_attempt(response=(None, {'Error': {'Code': 'InternalServerException'}}))
+    limiter.count_throttled_attempt(response=None, caught_exception=ConnectionResetError())
+    lim.release(permit)
+    assert (lim.concurrency, lim.rate) == (10, 10)
+
+
+def test_only_first_throttle_of_a_generation_backs_off():
+    lim = AdaptiveLimiter('model', concurrency=10, rate=100)
+    lim._tokens = 2
+    first, second = lim.acquire(), lim.acquire()
+    lim.release(first, error=ThrottlingError())
+    lim.release(second, error=ThrottlingError('TooManyRequestsException'))
+    assert lim.concurrency == pytest.approx(10 * limiter.BACKOFF)
+
+
+def test_limits_do_not_fall_below_minimum():
+    lim = AdaptiveLimiter('model', concurrency=1, rate=limiter.MIN_RATE)
+    for _ in range(5):
+        lim._tokens = 1
+        lim.release(lim.acquire(), error=ThrottlingError())
+    assert lim.concurrency == limiter.MIN_CONCURRENCY
+    assert lim.rate == limiter.MIN_RATE
+
+
+def test_other_errors_leave_limits_alone():
+    lim = AdaptiveLimiter('model', concurrency=4, rate=10)
+    lim.release(lim.acquire(), error=ThrottlingError('ValidationException'))
+    assert (lim.concurrency, lim.rate) == (4, 10)
+
+
+def test_success_grows_only_a_binding_limit():
+    lim = AdaptiveLimiter('model', concurrency=2, rate=100)
+    lim.release(lim.acquire())
+    assert lim.concurrency == 2
+
+    held = lim.acquire()
+    lim._tokens = 1
+    other = lim.acquire()
+    with pytest.raises(LimiterTimeout):
+        lim.acquire(timeout=0.05)
+    lim.release(other)
+    lim.release(held)
+    assert lim.concurrency == pytest.approx(2 + 1 / 2)
+
+
+def test_token_bucket_paces_calls():
+    lim = AdaptiveLimiter('model', concurrency=10, rate=20)
+    lim.release(lim.acquire())
+    start = time.monotonic()
+    lim.release(lim.acquire(timeout=1))
+    assert time.monotonic() - start >= 0.03
+
+
+def test_queue_timeout_when_rate_limited():
+    lim = AdaptiveLimiter('model', concurrency=10, rate=0.5)
+    lim.acquire()
+    with pytest.raises(LimiterTimeout):
+        lim.acquire(timeout=0.05)
+    assert lim.stats()['queue_depth'] == 0
+
+
+def test_full_queue_is_rejected_at_once():
+    lim = AdaptiveLimiter('model', max_queue=0)
+    with pytest.raises(LimiterTimeout):
+        lim.acquire(timeout=10)
+
+
+def test_release_is_idempotent():
+    lim = AdaptiveLimiter('model', concurrency=4, rate=10)
+    permit = lim.acquire()
+    lim.release(permit)
+    lim.release(permit)
+    assert lim.in_flight == 0
+
+
+def test_get_limiter_is_shared_per_model():
+    assert limiter.get_limiter('test-model-a') is limiter.get_limiter('test-model-a')
+    assert limiter.get_limiter('test-model-a') is not limiter.get_limiter('test-model-b')
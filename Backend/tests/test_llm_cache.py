@@ -0,0 +1,114 @@
+import json
+import os
+import time
+
+import pytest
+
+import llm_cache
+from llm_cache import DirectoryTier, LLMCache, MemoryTier, SharedTier
+
+
+def _file_bytes(directory):
+    return sum(entry.stat().st_size for entry in os.scandir(directory))
+
+
+def test_cache_key_ignores_dict_order():
+    assert llm_cache.cache_key('m', {'a': 1, 'b': 2}) == llm_cache.cache_key('m', {'b': 2, 'a': 1})
+    assert llm_cache.cache_key('m', {'a': 1}) != llm_cache.cache_key('other', {'a': 1})
+
+
+def test_only_deterministic_requests_are_cacheable(monkeypatch):
+    monkeypatch.setattr(llm_cache, 'CACHE_SAMPLED', False)
+    assert llm_cache.is_cacheable({'temperature': 0})
+    assert not llm_cache.is_cacheable({'temperature': 0.7})
+    assert not llm_cache.is_cacheable({})
+    monkeypatch.setattr(llm_cache, 'CACHE_SAMPLED', True)
+    assert llm_cache.is_cacheable({})
+
+
+def test_memory_tier_evicts_least_recently_used():
+    tier = MemoryTier(max_items=2, max_bytes=1024)
+    expires = time.time() + 60
+    tier.put('a', b'1', expires)
+    tier.put('b', b'2', expires)
+    tier.get('a')
+    tier.put('c', b'3', expires)
+    assert tier.get('b') is None
+    assert tier.get('a') == (b'1', expires)
+
+
+def test_memory_tier_bounds_bytes_and_expires():
+    tier = MemoryTier(max_items=10, max_bytes=8)
+    tier.put('big', b'x' * 9, time.time() + 60)
+    assert tier.get('big') is None
+    tier.put('a', b'12345', time.time() + 60)
+    tier.put('b', b'12345', time.time() + 60)
+    assert tier.get('a') is None
+    tier.put('old', b'1', time.time() - 1)
+    assert tier.get('old') is None
+
+
+def test_directory_tier_round_trip_and_expiry(tmp_path):
+    tier = DirectoryTier(str(tmp_path), max_bytes=10_000)
+    expires = time.time() + 60
+    tier.put('k', b'{"x": 1}', expires)
+    assert tier.get('k') == (b'{"x": 1}', expires)
+    tier.put('old', b'{}', time.time() - 1)
+    assert tier.get('old') is None
+    assert not os.path.exists(tmp_path / 'old.json')
+
+
+def test_directory_tier_rewrites_do_not_inflate_size(tmp_path):
+    tier = DirectoryTier(str(tmp_path), max_bytes=10_000)
+    for _ in range(50):
+        tier.put('same', b'{"answer": "unchanged"}', time.time() + 60)
+    assert tier._bytes == _file_bytes(tmp_path)
+    assert tier.get('same') is not None
+
+
+def test_directory_tier_evicts_oldest(tmp_path):
+    tier = DirectoryTier(str(tmp_path), max_bytes=300)
+    for i in range(10):
+        tier.put(f'k{i}', b'x' * 40, time.time() + 60)
+        os.utime(tmp_path / f'k{i}.json', (i, i))
+    assert tier._bytes == _file_bytes(tmp_path) <= 300
+    assert tier.get('k9') is not None
+    assert tier.get('k0') is None
+
+
+def test_hit_in_slower_tier_fills_faster_ones(tmp_path):
+    memory, disk = MemoryTier(), DirectoryTier(str(tmp_path))
+    LLMCache([disk]).put('k', {'answer': 42})
+    cache = LLMCache([memory, disk])
+    assert cache.get('k') == {'answer': 42}
+    assert json.loads(memory.get('k')[0]) == {'answer': 42}
+
+
+def test_bypass_skips_lookup_but_refreshes():
+    cache = LLMCache([MemoryTier()])
+    cache.put('k', {'v': 1})
+    llm_cache.set_bypass(True)
+    try:
+        assert cache.get('k') is None
+        cache.put('k', {'v': 2})
+    finally:
+        llm_cache.set_bypass(False)
+    assert cache.get('k') == {'v': 2}
+
+
+def test_failing_tier_is_skipped():
+    class Broken(SharedTier):
+        def get(self, key):
+            raise OSError("unreachable")
+
+        def put(self, key, data, expires_at):
+            raise OSError("unreachable")
+
+    cache = LLMCache([Broken(), MemoryTier()])
+    cache.put('k', {'v': 1})
+    assert cache.get('k') == {'v': 1}
+
+
+def test_shared_tier_is_abstract():
+    with pytest.raises(TypeError):
+        SharedTier()
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def no_request():
+    token = metrics._current.set(None)
+    yield
+    metrics._current.reset(token)
+
+
+def _emitted(capsys):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_emf_record_has_one_metric_per_stage(capsys):
+    request_metrics = metrics.start_request(tool='well-arch', request_id='req-1')
+    with metrics.span('retrieval'):
+        pass
+    metrics.record_size('response', 'héllo')
+    metrics.increment('bedrock_calls', 2)
+    metrics.set_property('retrieval_path', 'lexical')
+    metrics.emit(request_metrics)
+
+    [record] = _emitted(capsys)
+    names = {m['Name']: m['Unit'] for m in record['_aws']['CloudWatchMetrics'][0]['Metrics']}
+    assert names == {
+        'request_ms': 'Milliseconds',
+        'retrieval_ms': 'Milliseconds',
+        'response_bytes': 'Bytes',
+        'bedrock_calls': 'Count',
+    }
+    assert record['_aws']['CloudWatchMetrics'][0]['Dimensions'] == [['Tool'], ['Tool', 'ColdStart']]
+    assert record['Tool'] == 'well-arch' and record['RequestId'] == 'req-1'
+    assert record['response_bytes'] == 6
+    assert record['bedrock_calls'] == 2
+    assert record['retrieval_path'] == 'lexical'
+    assert metrics.current() is None
+
+
+def test_repeated_stage_keeps_every_sample_up_to_the_emf_limit(capsys):
+    request_metrics = metrics.start_request()
+    for _ in range(metrics.MAX_VALUES + 5):
+        request_metrics.record_duration('bedrock_model', 1.0)
+    metrics.emit()
+    assert len(_emitted(capsys)[0]['bedrock_model_ms']) == metrics.MAX_VALUES
+
+
+def test_calls_outside_a_request_are_no_ops(capsys):
+    with metrics.span('tool'):
+        metrics.increment('bedrock_calls')
+        metrics.record_size('response', b'abc')
+    metrics.emit()
+    assert capsys.readouterr().out == ''
+
+
+def test_only_the_first_request_is_a_cold_start(monkeypatch):
+    monkeypatch.setattr(metrics, '_cold_start', True)
+    assert metrics.start_request().cold_start
+    assert not metrics.start_request().cold_start
+
+
+def test_timed_decorator_names_the_stage_after_the_function():
+    @metrics.timed()
+    def _load_index():
+        return 'ok'
+
+    request_metrics = metrics.start_request()
+    assert _load_index() == 'ok'
+    assert list(request_metrics.durations) == ['load_index']
+
+
+def test_merge_adds_a_part_into_the_request():
+    request_metrics = metrics.start_request()
+    request_metrics.increment('bedrock_calls')
+    request_metrics.set_property('Tool', 'batch')
+    part = metrics.start_part('code')
+    part.increment('bedrock_calls', 2)
+    part.record_duration('tool', 5.0)
+    part.set_property('Tool', 'code')
+    request_metrics.merge(part)
+    assert request_metrics.counts == {'bedrock_calls': 3}
+    assert request_metrics.durations == {'tool': [5.0]}
+    assert request_metrics.properties == {'Tool': 'batch'}
@@ -0,0 +1,110 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+import mmap_index
+from mmap_index import MmapIndex, exact_neighbours, parse_config, read_langchain_docstore, write_index
+
+LOCAL_INDEX = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'local_index')
+
+
+@pytest.fixture(scope='module')
+def corpus():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(200, 32)).astype(np.float32)
+    texts = [f"chunk {i} – résumé" for i in range(200)]
+    metadatas = [{'source': f"pillar{i % 3}.pdf", **({'page': i} if i % 2 else {})} for i in range(200)]
+    queries = vectors[:20] + rng.normal(scale=0.05, size=(20, 32)).astype(np.float32)
+    return texts, metadatas, vectors, queries
+
+
+def _recall(index, queries, expected, k=4):
+    found = [len({i for i, _ in index.nearest(q, k)} & set(e)) for q, e in zip(queries, expected)]
+    return sum(found) / (len(queries) * k)
+
+
+def test_text_and_metadata_round_trip(tmp_path, corpus):
+    texts, metadatas, vectors, _ = corpus
+    manifest = write_index(str(tmp_path), texts, metadatas, vectors, embedding_model='test-model')
+    index = MmapIndex(str(tmp_path))
+    assert len(index) == 200 and index.dim == 32
+    assert index.embedding_model == manifest['embedding_model'] == 'test-model'
+    assert index.text(7) == texts[7]
+    assert index.metadata(7) == {'source': 'pillar1.pdf', 'page': 7}
+    assert index.metadata(8) == {'source': 'pillar2.pdf'}
+    assert index.sources == ['pillar0.pdf', 'pillar1.pdf', 'pillar2.pdf']
+
+
+def test_float32_scores_are_exact_l2(tmp_path, corpus):
+    texts, metadatas, vectors, queries = corpus
+    write_index(str(tmp_path), texts, metadatas, vectors, dtype='float32')
+    index = MmapIndex(str(tmp_path))
+    expected = ((vectors - queries[0]) ** 2).sum(axis=1)
+    np.testing.assert_allclose(index.scores(queries[0]), expected, rtol=1e-4, atol=1e-3)
+    assert [i for i, _ in index.nearest(queries[0], 4)] == exact_neighbours(vectors, queries[:1], 4)[0].tolist()
+
+
+def test_inner_product_ranks_highest_first(tmp_path, corpus):
+    texts, metadatas, vectors, queries = corpus
+    write_index(str(tmp_path), texts, metadatas, vectors, dtype='float32', metric='ip')
+    hits = MmapIndex(str(tmp_path)).nearest(queries[0], 3)
+    assert [i for i, _ in hits] == exact_neighbours(vectors, queries[:1], 3, metric='ip')[0].tolist()
+    assert hits[0][1] >= hits[1][1] >= hits[2][1]
+
+
+@pytest.mark.parametrize('config, min_recall', [
+    ('float16', 1.0),
+    ('int8', 0.95),
+    ('ivf8x8-float16', 1.0),
+    ('ivf8x2-int8', 0.5),
+    ('pq8', 0.5),
+])
+def test_encodings_keep_recall(tmp_path, corpus, config, min_recall):
+    texts, metadatas, vectors, queries = corpus
+    write_index(str(tmp_path), texts, metadatas, vectors, **parse_config(config))
+    index = MmapIndex(str(tmp_path))
+    assert _recall(index, queries, exact_neighbours(vectors, queries, 4)) >= min_recall
+
+
+def test_rewrite_drops_files_of_the_old_encoding(tmp_path, corpus):
+    texts, metadatas, vectors, _ = corpus
+    write_index(str(tmp_path), texts, metadatas, vectors, dtype='int8', ivf_nlist=4)
+    write_index(str(tmp_path), texts, metadatas, vectors, dtype='float16')
+    assert not any(os.path.exists(tmp_path / name) for name in (
+        mmap_index.SCALES_FILE, mmap_index.IVF_CENTROIDS_FILE, mmap_index.IVF_LISTS_FILE
+    ))
+    assert MmapIndex(str(tmp_path)).encoding == 'float16'
+
+
+def test_rejects_bad_input(tmp_path, corpus):
+    texts, metadatas, vectors, _ = corpus
+    with pytest.raises(ValueError):
+        write_index(str(tmp_path), texts, metadatas[:-1], vectors)
+    with pytest.raises(ValueError):
+        write_index(str(tmp_path), texts, metadatas, vectors, dtype='bfloat16')
+    write_index(str(tmp_path), texts, metadatas, vectors)
+    with pytest.raises(ValueError):
+        MmapIndex(str(tmp_path)).scores(np.zeros(8))
+
+
+def test_parse_config():
+    assert parse_config('ivf44x8-int8') == {'dtype': 'int8', 'pq_m': None, 'ivf_nlist': 44, 'ivf_nprobe': 8}
+    assert parse_config('pq96')['pq_m'] == 96
+    with pytest.raises(ValueError):
+        parse_config('float8')
+
+
+def test_reads_the_bundled_langchain_docstore():
+    texts, metadatas = read_langchain_docstore(os.path.join(LOCAL_INDEX, 'index.pkl'))
+    assert len(texts) == len(metadatas) > 0
+    assert all(isinstance(text, str) and text for text in texts[:10])
+    assert 'source' in metadatas[0]
+
+
+def test_docstore_reader_refuses_other_classes(tmp_path):
+    path = tmp_path / 'index.pkl'
+    path.write_bytes(pickle.dumps((os.getcwd, {})))
+    with pytest.raises(pickle.UnpicklingError):
+        read_langchain_docstore(str(path))
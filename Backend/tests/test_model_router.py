@@ -0,0 +1,101 @@
+import pytest
+
+import bedrock
+import model_router
+from model_router import ModelRouter, should_fall_back
+
+CONFIG = {
+    'models': {'sonnet': 'sonnet-id', 'haiku': 'haiku-id', 'opus': 'opus-id'},
+    'default': {'primary': 'sonnet', 'fallbacks': ['haiku']},
+    'routes': {
+        'answer': {'primary': 'opus', 'fallbacks': ['sonnet', 'haiku', 'opus']},
+        'code:answer': {'primary': 'haiku'},
+        'caption': {'primary': 'haiku', 'fallbacks': ['sonnet']},
+        'code': {
+            'primary': 'sonnet',
+            'fallbacks': ['haiku'],
+            'short_prompt': {'max_chars': 10, 'model': 'haiku'},
+        },
+    },
+}
+
+
+class ClientError(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {'Error': {'Code': code}}
+
+
+def _request(text):
+    return bedrock.build_request('system prompt that is not counted', text)
+
+
+@pytest.fixture
+def router(monkeypatch):
+    router = ModelRouter(CONFIG)
+    monkeypatch.setattr(bedrock, 'get_router', lambda: router)
+    return router
+
+
+def test_fallback_order_is_primary_then_fallbacks_without_repeats(router):
+    assert router.candidates('answer') == ['opus-id', 'sonnet-id', 'haiku-id']
+
+
+def test_most_specific_route_wins(router):
+    assert router.candidates('answer', 'code') == ['haiku-id']
+    assert router.candidates('unrouted', 'code') == ['sonnet-id', 'haiku-id']
+    assert router.candidates('unrouted', 'other') == ['sonnet-id', 'haiku-id']
+
+
+def test_short_prompts_go_to_the_short_model(router):
+    assert router.candidates('x', 'code', _request('short'))[0] == 'haiku-id'
+    assert router.candidates('x', 'code', _request('a much longer prompt'))[0] == 'sonnet-id'
+
+
+def test_unaliased_model_ids_pass_through():
+    assert ModelRouter({}).candidates('anything') == [model_router.DEFAULT_MODEL_ID]
+    assert ModelRouter({'default': {'primary': 'custom-model'}}).candidates() == ['custom-model']
+
+
+def test_which_errors_fall_back():
+    assert should_fall_back(ClientError('ThrottlingException'))
+    assert should_fall_back(ClientError('ModelTimeoutException'))
+    assert not should_fall_back(ClientError('ValidationException'))
+    assert not should_fall_back(ClientError('AccessDeniedException'))
+
+
+def test_bedrock_tries_models_in_route_order(router):
+    tried = []
+
+    def call(model_id):
+        tried.append(model_id)
+        if model_id != 'haiku-id':
+            raise ClientError('ThrottlingException')
+        return 'answer'
+
+    assert bedrock._with_fallback(call, _request('question'), None, 'answer') == 'answer'
+    assert tried == ['opus-id', 'sonnet-id', 'haiku-id']
+
+
+def test_bedrock_does_not_fall_back_on_a_bad_request(router):
+    tried = []
+
+    def call(model_id):
+        tried.append(model_id)
+        raise ClientError('ValidationException')
+
+    with pytest.raises(ClientError):
+        bedrock._with_fallback(call, _request('question'), None, 'answer')
+    assert tried == ['opus-id']
+
+
+def test_last_model_error_is_raised(router):
+    def call(model_id):
+        raise ClientError('ThrottlingException')
+
+    with pytest.raises(ClientError):
+        bedrock._with_fallback(call, _request('question'), None, 'caption')
+
+
+def test_pinned_model_skips_routing(router):
+    assert bedrock._with_fallback(lambda model_id: model_id, _request('q'), 'pinned-id', 'answer') == 'pinned-id'
@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+import embedding_backends
+import retrieval
+from embedding_backends import EmbeddingMismatchError, HashingBackend
+from mmap_index import write_index
+from retrieval import RetrievalService
+
+TEXTS = [
+    "Perform data backup automatically with AWS Backup.",
+    "Deploy RDS in a Multi-AZ configuration for high availability.",
+    "Encrypt data at rest with AWS KMS customer managed keys.",
+    "Use Auto Scaling groups to match capacity to demand.",
+]
+
+
+@pytest.fixture
+def index_path(tmp_path, monkeypatch):
+    backend = HashingBackend(64)
+    monkeypatch.setattr(embedding_backends, 'MODEL_ID', backend.model_id)
+    metadatas = [{'source': 'wa.pdf', 'page': i} for i in range(len(TEXTS))]
+    write_index(str(tmp_path), TEXTS, metadatas, backend.embed_documents(TEXTS), embedding_model=backend.model_id)
+    return str(tmp_path)
+
+
+def test_index_loads_once_for_concurrent_requests(index_path, monkeypatch):
+    loads = []
+    load = RetrievalService._load
+
+    def counting_load(self):
+        loads.append(1)
+        return load(self)
+
+    monkeypatch.setattr(RetrievalService, '_load', counting_load)
+    service = RetrievalService(index_path)
+    stores = []
+    threads = [threading.Thread(target=lambda: stores.append(service.vectorstore())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+    assert len(stores) == 8 and all(store is stores[0] for store in stores)
+    assert service.loaded
+
+
+def test_vector_search_reuses_the_loaded_index(index_path):
+    service = RetrievalService(index_path)
+    path, ranked, vector = service.rank("Multi-AZ RDS high availability", k=2, mode='vector')
+    assert path == 'vector'
+    assert ranked[0][0] == 1
+    assert len(vector) == 64
+    store = service.vectorstore()
+    service.rank("KMS encryption at rest", k=2, mode='vector')
+    assert service.vectorstore() is store
+
+
+def test_index_from_another_model_is_refused(index_path, monkeypatch):
+    monkeypatch.setattr(embedding_backends, 'MODEL_ID', 'local-hashing-32')
+    with pytest.raises(EmbeddingMismatchError):
+        RetrievalService(index_path).vectorstore()
+
+
+def test_service_is_shared_per_container(monkeypatch):
+    monkeypatch.setattr(retrieval, '_service', None)
+    assert retrieval.get_retrieval_service() is retrieval.get_retrieval_service()
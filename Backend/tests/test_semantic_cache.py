@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+import llm_cache
+from semantic_cache import SemanticCache
+
+A = [1.0, 0.0, 0.0]
+B = [0.0, 1.0, 0.0]
+C = [0.0, 0.0, 1.0]
+
+
+def test_hit_at_or_above_threshold():
+    cache = SemanticCache(threshold=0.95, max_items=4, ttl_seconds=60)
+    cache.store([2.0, 0.0, 0.0], 'v1', {'ans': 'a'})
+    value, similarity = cache.lookup([1.0, 0.05, 0.0], 'v1')
+    assert value == {'ans': 'a'}
+    assert similarity == pytest.approx(1 / np.sqrt(1 + 0.05 ** 2), rel=1e-5)
+
+
+def test_miss_below_threshold():
+    cache = SemanticCache(threshold=0.95, max_items=4, ttl_seconds=60)
+    cache.store(A, 'v1', {'ans': 'a'})
+    assert cache.lookup([1.0, 1.0, 0.0], 'v1') is None
+    assert cache.stats()['misses'] == 1
+
+
+def test_returns_closest_question():
+    cache = SemanticCache(threshold=0.5, max_items=4, ttl_seconds=60)
+    cache.store(A, 'v1', {'ans': 'a'})
+    cache.store(B, 'v1', {'ans': 'b'})
+    assert cache.lookup([0.2, 1.0, 0.0], 'v1')[0] == {'ans': 'b'}
+
+
+def test_version_change_clears_cache():
+    cache = SemanticCache(threshold=0.95, max_items=4, ttl_seconds=60)
+    cache.store(A, 'v1', {'ans': 'a'})
+    assert cache.lookup(A, 'v2') is None
+    assert cache.lookup(A, 'v1') is None
+    stats = cache.stats()
+    assert stats['invalidations'] == 2
+    assert stats['entries'] == 0
+
+
+def test_expired_entries_miss_and_are_reused():
+    cache = SemanticCache(threshold=0.95, max_items=2, ttl_seconds=0)
+    cache.store(A, 'v1', {'ans': 'a'})
+    assert cache.lookup(A, 'v1') is None
+    cache.ttl_seconds = 60
+    cache.store(B, 'v1', {'ans': 'b'})
+    cache.store(C, 'v1', {'ans': 'c'})
+    assert cache.stats()['entries'] == 2
+    assert cache.lookup(B, 'v1')[0] == {'ans': 'b'}
+    assert cache.lookup(C, 'v1')[0] == {'ans': 'c'}
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticCache(threshold=0.95, max_items=2, ttl_seconds=60)
+    cache.store(A, 'v1', {'ans': 'a'})
+    cache.store(B, 'v1', {'ans': 'b'})
+    assert cache.lookup(A, 'v1') is not None
+    cache.store(C, 'v1', {'ans': 'c'})
+    assert cache.lookup(B, 'v1') is None
+    assert cache.lookup(A, 'v1')[0] == {'ans': 'a'}
+    assert cache.lookup(C, 'v1')[0] == {'ans': 'c'}
+
+
+def test_bypass_skips_lookup_but_still_stores():
+    cache = SemanticCache(threshold=0.95, max_items=4, ttl_seconds=60)
+    llm_cache.set_bypass(True)
+    try:
+        cache.store(A, 'v1', {'ans': 'a'})
+        assert cache.lookup(A, 'v1') is None
+    finally:
+        llm_cache.set_bypass(False)
+    assert cache.lookup(A, 'v1')[0] == {'ans': 'a'}
+    assert cache.stats()['hits'] == 1
+
+
+def test_zero_vector_is_not_stored_or_matched():
+    cache = SemanticCache(threshold=0.95, max_items=4, ttl_seconds=60)
+    cache.store([0.0, 0.0, 0.0], 'v1', {'ans': 'zero'})
+    assert cache.stats()['stores'] == 0
+    cache.store(A, 'v1', {'ans': 'a'})
+    assert cache.lookup([0.0, 0.0, 0.0], 'v1') is None
+
+
+def test_dimension_mismatch_raises():
+    cache = SemanticCache(threshold=0.95, max_items=4, ttl_seconds=60)
+    cache.store(A, 'v1', {'ans': 'a'})
+    with pytest.raises(ValueError):
+        cache.lookup([1.0, 0.0], 'v1')
+
+
+def test_hit_rate():
+    cache = SemanticCache(threshold=0.95, max_items=4, ttl_seconds=60)
+    cache.store(A, 'v1', {'ans': 'a'})
+    cache.lookup(A, 'v1')
+    cache.lookup(B, 'v1')
+    assert cache.stats()['hit_rate'] == 0.5
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from streaming import StopSequenceFilter, StreamError, iter_text, skip_first_line, split_first
+
+
+class FakeBody:
+    def __init__(self, events):
+        self.events = events
+        self.read = 0
+        self.closed = False
+
+    def __iter__(self):
+        for event in self.events:
+            self.read += 1
+            yield event
+
+    def close(self):
+        self.closed = True
+
+
+def _chunk(event):
+    return {'chunk': {'bytes': json.dumps(event).encode('utf-8')}}
+
+
+def _response(*deltas, stop_reason='end_turn'):
+    events = [_chunk({'type': 'message_start', 'message': {'usage': {'input_tokens': 12}}})]
+    events += [_chunk({'type': 'content_block_delta', 'delta': {'text': text}}) for text in deltas]
+    events.append(_chunk({'type': 'message_delta', 'delta': {'stop_reason': stop_reason},
+                          'usage': {'output_tokens': 7}}))
+    return {'body': FakeBody(events)}
+
+
+def _feed(stop_sequences, deltas):
+    stop_filter = StopSequenceFilter(stop_sequences)
+    out = [stop_filter.feed(text) for text in deltas]
+    return out, stop_filter.flush(), stop_filter.stopped
+
+
+def test_stop_sequence_within_one_delta():
+    assert _feed(['</code>'], ['print(1)</code> trailing']) == (['print(1)'], '', True)
+
+
+def test_stop_sequence_split_across_deltas_is_held_back():
+    out, rest, stopped = _feed(['</code>'], ['print(1)</co', 'de>', 'more'])
+    assert out == ['print(1)', '', '']
+    assert stopped and rest == ''
+
+
+def test_held_prefix_is_released_when_it_is_not_a_stop():
+    out, rest, stopped = _feed(['</code>'], ['a </c', 'at>', ' b <'])
+    assert ''.join(out) + rest == 'a </cat> b <'
+    assert not stopped
+
+
+def test_iter_text_stops_reading_and_closes_the_stream():
+    response = _response('x = ', '1\n</co', 'de>', 'never read')
+    metadata = {}
+    assert ''.join(iter_text(response, stop_sequences=['</code>'], metadata=metadata)) == 'x = 1\n'
+    assert metadata == {'input_tokens': 12, 'stop_reason': 'stop_sequence'}
+    assert response['body'].read == 4
+    assert response['body'].closed
+
+
+def test_iter_text_collects_usage_without_stop_sequences():
+    response = _response('Hello', ' world')
+    metadata = {}
+    assert list(iter_text(response, metadata=metadata)) == ['Hello', ' world']
+    assert metadata == {'input_tokens': 12, 'stop_reason': 'end_turn', 'output_tokens': 7}
+
+
+def test_stream_error_event_raises():
+    response = {'body': FakeBody([_chunk({'type': 'content_block_delta', 'delta': {'text': 'a'}}),
+                                  {'throttlingException': {'message': 'slow down'}}])}
+    with pytest.raises(StreamError, match='throttlingException: slow down'):
+        list(iter_text(response))
+    assert response['body'].closed
+
+
+def test_skip_first_line_across_deltas():
+    assert ''.join(skip_first_line(['```pyt', 'hon\nimport os', '\n'])) == 'import os\n'
+    assert ''.join(skip_first_line(['single line'])) == 'single line'
+
+
+def test_split_first():
+    first, rest = split_first(iter([{'n': 1}, {'n': 2}]))
+    assert first == {'n': 1} and list(rest) == [{'n': 2}]
+    assert split_first(iter([]))[0] is None
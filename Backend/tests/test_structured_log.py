@@ -0,0 +1,46 @@
+import json
+import logging
+
+import pytest
+
+import structured_log
+
+
+@pytest.fixture
+def log(caplog):
+    yield structured_log.get_logger('test_structured_log')
+    structured_log.end_request()
+
+
+def _lines(caplog):
+    return [(r.levelno, json.loads(r.getMessage())) for r in caplog.records if r.name == 'test_structured_log']
+
+
+def test_sampled_debug_is_written_at_info(log, caplog):
+    caplog.set_level(logging.INFO, logger='test_structured_log')
+    structured_log.begin_request('req-1', debug=True)
+    log.debug("detail", value=1)
+    assert _lines(caplog) == [(logging.INFO, {'level': 'DEBUG', 'msg': 'detail', 'request_id': 'req-1', 'value': 1})]
+
+
+def test_sampled_debug_is_dropped_above_info(log, caplog):
+    caplog.set_level(logging.WARNING, logger='test_structured_log')
+    structured_log.begin_request('req-1', debug=True)
+    log.debug("detail")
+    log.warning("kept")
+    assert [line['level'] for _, line in _lines(caplog)] == ['WARNING']
+
+
+def test_unsampled_debug_is_skipped(log, caplog):
+    caplog.set_level(logging.INFO, logger='test_structured_log')
+    structured_log.begin_request('req-1', debug=False)
+    log.debug("detail", value=lambda: pytest.fail("field evaluated"))
+    assert _lines(caplog) == []
+
+
+def test_long_fields_are_summarized(log, caplog):
+    caplog.set_level(logging.INFO, logger='test_structured_log')
+    log.info("big", image='x' * (structured_log.HASH_ONLY_CHARS + 1))
+    field = _lines(caplog)[0][1]['image']
+    assert str(structured_log.HASH_ONLY_CHARS + 1) in json.dumps(field)
+    assert 'x' * 100 not in json.dumps(field)
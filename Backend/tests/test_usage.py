@@ -0,0 +1,75 @@
+import pytest
+
+import metrics
+import usage
+
+
+@pytest.fixture(autouse=True)
+def request_state():
+    metrics_token = metrics._current.set(None)
+    usage_token = usage._current.set(None)
+    yield
+    usage._current.reset(usage_token)
+    metrics._current.reset(metrics_token)
+
+
+def test_summary_totals_and_breakdowns():
+    usage.start_request()
+    with usage.tool_scope('well-arch'):
+        usage.record_call('sonnet', purpose='answer', input_tokens=100, output_tokens=20,
+                          stop_reason='end_turn', latency_ms=500, retries=1)
+    with usage.tool_scope('code'):
+        usage.record_call('haiku', purpose='code', input_tokens=50, output_tokens=4096,
+                          stop_reason='max_tokens', latency_ms=900)
+
+    summary = usage.summary()
+    assert {field: summary[field] for field in ('calls', 'input_tokens', 'output_tokens', 'model_ms', 'retries')} == {
+        'calls': 2, 'input_tokens': 150, 'output_tokens': 4116, 'model_ms': 1400.0, 'retries': 1,
+    }
+    assert summary['stop_reasons'] == {'end_turn': 1, 'max_tokens': 1}
+    assert set(summary['by_tool']) == {'well-arch', 'code'}
+    assert summary['by_purpose']['code']['output_tokens'] == 4096
+    assert summary['by_model']['sonnet']['retries'] == 1
+
+
+def test_cached_calls_are_counted_but_not_billed():
+    usage.start_request()
+    usage.record_call('sonnet', input_tokens=100, output_tokens=20, stop_reason='end_turn', cached=True)
+    summary = usage.summary()
+    assert summary['calls'] == 1 and summary['cached_calls'] == 1
+    assert summary['input_tokens'] == 0 and summary['stop_reasons'] == {}
+
+
+def test_calls_feed_the_request_metrics():
+    request_metrics = metrics.start_request()
+    usage.record_call('sonnet', input_tokens=10, output_tokens=4096, stop_reason='max_tokens', latency_ms=12.5)
+    assert request_metrics.counts == {
+        'bedrock_calls': 1,
+        'bedrock_input_tokens': 10,
+        'bedrock_output_tokens': 4096,
+        'bedrock_retries': 0,
+        'bedrock_max_tokens': 1,
+    }
+    assert request_metrics.durations['bedrock_model'] == [12.5]
+
+
+def test_no_ledger_outside_a_request():
+    usage.record_call('sonnet', input_tokens=10)
+    assert usage.summary() is None
+
+
+def test_tool_scope_nests_and_restores():
+    with usage.tool_scope('batch'):
+        with usage.tool_scope('code'):
+            assert usage.current_tool() == 'code'
+        assert usage.current_tool() == 'batch'
+    assert usage.current_tool() is None
+
+
+def test_merge_adds_another_ledgers_calls():
+    ledger = usage.start_request()
+    usage.record_call('sonnet', input_tokens=1)
+    part = usage.UsageLedger()
+    part.add(dict(ledger.calls[0], input_tokens=2))
+    ledger.merge(part)
+    assert ledger.summary()['input_tokens'] == 3
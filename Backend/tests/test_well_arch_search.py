@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pytest
+
+from mmap_index import write_index
+from retrieval import RetrievalService
+from tools import InvalidQueryError
+from tools import well_arch_search
+
+LOCAL_INDEX = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'local_index')
+TEXTS = [
+    "REL09-BP03 Perform data backup automatically with AWS Backup.",
+    "Deploy RDS in a Multi-AZ configuration for high availability.",
+    "Use S3 Object Lock to protect backup data from deletion.",
+]
+
+
+def _no_vector_store(self):
+    raise AssertionError("lexical search loaded the vector store")
+
+
+@pytest.fixture
+def lexical_only(monkeypatch):
+    # Loading the vector store would import FAISS/LangChain and build the Bedrock embeddings client
+    monkeypatch.setattr(RetrievalService, '_load', _no_vector_store)
+
+    def use(index_path):
+        service = RetrievalService(index_path)
+        monkeypatch.setattr(well_arch_search, 'get_retrieval_service', lambda: service)
+        return service
+
+    return use
+
+
+def test_lexical_search_needs_no_vector_store(tmp_path, lexical_only):
+    metadatas = [{'source': 'wa.pdf', 'page': page} for page in (10, 20, 30)]
+    write_index(str(tmp_path), TEXTS, metadatas, np.eye(3, dtype=np.float32), embedding_model='test')
+    service = lexical_only(str(tmp_path))
+
+    result = well_arch_search.run({'text': 'REL09-BP03', 'mode': 'lexical', 'full_text': True})
+    data = result['data']
+    assert data['retrieval_path'] == 'lexical'
+    assert data['results'][0]['chunk'] == 0
+    assert data['results'][0]['page'] == 10
+    assert data['results'][0]['text'] == TEXTS[0]
+    assert service._vectorstore is None
+
+
+def test_lexical_search_over_langchain_docstore(lexical_only):
+    if not os.path.exists(os.path.join(LOCAL_INDEX, 'index.pkl')):
+        pytest.skip("no local_index")
+    service = lexical_only(LOCAL_INDEX)
+
+    data = well_arch_search.run({'text': 'multi-az database failover', 'mode': 'lexical', 'page_size': 3})['data']
+    assert len(data['results']) == 3
+    assert all(hit['snippet'] for hit in data['results'])
+    assert service._vectorstore is None
+
+
+def test_filters_apply_to_lexical_hits(tmp_path, lexical_only):
+    metadatas = [{'source': 'a.pdf'}, {'source': 'b.pdf'}, {'source': 'b.pdf'}]
+    write_index(str(tmp_path), TEXTS, metadatas, np.eye(3, dtype=np.float32), embedding_model='test')
+    lexical_only(str(tmp_path))
+
+    data = well_arch_search.run({'text': 'backup', 'mode': 'lexical', 'filters': {'source': 'b.pdf'}})['data']
+    assert [hit['chunk'] for hit in data['results']] == [2]
+
+
+@pytest.mark.parametrize('query', [
+    '',
+    {'text': 'x', 'page_size': 0},
+    {'text': 'x', 'page': True},
+    {'text': 'x', 'mode': 'fuzzy'},
+    {'text': 'x', 'filters': {'author': 'me'}},
+])
+def test_invalid_queries_are_rejected(query):
+    with pytest.raises(InvalidQueryError):
+        well_arch_search.parse_query(query)
+
@@ -0,0 +1,63 @@
+"""
+Tool modules behind the Lambda handler's dispatcher.
+
+Each tool lives in its own module and is only imported the first time a
+request for it arrives, so a request only pays for the dependencies of the
+tool it actually uses. Every tool module exposes ``run(query)`` returning the
+response data, and ``warm()`` to load its heavy dependencies ahead of time.
+A tool raises ``InvalidQueryError`` for a query it cannot accept.
+"""
+import importlib
+import threading
+import time
+from types import ModuleType
+from typing import Dict
+
+from tools.lazy import init_report, lazy_dependency, record_init
+
+TOOL_MODULES = {
+    "AWS Well Architected Tool": "tools.well_arch",
+    "Diagram Tool": "tools.diagram",
+    "Code Gen Tool": "tools.code_gen",
+    "AWS Well Architected Search": "tools.well_arch_search",
+}
+
+_loaded: Dict[str, ModuleType] = {}
+_load_lock = threading.Lock()
+
+
+class UnknownToolError(KeyError):
+    """Raised when a request names a tool type that does not exist"""
+
+    def __str__(self):
+        return f"Unknown tool type: {self.args[0]}"
+
+
+class InvalidQueryError(ValueError):
+    """Raised by a tool when its query is malformed"""
+
+
+def load_tool(tool_type: str) -> ModuleType:
+    """Import the module implementing ``tool_type`` on first use"""
+    module = _loaded.get(tool_type)
+    if module is not None:
+        return module
+    if tool_type not in TOOL_MODULES:
+        raise UnknownToolError(tool_type)
+    with _load_lock:
+        if tool_type not in _loaded:
+            start = time.perf_counter()
+            _loaded[tool_type] = importlib.import_module(TOOL_MODULES[tool_type])
+            record_init(TOOL_MODULES[tool_type], 'import', time.perf_counter() - start)
+    return _loaded[tool_type]
+
+
+__all__ = [
+    'TOOL_MODULES',
+    'InvalidQueryError',
+    'UnknownToolError',
+    'init_report',
+    'lazy_dependency',
+    'load_tool',
+    'record_init',
+]
@@ -0,0 +1,63 @@
+"""
+Cold-start cost report for every tool.
+
+    python -m tools [--json]
+
+Each tool is imported and warmed in a fresh interpreter so the numbers match
+what a cold Lambda container pays for that tool alone.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from tools import TOOL_MODULES
+
+_PROFILE_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import tools
+tool = tools.load_tool({tool_type!r})
+tool.warm()
+report = tools.init_report()
+report['wall_ms'] = round((time.perf_counter() - start) * 1000, 2)
+print(json.dumps(report))
+"""
+
+
+def profile_tool(tool_type: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, '-c', _PROFILE_SCRIPT.format(tool_type=tool_type)],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    if result.returncode != 0:
+        return {'error': result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'failed'}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Report cold-start cost per tool")
+    parser.add_argument('--json', action='store_true', help="Print the raw JSON report")
+    args = parser.parse_args()
+
+    report = {tool_type: profile_tool(tool_type) for tool_type in TOOL_MODULES}
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    for tool_type, timings in report.items():
+        if 'error' in timings:
+            print(f"{tool_type}: failed ({timings['error']})")
+            continue
+        print(f"{tool_type}: {timings.pop('wall_ms')} ms cold start")
+        for component, stages in sorted(timings.items()):
+            details = ', '.join(f"{stage}={ms} ms" for stage, ms in stages.items() if stage != 'total_ms')
+            print(f"  {component}: {stages['total_ms']} ms ({details})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
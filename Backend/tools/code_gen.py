@@ -0,0 +1,38 @@
+from streaming import skip_first_line
+from tools.common import remove_first_line
+from tools.llm import call_claude_3_code, get_bedrock_runtime, stream_claude_3_code
+
+SYSTEM_PROMPT = """
+    You are an expert programmer with extensive knowledge of various programming languages and frameworks. Maintain a professional and efficient tone, focusing on providing concise and accurate code solutions. Your task is to provide code solutions to programming problems or requirements posed by users. The code should be well-commented, efficient, and follow best practices. You should not provide any explanations or additional context unless explicitly requested. The code should be formatted correctly and ready to be copied and pasted into an editor.
+    """
+
+
+def code_gen_tool(prompt):
+    """
+    Use this tool only when you need to generate code based on a customers's request. The input is the customer's question. The tool returns code that the customer can use.
+    """
+    generated_text = call_claude_3_code(SYSTEM_PROMPT, prompt)
+    # remove first line
+    generated_text = remove_first_line(generated_text)
+    return generated_text
+
+
+def run(query):
+    code = code_gen_tool(query)
+    return {
+        'success': True,
+        'type': 'code',
+        'data': {
+            'code': code
+        }
+    }
+
+
+def stream(query):
+    """Yield the generated code as it arrives"""
+    for text in skip_first_line(stream_claude_3_code(SYSTEM_PROMPT, query)):
+        yield {'type': 'delta', 'text': text}
+
+
+def warm():
+    get_bedrock_runtime()
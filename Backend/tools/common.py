@@ -0,0 +1,47 @@
+import base64
+import io
+import json
+import logging
+from typing import Any, Dict
+
+from metrics import record_size, timed
+
+logger = logging.getLogger(__name__)
+
+
+def load_json(path_to_json: str) -> Dict[str, Any]:
+    """Load JSON files with proper error handling"""
+    try:
+        with open(path_to_json, "r") as config_file:
+            conf = json.load(config_file)
+            return conf
+    except FileNotFoundError:
+        logger.error(f"JSON file not found: {path_to_json}")
+        raise
+    except json.JSONDecodeError:
+        logger.error(f"Invalid JSON file: {path_to_json}")
+        raise
+    except Exception as error:
+        logger.error(f"Error loading JSON file: {error}")
+        raise
+
+
+@timed()
+def pil_to_base64(image, format="png"):
+    """Convert PIL image to base64 with error handling"""
+    try:
+        with io.BytesIO() as buffer:
+            image.save(buffer, format)
+            encoded = base64.b64encode(buffer.getvalue()).decode()
+            record_size('image_base64', encoded)
+            return encoded
+    except Exception as e:
+        logger.error(f"Error converting image to base64: {e}")
+        raise
+
+
+def remove_first_line(text):
+    lines = text.split("\n")
+    if len(lines) > 1:
+        lines = lines[1:]
+    return "\n".join(lines)
@@ -0,0 +1,65 @@
+"""
+Lazy loading helpers for tool dependencies.
+
+Heavy dependencies (boto3 clients, PIL, langchain, the vector index, ...) are
+wrapped in ``lazy_dependency`` loaders so they are created on first use rather
+than at import time. Every load is timed and collected into the init report.
+"""
+import functools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+_UNSET = object()
+_timings: Dict[str, Dict[str, float]] = {}
+_timings_lock = threading.Lock()
+
+
+def record_init(component: str, stage: str, seconds: float):
+    """Record how long an init stage of a component took"""
+    with _timings_lock:
+        _timings.setdefault(component, {})[stage] = round(seconds * 1000, 2)
+    logger.info(f"Init {component}.{stage} took {seconds * 1000:.1f} ms")
+
+
+def init_report() -> Dict[str, Dict[str, Any]]:
+    """Init-phase timings recorded so far, per component, in milliseconds"""
+    with _timings_lock:
+        return {
+            component: {**stages, 'total_ms': round(sum(stages.values()), 2)}
+            for component, stages in _timings.items()
+        }
+
+
+def lazy_dependency(component: str) -> Callable[[Callable[[], T]], Callable[[], T]]:
+    """
+    Turn a zero-argument loader into a cached, thread-safe lazy accessor.
+
+    The first call runs the loader and records its duration under
+    ``component``; later calls return the cached value.
+    """
+    def decorator(loader: Callable[[], T]) -> Callable[[], T]:
+        value: Any = _UNSET
+        lock = threading.Lock()
+
+        @functools.wraps(loader)
+        def wrapper() -> T:
+            nonlocal value
+            if value is _UNSET:
+                with lock:
+                    if value is _UNSET:
+                        start = time.perf_counter()
+                        loaded = loader()
+                        record_init(component, loader.__name__.lstrip('_'), time.perf_counter() - start)
+                        value = loaded
+            return value
+
+        wrapper.is_loaded = lambda: value is not _UNSET
+        return wrapper
+
+    return decorator
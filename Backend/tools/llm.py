@@ -0,0 +1,104 @@
+import logging
+from typing import Any, Dict, Iterator, Optional
+
+from botocore.exceptions import ClientError
+
+from bedrock import build_request, get_bedrock_runtime, image_block, invoke_text, stream_text, text_block
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+CODE_PREFILL = "```"
+FILL_PREFILL = "Here is the code with no explanation ```python"
+
+CAPTION_SYSTEM_PROMPT = """
+    You are an experienced AWS Solutions Architect with deep knowledge of AWS services and best practices for designing and implementing cloud architectures. Maintain a professional and consultative tone, providing clear and detailed explanations tailored for technical audiences. Your task is to describe and explain AWS architecture diagrams presented by users. Your descriptions should cover the purpose and functionality of the included AWS services, their interactions, data flows, and any relevant design patterns or best practices.
+    """
+CAPTION_PROMPT = "Please describe the following AWS architecture diagram, explaining the purpose of each service, their interactions, and any relevant design considerations or best practices."
+
+
+@timed()
+def call_claude_3(
+    system_prompt: str,
+    prompt: str,
+    model_id: Optional[str] = None,
+):
+    """Call Claude 3 with enhanced error handling"""
+    try:
+        return invoke_text(build_request(system_prompt, prompt), model_id=model_id, purpose='call_claude_3')
+    except ClientError as e:
+        logger.error(f"AWS Bedrock error: {e}")
+        raise
+    except Exception as e:
+        logger.error(f"Error calling Claude 3: {e}")
+        raise
+
+
+@timed()
+def call_claude_3_code(
+    system_prompt: str,
+    prompt: str,
+    model_id: Optional[str] = None,
+):
+    """Call Claude 3 for code generation"""
+    try:
+        request = build_request(system_prompt, prompt, prefill=CODE_PREFILL, stop_sequences=["```"])
+        return invoke_text(request, model_id=model_id, purpose='call_claude_3_code')
+    except Exception as e:
+        logger.error(f"Error in code generation: {e}")
+        raise
+
+
+@timed()
+def gen_image_caption(base64_string):
+    request = build_request(
+        CAPTION_SYSTEM_PROMPT,
+        [image_block(base64_string), text_block(CAPTION_PROMPT)]
+    )
+    return invoke_text(request, purpose='gen_image_caption')
+
+
+@timed()
+def call_claude_3_fill(
+    system_prompt: str,
+    prompt: str,
+    model_id: Optional[str] = None,
+):
+    request = build_request(system_prompt, prompt, prefill=FILL_PREFILL, stop_sequences=["```"])
+    return invoke_text(request, model_id=model_id, purpose='call_claude_3_fill')
+
+
+def stream_claude_3(
+    system_prompt: str,
+    prompt: str,
+    model_id: Optional[str] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+) -> Iterator[str]:
+    """Stream a Claude 3 answer as text deltas"""
+    request = build_request(system_prompt, prompt)
+    try:
+        yield from stream_text(request, model_id=model_id, metadata=metadata, purpose='call_claude_3')
+    except Exception as e:
+        logger.error(f"Error streaming Claude 3: {e}")
+        raise
+
+
+def stream_claude_3_code(
+    system_prompt: str,
+    prompt: str,
+    model_id: Optional[str] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+) -> Iterator[str]:
+    """Stream generated code, stopping as soon as the closing fence arrives"""
+    request = build_request(system_prompt, prompt, prefill=CODE_PREFILL, stop_sequences=["```"])
+    try:
+        yield from stream_text(
+            request,
+            model_id=model_id,
+            stop_sequences=["```"],
+            metadata=metadata,
+            purpose='call_claude_3_code'
+        )
+    except Exception as e:
+        logger.error(f"Error streaming code generation: {e}")
+        raise
@@ -0,0 +1,127 @@
+import hashlib
+import logging
+
+import metrics
+from context_builder import CANDIDATES, TOKEN_BUDGET, build_context
+from retrieval import get_retrieval_service
+from semantic_cache import get_semantic_cache
+from tools.llm import call_claude_3, get_bedrock_runtime, stream_claude_3
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = """
+        You are an expert certified AWS solutions architect professional, skilled at helping 
+        customers solve their problems. You are able to reference context from the AWS 
+        Well-Architected Framework to help customers solve their problem.
+        """
+
+# Answers depend on the prompt and context settings as well as the index
+_ANSWER_VERSION = hashlib.sha256(f"{SYSTEM_PROMPT}{CANDIDATES}:{TOKEN_BUDGET}".encode('utf-8')).hexdigest()[:8]
+
+
+def _no_store(result):
+    pass
+
+
+def _retrieve(query):
+    """Candidate chunks for the context, with the query embedding if retrieval computed one"""
+    service = get_retrieval_service()
+    _, ranked, vector = service.rank(query, k=CANDIDATES)
+    return [(service.document(i), score) for i, score in ranked], vector
+
+
+def _cached_answer(vector):
+    """
+    Look the question up in the semantic cache by the embedding retrieval
+    already computed. Returns a function that stores the fresh answer (a
+    no-op when the cache cannot be used) and the cached answer, if any.
+    Queries answered from BM25 alone have no embedding and skip the cache
+    rather than pay for one.
+    """
+    cache = get_semantic_cache('well_arch')
+    if cache is None or vector is None:
+        metrics.set_property('semantic_cache', 'skip')
+        return _no_store, None
+    version = f"{get_retrieval_service().index_version()}:{_ANSWER_VERSION}"
+    cached = cache.lookup(vector, version)
+    metrics.set_property('semantic_cache', 'hit' if cached else 'miss')
+
+    def store(result):
+        cache.store(vector, version, result)
+
+    return store, cached[0] if cached else None
+
+
+def _build_prompt(query, results):
+    """Build the prompt and packed context from the retrieved chunks"""
+    # Pack the distinct chunks into the token budget
+    context = build_context(results)
+    prompt = f"""Use the following pieces of context to answer the question at the end.
+        {context.text}
+        Question: {query}
+        Answer:"""
+    return prompt, context
+
+
+def aws_well_arch_tool(query):
+    """
+    Use this tool for any AWS related question to help customers understand best practices 
+    on building on AWS. It will use the relevant context from the AWS Well-Architected 
+    Framework to answer the customer's query.
+    """
+    try:
+        results, vector = _retrieve(query)
+        store, cached = _cached_answer(vector)
+        if cached:
+            return cached
+
+        prompt, context = _build_prompt(query, results)
+        generated_text = call_claude_3(SYSTEM_PROMPT, prompt)
+        
+        resp_json = {
+            "ans": str(generated_text), 
+            "docs": context.resource_lines,
+            "sources": context.resources
+        }
+        store(resp_json)
+        return resp_json
+        
+    except Exception as e:
+        logger.error(f"Error in aws_well_arch_tool: {str(e)}")
+        raise
+
+
+def run(query):
+    result = aws_well_arch_tool(query)
+    return {
+        'success': True,
+        'type': 'well-arch',
+        'data': {
+            'answer': result['ans'],
+            'resources': result['docs'],
+            'sources': result.get('sources', [])
+        }
+    }
+
+
+def stream(query):
+    """Yield the resources first, then the answer as it is generated"""
+    results, vector = _retrieve(query)
+    store, cached = _cached_answer(vector)
+    if cached:
+        yield {'type': 'resources', 'resources': cached['docs'], 'sources': cached.get('sources', [])}
+        yield {'type': 'delta', 'text': cached['ans']}
+        return
+
+    prompt, context = _build_prompt(query, results)
+    yield {'type': 'resources', 'resources': context.resource_lines, 'sources': context.resources}
+    answer = []
+    for text in stream_claude_3(SYSTEM_PROMPT, prompt):
+        answer.append(text)
+        yield {'type': 'delta', 'text': text}
+    store({"ans": ''.join(answer), "docs": context.resource_lines, "sources": context.resources})
+
+
+def warm():
+    get_retrieval_service().warm()
+    get_bedrock_runtime()
@@ -0,0 +1,134 @@
+"""
+Retrieval-only search over the Well-Architected corpus: ranked passages with
+scores and sources, and no model call.
+
+``query`` is the search text, or an object with options:
+
+    {"text": "multi-AZ RDS", "page": 1, "page_size": 10, "mode": "lexical",
+     "filters": {"source": ["well_arch.pdf"], "page_from": 100, "page_to": 200},
+     "full_text": false}
+
+``mode`` picks ``hybrid``, ``vector`` or ``lexical`` retrieval for this query
+(default ``RETRIEVAL_MODE``). ``lexical`` never leaves the container.
+Filters apply to the top ``SEARCH_MAX_RESULTS`` hits, so deep pages of a
+narrow filter can come back short.
+"""
+import os
+from typing import Any, Dict, List, Tuple
+
+from context_builder import snippet
+from retrieval import get_retrieval_service
+from tools import InvalidQueryError
+
+DEFAULT_PAGE_SIZE = int(os.environ.get('SEARCH_PAGE_SIZE', '10'))
+MAX_PAGE_SIZE = int(os.environ.get('SEARCH_MAX_PAGE_SIZE', '50'))
+MAX_RESULTS = int(os.environ.get('SEARCH_MAX_RESULTS', '200'))
+MODES = ('hybrid', 'vector', 'lexical')
+
+
+def _int_option(options: Dict[str, Any], name: str, default: int, minimum: int, maximum: int) -> int:
+    value = options.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, int) or not minimum <= value <= maximum:
+        raise InvalidQueryError(f"{name} must be an integer from {minimum} to {maximum}")
+    return value
+
+
+def parse_query(query: Any) -> Dict[str, Any]:
+    """Validate the query and fill in the option defaults"""
+    options = {'text': query} if isinstance(query, str) else query
+    if not isinstance(options, dict) or not isinstance(options.get('text'), str) or not options['text'].strip():
+        raise InvalidQueryError("query must be a search string or an object with a non-empty 'text'")
+    page_size = _int_option(options, 'page_size', DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+    page = _int_option(options, 'page', 1, 1, max(1, MAX_RESULTS // page_size))
+    mode = options.get('mode')
+    if mode is not None and mode not in MODES:
+        raise InvalidQueryError(f"mode must be one of {', '.join(MODES)}")
+    filters = options.get('filters') or {}
+    if not isinstance(filters, dict) or set(filters) - {'source', 'page_from', 'page_to'}:
+        raise InvalidQueryError("filters may only contain source, page_from and page_to")
+    for name in ('page_from', 'page_to'):
+        if filters.get(name) is not None and (isinstance(filters[name], bool) or not isinstance(filters[name], int)):
+            raise InvalidQueryError(f"filters.{name} must be an integer")
+    sources = filters.get('source')
+    if isinstance(sources, str):
+        sources = [sources]
+    return {
+        'text': options['text'].strip(),
+        'page': page,
+        'page_size': page_size,
+        'mode': mode,
+        'sources': set(sources) if sources else None,
+        'page_from': filters.get('page_from'),
+        'page_to': filters.get('page_to'),
+        'full_text': bool(options.get('full_text', False)),
+    }
+
+
+def _matches(metadata: Dict[str, Any], options: Dict[str, Any]) -> bool:
+    if options['sources'] is not None and metadata.get('source') not in options['sources']:
+        return False
+    if options['page_from'] is None and options['page_to'] is None:
+        return True
+    page = metadata.get('page')
+    if page is None:
+        return False
+    return (options['page_from'] is None or page >= options['page_from']) and (
+        options['page_to'] is None or page <= options['page_to'])
+
+
+def search(options: Dict[str, Any]) -> Tuple[str, List[Dict[str, Any]], bool]:
+    """(retrieval path, hits on the requested page, whether more hits follow)"""
+    service = get_retrieval_service()
+    start = (options['page'] - 1) * options['page_size']
+    filtered = options['sources'] is not None or options['page_from'] is not None or options['page_to'] is not None
+    # One extra hit tells whether there is a next page; filtering needs the whole candidate pool
+    k = MAX_RESULTS if filtered else min(MAX_RESULTS, start + options['page_size'] + 1)
+    path, ranked, _ = service.rank(options['text'], k, mode=options['mode'])
+
+    hits = []
+    matched = 0
+    for rank, (index, score) in enumerate(ranked, start=1):
+        document = service.document(index) if filtered else None
+        if document is not None and not _matches(document.metadata, options):
+            continue
+        matched += 1
+        if matched <= start:
+            continue
+        if matched > start + options['page_size']:
+            return path, hits, True
+        document = document or service.document(index)
+        hit = {
+            'rank': rank,
+            'chunk': index,
+            'source': document.metadata.get('source'),
+            'score': round(float(score), 4),
+        }
+        if document.metadata.get('page') is not None:
+            hit['page'] = document.metadata['page']
+        if options['full_text']:
+            hit['text'] = document.page_content
+        else:
+            hit['snippet'] = snippet(document.page_content)
+        hits.append(hit)
+    return path, hits, False
+
+
+def run(query):
+    options = parse_query(query)
+    path, hits, has_more = search(options)
+    return {
+        'success': True,
+        'type': 'well-arch-search',
+        'data': {
+            'query': options['text'],
+            'results': hits,
+            'page': options['page'],
+            'page_size': options['page_size'],
+            'has_more': has_more,
+            'retrieval_path': path,
+        }
+    }
+
+
+def warm():
+    get_retrieval_service().warm()
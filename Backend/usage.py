@@ -0,0 +1,144 @@
+"""
+Per-request ledger of Bedrock usage.
+
+Every model call made through ``bedrock`` records its input/output tokens,
+model latency, stop reason and retry count here, tagged with the tool that
+made it and the prompt it used (``purpose``). The handler opens a ledger per
+request with ``start_request`` and returns ``summary()`` in the response, so a
+bloated prompt or a tool that keeps hitting ``max_tokens`` shows up in both the
+response metadata and the request metrics.
+"""
+import contextvars
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import metrics
+
+_current: contextvars.ContextVar = contextvars.ContextVar('usage_ledger', default=None)
+_tool: contextvars.ContextVar = contextvars.ContextVar('usage_tool', default=None)
+
+_TOTAL_FIELDS = ('calls', 'cached_calls', 'input_tokens', 'output_tokens', 'model_ms', 'retries')
+
+
+def _empty_totals() -> Dict[str, Any]:
+    totals: Dict[str, Any] = {field: 0 for field in _TOTAL_FIELDS}
+    totals['stop_reasons'] = {}
+    return totals
+
+
+def _add(totals: Dict[str, Any], call: Dict[str, Any]):
+    totals['calls'] += 1
+    if call['cached']:
+        # Cached answers cost nothing; keep them out of the billed totals
+        totals['cached_calls'] += 1
+        return
+    totals['input_tokens'] += call['input_tokens']
+    totals['output_tokens'] += call['output_tokens']
+    totals['model_ms'] = round(totals['model_ms'] + call['latency_ms'], 1)
+    totals['retries'] += call['retries']
+    stop_reason = call['stop_reason'] or 'unknown'
+    totals['stop_reasons'][stop_reason] = totals['stop_reasons'].get(stop_reason, 0) + 1
+
+
+class UsageLedger:
+    """Model calls made while handling one request"""
+
+    def __init__(self):
+        self.calls: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, call: Dict[str, Any]):
+        with self._lock:
+            self.calls.append(call)
+
+    def merge(self, other: 'UsageLedger'):
+        """Add the calls recorded in another ledger"""
+        with other._lock:
+            calls = list(other.calls)
+        with self._lock:
+            self.calls.extend(calls)
+
+    def summary(self) -> Dict[str, Any]:
+        """Totals for the request, and broken down per tool, prompt and model"""
+        with self._lock:
+            calls = list(self.calls)
+        totals = _empty_totals()
+        by_tool: Dict[str, Dict[str, Any]] = {}
+        by_purpose: Dict[str, Dict[str, Any]] = {}
+        by_model: Dict[str, Dict[str, Any]] = {}
+        for call in calls:
+            _add(totals, call)
+            _add(by_tool.setdefault(call['tool'] or 'unknown', _empty_totals()), call)
+            _add(by_purpose.setdefault(call['purpose'] or 'unknown', _empty_totals()), call)
+            _add(by_model.setdefault(call['model_id'], _empty_totals()), call)
+        return {**totals, 'by_tool': by_tool, 'by_purpose': by_purpose, 'by_model': by_model}
+
+
+def start_request() -> UsageLedger:
+    """Begin a ledger for the current request"""
+    ledger = UsageLedger()
+    _current.set(ledger)
+    return ledger
+
+
+def current() -> Optional[UsageLedger]:
+    return _current.get()
+
+
+def summary() -> Optional[Dict[str, Any]]:
+    ledger = _current.get()
+    return ledger.summary() if ledger is not None else None
+
+
+def current_tool() -> Optional[str]:
+    return _tool.get()
+
+
+@contextmanager
+def tool_scope(tool: str) -> Iterator[None]:
+    """Attribute calls made inside the block to ``tool``"""
+    token = _tool.set(tool)
+    try:
+        yield
+    finally:
+        _tool.reset(token)
+
+
+def record_call(
+    model_id: str,
+    purpose: Optional[str] = None,
+    input_tokens: Optional[int] = None,
+    output_tokens: Optional[int] = None,
+    stop_reason: Optional[str] = None,
+    latency_ms: float = 0.0,
+    retries: int = 0,
+    cached: bool = False,
+):
+    """Record one model call in the request ledger and the request metrics"""
+    call = {
+        'tool': _tool.get(),
+        'purpose': purpose,
+        'model_id': model_id,
+        'input_tokens': input_tokens or 0,
+        'output_tokens': output_tokens or 0,
+        'stop_reason': stop_reason,
+        'latency_ms': round(latency_ms, 1),
+        'retries': retries or 0,
+        'cached': cached,
+    }
+    ledger = _current.get()
+    if ledger is not None:
+        ledger.add(call)
+
+    metrics.increment('bedrock_calls')
+    if cached:
+        return
+    metrics.increment('bedrock_input_tokens', call['input_tokens'])
+    metrics.increment('bedrock_output_tokens', call['output_tokens'])
+    metrics.increment('bedrock_retries', call['retries'])
+    if stop_reason == 'max_tokens':
+        metrics.increment('bedrock_max_tokens')
+    request_metrics = metrics.current()
+    if request_metrics is not None:
+        request_metrics.record_duration('bedrock_model', latency_ms)
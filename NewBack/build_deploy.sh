@@ -14,7 +14,8 @@ S3_PREFIX="smile-agent-diagrams"
 aws ecr get-login-password --region $AWS_REGION | docker login --username AWS --password-stdin $AWS_ACCOUNT_ID.dkr.ecr.$AWS_REGION.amazonaws.com
 
 # Build Docker image
-docker build -t $ECR_REPO_NAME:latest .
+# Shared modules come from ../Backend, so the build context is the repository root
+docker build -f Dockerfile -t $ECR_REPO_NAME:latest ..
 
 # Tag and push to ECR
 docker tag $ECR_REPO_NAME:latest $AWS_ACCOUNT_ID.dkr.ecr.$AWS_REGION.amazonaws.com/$ECR_REPO_NAME:latest
@@ -1,5 +1,5 @@
 # Build the image
-docker build -t claude3-agent .
+docker build -f Dockerfile -t claude3-agent ..
 
 # Test the image locally (optional)
 docker run --rm claude3-agent python -c "import diagrams; print('Diagrams package working')"
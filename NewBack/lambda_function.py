@@ -1,139 +1,246 @@
 # lambda_function.py
 import json
-import os
 import logging
-import boto3
-from typing import Dict, Any
-from claude3_tools import (
-    aws_well_arch_tool,
-    code_gen_tool,
-    DiagramGenerator,
-    pil_to_base64,
-    gen_image_caption
-)
+import time
+
+import batch
+import jobs
+import llm_cache
+import metrics
+import structured_log
+import tools
+import usage
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
+log = structured_log.get_logger(__name__)
+
+_INIT_START = time.perf_counter()
+_reported_tools = set()
+
+
+def _log_init_report(tool_type: str):
+    """Log what loading a tool cost the first time this container uses it"""
+    if tool_type in _reported_tools:
+        return
+    _reported_tools.add(tool_type)
+    logger.info(
+        f"Init report after first {tool_type} request "
+        f"(container age {(time.perf_counter() - _INIT_START) * 1000:.0f} ms): "
+        f"{json.dumps(tools.init_report())}"
+    )
+
+
+def _json_response(status_code, payload):
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps(payload)
+    }
+
+
+def _handle_warmup(event):
+    """Load tool dependencies ahead of real traffic, e.g. from a scheduled ping"""
+    requested = event.get('tools') or list(tools.TOOL_MODULES)
+    warmed = []
+    errors = {}
+    for tool_type in requested:
+        try:
+            tools.load_tool(tool_type).warm()
+            warmed.append(tool_type)
+        except Exception as e:
+            logger.warning(f"Failed to warm {tool_type}: {e}")
+            errors[tool_type] = str(e)
+
+    return _json_response(200, {
+        'success': not errors,
+        'warmed': warmed,
+        'errors': errors,
+        'init': tools.init_report()
+    })
+
+
+def _run_tool(tool_type, query):
+    """Dispatch a single query to its tool and return the response data"""
+    tool = tools.load_tool(tool_type)
+    with usage.tool_scope(tool_type), metrics.span('tool'):
+        response_data = tool.run(query)
+    _log_init_report(tool_type)
+    return response_data
+
+
+def _handle_batch(body, context):
+    """Run a batch of {tool_type, query} items concurrently"""
+    metrics.set_tool('batch')
+    try:
+        results = batch.run_batch(
+            body.get('batch'),
+            _run_tool,
+            context=context,
+            max_workers=body.get('max_concurrency'),
+            item_timeout_ms=body.get('item_timeout_ms')
+        )
+    except batch.BatchValidationError as e:
+        return _json_response(400, {
+            'success': False,
+            'message': str(e)
+        })
+
+    summary = batch.summarize(results)
+    log.info("Batch finished", summary=summary)
+    return _json_response(200, {
+        'success': True,
+        'type': 'batch',
+        'data': {
+            'results': results,
+            'summary': summary
+        },
+        'usage': usage.summary()
+    })
+
+
+def _submit_job(body, context):
+    """Start a tool request in the background and return its job ID at once"""
+    tool_type = body.get('tool_type')
+    query = body.get('query')
+    if not tool_type or not query:
+        return _json_response(400, {
+            'success': False,
+            'message': 'Missing required parameters: tool_type and query'
+        })
+    if tool_type not in tools.TOOL_MODULES:
+        return _json_response(400, {
+            'success': False,
+            'message': f'Unknown tool type: {tool_type}'
+        })
+
+    metrics.set_tool(tool_type)
+    metrics.set_property('Async', True)
+    record = jobs.submit(tool_type, query, _handle_job, context, no_cache=body.get('no_cache', False))
+    return _json_response(202, {'success': True, 'type': 'job', 'data': record})
+
+
+def _get_job(job_id):
+    """Return a job's status, and its result once finished"""
+    metrics.set_tool('job_status')
+    try:
+        record = jobs.get_job(job_id)
+    except jobs.JobNotFoundError as e:
+        return _json_response(404, {'success': False, 'message': str(e)})
+    return _json_response(200, {'success': True, 'type': 'job', 'data': record})
+
+
+def _run_tool_with_usage(tool_type, query):
+    return {**_run_tool(tool_type, query), 'usage': usage.summary()}
+
+
+def _handle_job(job, context):
+    """Run a submitted job; invoked asynchronously or from a local thread"""
+    request_metrics = metrics.start_request(
+        tool=job.get('tool_type'),
+        request_id=getattr(context, 'aws_request_id', None)
+    )
+    metrics.set_property('Async', True)
+    metrics.set_property('JobId', job.get('job_id'))
+    structured_log.begin_request(job.get('job_id'))
+    usage.start_request()
+    llm_cache.set_bypass(job.get('no_cache', False))
+    try:
+        record = jobs.run_job(job, _run_tool_with_usage)
+        metrics.set_property('JobStatus', record['status'])
+        return {'job_id': record['job_id'], 'status': record['status']}
+    finally:
+        structured_log.end_request()
+        metrics.emit(request_metrics)
+
 
 def handler(event, context):
     """Main Lambda handler"""
+    # A warm container keeps the previous request's flag; requests opt back in with "no_cache"
+    llm_cache.set_bypass(False)
+    if event.get('warmup'):
+        return _handle_warmup(event)
+    if 'job' in event:
+        return _handle_job(event['job'], context)
+
+    request_id = getattr(context, 'aws_request_id', None)
+    request_metrics = metrics.start_request(request_id=request_id)
+    structured_log.begin_request(request_id)
+    usage.start_request()
     try:
-        logger.info(f"Received event: {json.dumps(event)}")
+        response = _handle_request(event, context)
+        metrics.set_property('StatusCode', response['statusCode'])
+        metrics.record_size('response', response['body'])
+        return response
+    finally:
+        structured_log.end_request()
+        metrics.emit(request_metrics)
+
+
+def _handle_request(event, context):
+    try:
+        log.debug("Received event", event=event)
         
         # Parse the request body
         if isinstance(event.get('body'), str):
             body = json.loads(event['body'])
         else:
             body = event.get('body', {})
+
+        # "no_cache": true skips cached model responses for this request
+        llm_cache.set_bypass(body.get('no_cache', False))
+
+        if 'batch' in body:
+            return _handle_batch(body, context)
+        if 'job_id' in body:
+            return _get_job(body['job_id'])
+        if body.get('async'):
+            return _submit_job(body, context)
             
         tool_type = body.get('tool_type')
         query = body.get('query')
         
-        logger.info(f"Tool Type: {tool_type}")
-        logger.info(f"Query: {query}")
+        log.info("Request", tool_type=tool_type, query=query)
         
         # Validate input
         if not tool_type or not query:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'success': False,
-                    'message': 'Missing required parameters'
-                })
-            }
+            return _json_response(400, {
+                'success': False,
+                'message': 'Missing required parameters'
+            })
             
+        metrics.set_tool(tool_type)
         try:
-            if tool_type == "AWS Well Architected Tool":
-                result = aws_well_arch_tool(query)
-                response_data = {
-                    'success': True,
-                    'type': 'well-arch',
-                    'data': {
-                        'answer': result['ans'],
-                        'resources': result['docs'].split('\n')
-                    }
-                }
-                
-            elif tool_type == "Diagram Tool":
-                generator = DiagramGenerator()
-                result = generator.generate_diagram(query)
-                
-                if result and result.get('image'):
-                    image_base64 = pil_to_base64(result['image'])
-                    caption = gen_image_caption(image_base64)
-                    response_data = {
-                        'success': True,
-                        'type': 'diagram',
-                        'data': {
-                            'image': image_base64,
-                            'caption': caption,
-                            'url': result.get('url')
-                        }
-                    }
-                else:
-                    raise Exception("Failed to generate diagram")
-                    
-            elif tool_type == "Code Gen Tool":
-                code = code_gen_tool(query)
-                response_data = {
-                    'success': True,
-                    'type': 'code',
-                    'data': {
-                        'code': code
-                    }
-                }
-                
-            else:
-                return {
-                    'statusCode': 400,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({
-                        'success': False,
-                        'message': f'Unknown tool type: {tool_type}'
-                    })
-                }
-                
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps(response_data)
-            }
+            try:
+                response_data = _run_tool_with_usage(tool_type, query)
+            except tools.UnknownToolError:
+                return _json_response(400, {
+                    'success': False,
+                    'message': f'Unknown tool type: {tool_type}'
+                })
+            except tools.InvalidQueryError as e:
+                return _json_response(400, {
+                    'success': False,
+                    'message': str(e)
+                })
+
+            with metrics.span('serialize'):
+                return _json_response(200, response_data)
             
         except Exception as e:
             logger.error(f"Error processing {tool_type} request: {str(e)}")
-            return {
-                'statusCode': 500,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'success': False,
-                    'message': f'Error processing request: {str(e)}'
-                })
-            }
+            return _json_response(500, {
+                'success': False,
+                'message': f'Error processing request: {str(e)}'
+            })
             
     except Exception as e:
         logger.error(f"Error processing request: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'success': False,
-                'message': f'Internal server error: {str(e)}'
-            })
-        }
\ No newline at end of file
+        return _json_response(500, {
+            'success': False,
+            'message': f'Internal server error: {str(e)}'
+        })
\ No newline at end of file
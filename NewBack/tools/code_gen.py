@@ -0,0 +1,45 @@
+import logging
+from typing import Any, Dict, Iterator
+
+from streaming import skip_first_line
+from tools.llm import call_claude_3_code, get_bedrock_runtime, stream_claude_3_code
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = """
+    You are an expert programmer focused on providing concise, efficient code solutions.
+    Generate well-commented, production-ready code that follows best practices.
+    Provide only the code without additional explanation.
+    """
+
+
+def code_gen_tool(prompt: str) -> str:
+    """Generate code based on user request"""
+    try:
+        code = call_claude_3_code(SYSTEM_PROMPT, prompt)
+        return code.split('\n', 1)[1] if '\n' in code else code
+        
+    except Exception as e:
+        logger.error(f"Error in code generation tool: {e}")
+        raise
+
+
+def run(query: str) -> Dict[str, Any]:
+    code = code_gen_tool(query)
+    return {
+        'success': True,
+        'type': 'code',
+        'data': {
+            'code': code
+        }
+    }
+
+
+def stream(query: str) -> Iterator[Dict[str, Any]]:
+    """Yield the generated code as it arrives"""
+    for text in skip_first_line(stream_claude_3_code(SYSTEM_PROMPT, query)):
+        yield {'type': 'delta', 'text': text}
+
+
+def warm():
+    get_bedrock_runtime()
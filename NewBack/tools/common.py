@@ -0,0 +1,27 @@
+import base64
+import io
+import logging
+
+from metrics import record_size, timed
+
+logger = logging.getLogger(__name__)
+
+
+@timed()
+def pil_to_base64(image: "Image.Image", format: str = "PNG") -> str:
+    """Convert PIL image to base64"""
+    try:
+        with io.BytesIO() as buffer:
+            image.save(buffer, format)
+            encoded = base64.b64encode(buffer.getvalue()).decode()
+            record_size('image_base64', encoded)
+            return encoded
+    except Exception as e:
+        logger.error(f"Error converting image to base64: {e}")
+        raise
+
+
+def remove_first_line(text: str) -> str:
+    """Remove the first line from generated code"""
+    lines = text.split("\n")
+    return "\n".join(lines[1:]) if len(lines) > 1 else text
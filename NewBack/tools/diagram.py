@@ -0,0 +1,378 @@
+import json
+import logging
+import os
+import subprocess
+import sys
+import uuid
+from typing import Dict, Any, Optional, List
+
+from bedrock import build_request, invoke_text
+from service_registry import get_registry
+from service_selector import get_selector, select_services
+from metrics import record_size, span, timed
+from structured_log import get_logger
+from tools.common import pil_to_base64
+from tools.lazy import lazy_dependency
+from tools.llm import FILL_PREFILL, gen_image_caption, get_bedrock_runtime
+
+logger = logging.getLogger(__name__)
+log = get_logger(__name__)
+
+BUCKET_NAME = os.environ.get('DIAGRAM_BUCKET_NAME', 'amazonqbucketsmile')
+S3_PREFIX = 'smile-agent-diagrams'
+
+
+@lazy_dependency('diagram')
+def get_s3_client():
+    """Create the S3 client used for diagram uploads on first use"""
+    import boto3
+
+    return boto3.client('s3')
+
+
+def _read_text(path: str) -> str:
+    with open(path, 'r') as f:
+        return f.read()
+
+
+@lazy_dependency('diagram')
+def _load_pil():
+    from PIL import Image
+    return Image
+
+
+class DiagramGenerator:
+    def __init__(self):
+        self.temp_dir = '/tmp'
+        os.makedirs(self.temp_dir, exist_ok=True)
+        os.environ['DIAGRAMS_OUTPUT_DIR'] = self.temp_dir
+        self.service_mapping = self._load_service_mapping()
+        
+        # Set Graphviz configuration for Lambda environment
+        os.environ['PATH'] = f"{os.environ.get('PATH')}:/opt/graphviz/bin"
+        os.environ['LD_LIBRARY_PATH'] = f"{os.environ.get('LD_LIBRARY_PATH', '')}:/opt/graphviz/lib"
+
+    def _load_service_mapping(self) -> Dict[str, str]:
+        try:
+            return get_registry().service_modules()
+        except Exception as e:
+            logger.error(f"Error loading service mapping: {e}")
+            return {}
+
+    @timed('call_claude_3_fill')
+    def _call_claude_3_fill(
+        self,
+        system_prompt: str,
+        prompt: str,
+        model_id: Optional[str] = None
+    ) -> str:
+        """Special Claude 3 call for diagram code generation"""
+        try:
+            request = build_request(system_prompt, prompt, prefill=FILL_PREFILL)
+            return invoke_text(request, model_id=model_id, purpose='call_claude_3_fill')
+        except Exception as e:
+            logger.error(f"Error in code generation: {e}")
+            raise
+
+    def generate_image_caption(self, base64_string: str) -> str:
+        """Generate caption for AWS architecture diagram"""
+        return gen_image_caption(base64_string)
+
+    @timed('render_subprocess')
+    def _execute_diagram_code(self, code_file: str):
+        """Execute the generated diagram code with enhanced error handling"""
+        try:
+            # The file is only read back when this request's debug lines are sampled
+            log.debug("Executing diagram code", code_file=code_file, code=lambda: _read_text(code_file))
+            
+            # Run with full error capture
+            result = subprocess.run(
+                [sys.executable, code_file],
+                capture_output=True,
+                text=True,
+                env={
+                    **os.environ,
+                    'PYTHONPATH': os.getenv('LAMBDA_TASK_ROOT', ''),
+                    'DIAGRAMS_OUTPUT_DIR': self.temp_dir
+                }
+            )
+            
+            if result.returncode != 0:
+                log.error("Diagram generation failed", stderr=result.stderr, stdout=result.stdout)
+                raise Exception(f"Code execution failed: {result.stderr}")
+                
+            logger.info("Diagram generation successful")
+            
+        except Exception as e:
+            logger.error(f"Error executing diagram code: {str(e)}")
+            raise
+
+    def generate_diagram(self, query: str) -> Optional[Dict[str, Any]]:
+        """Generate AWS architecture diagram based on query"""
+        try:
+            diagram_id = str(uuid.uuid4())
+            code_file = os.path.join(self.temp_dir, f"diagram_{diagram_id}.py")
+            output_file = os.path.join(self.temp_dir, f"diagram_{diagram_id}.png")
+            
+            # Generate and log the code
+            code = self._generate_diagram_code(query, diagram_id)
+            log.debug("Generated diagram code", code=code)
+            
+            # Write code to file
+            with open(code_file, 'w') as f:
+                f.write(code)
+            
+            # Execute code
+            self._execute_diagram_code(code_file)
+            
+            # Wait for the output file to be generated
+            dot_file = os.path.join(self.temp_dir, f"diagram_{diagram_id}")
+            if os.path.exists(dot_file):
+                # Generate PNG using dot directly
+                cmd = [
+                    'dot',
+                    '-Tpng',
+                    '-o', output_file,
+                    dot_file
+                ]
+                with span('graphviz_dot'):
+                    subprocess.run(cmd, check=True)
+            
+            # Verify output file
+            if not os.path.exists(output_file):
+                logger.error(f"Output file not found at: {output_file}")
+                logger.error(f"Directory contents: {os.listdir(self.temp_dir)}")
+                raise Exception("Diagram generation failed - output file not found")
+                
+            # Open and verify the image before uploading
+            record_size('diagram_png', os.path.getsize(output_file))
+            with span('load_image'):
+                image = _load_pil().open(output_file)
+            
+            # Upload to S3
+            s3_key = f"{S3_PREFIX}/diagram_{diagram_id}.png"
+            try:
+                with span('s3_upload'), open(output_file, 'rb') as img_file:
+                    get_s3_client().upload_fileobj(img_file, BUCKET_NAME, s3_key)
+                
+                url = get_s3_client().generate_presigned_url(
+                    'get_object',
+                    Params={'Bucket': BUCKET_NAME, 'Key': s3_key},
+                    ExpiresIn=3600
+                )
+            except Exception as e:
+                logger.error(f"S3 upload error: {str(e)}")
+                url = None
+            
+            # Generate caption
+            base64_image = pil_to_base64(image)
+            caption = gen_image_caption(base64_image)
+            
+            return {
+                'success': True,
+                'image': image,
+                'url': url,
+                'caption': caption
+            }
+            
+        except Exception as e:
+            logger.error(f"Error generating diagram: {str(e)}")
+            raise
+            
+        finally:
+            # Clean up temporary files
+            self._cleanup([
+                code_file,
+                output_file,
+                os.path.join(self.temp_dir, f"diagram_{diagram_id}"),  # dot file
+            ])
+
+    def _generate_diagram_code(self, query: str, diagram_id: str) -> str:
+        """Generate Python code for the diagram"""
+        system_prompt = f"""
+        You are an expert python programmer that has mastered the Diagrams library. 
+        Generate code for AWS architecture diagrams with these requirements:
+        
+        1. Use only these supported services and their correct imports:
+        {json.dumps(select_services(query), indent=2)}
+        
+        2. Important rules:
+        - Don't use CloudWatch/monitoring services
+        - For DynamoDB, use 'Dynamodb' not 'DynamoDB'
+        - For Lambda, use 'Lambda' not 'LambdaFunction'
+        - Do not include diagram configuration, it will be added automatically
+        
+        Generate only the diagram content code without the Diagram configuration.
+        Example format:
+        s3 = S3("S3 Bucket")
+        lambda_func = Lambda("Lambda Function")
+        s3 >> lambda_func
+        
+        Generate only the Python code, no explanations.
+        """
+        
+        code = self._call_claude_3_fill(system_prompt, query)
+        code = self._clean_code(code, diagram_id)
+        code = self._correct_imports(code)
+        return code
+
+    @timed()
+    def _clean_code(self, code: str, diagram_id: str) -> str:
+        """Clean up generated code and ensure correct file paths"""
+        # Remove code blocks and docstrings
+        code = code.replace("```python", "").replace("```", "").replace('"""', "")
+        
+        # Clean up service names
+        code = code.replace("DynamoDB", "Dynamodb")
+        code = code.replace("LambdaFunction", "Lambda")
+        
+        # Remove any existing Diagram configuration
+        lines = code.split("\n")
+        cleaned_lines = []
+        inside_diagram = False
+        
+        for line in lines:
+            if "with Diagram(" in line:
+                inside_diagram = True
+                continue
+            if inside_diagram and line.strip().endswith("):"):
+                inside_diagram = False
+                continue
+            if not line.strip().startswith("from diagrams import") and not line.strip().startswith("import"):
+                cleaned_lines.append(line)
+
+        # Add proper diagram configuration with full path
+        full_output_path = os.path.join(self.temp_dir, f"diagram_{diagram_id}")
+        diagram_config = f'''
+with Diagram(
+    "AWS Architecture",
+    filename="{full_output_path}",
+    show=False,
+    direction="LR",
+    outformat="png",
+    graph_attr={{"dpi": "300"}}
+):
+{os.linesep.join("    " + line for line in cleaned_lines if line.strip())}
+'''
+        return diagram_config
+
+    @timed('correct_imports')
+    def _correct_imports(self, code: str) -> str:
+        """Ensure correct imports based on service mapping"""
+        try:
+            detected_services = set()
+            for service in self.service_mapping:
+                if service in code:
+                    detected_services.add(service)
+            
+            # Generate import statements
+            imports = ['from diagrams import Cluster, Diagram']
+            for service in detected_services:
+                module = self.service_mapping[service]
+                imports.append(f"from diagrams.aws.{module} import {service}")
+            
+            # Add code with proper environment setup
+            full_code = f'''
+import os
+os.environ["DIAGRAMS_OUTPUT_DIR"] = "{self.temp_dir}"
+os.environ["PATH"] = "{os.environ.get('PATH')}:/opt/graphviz/bin"
+os.environ["LD_LIBRARY_PATH"] = "{os.environ.get('LD_LIBRARY_PATH', '')}:/opt/graphviz/lib"
+
+{os.linesep.join(imports)}
+
+{code}
+'''
+            return full_code
+            
+        except Exception as e:
+            logger.error(f"Error correcting imports: {str(e)}")
+            raise
+
+    def _cleanup(self, files: List[str]):
+        """Clean up temporary files"""
+        for file in files:
+            try:
+                if os.path.exists(file):
+                    os.remove(file)
+            except Exception as e:
+                logger.warning(f"Failed to cleanup {file}: {str(e)}")
+
+
+def validate_environment() -> bool:
+    import boto3
+
+    try:
+        required_env_vars = [
+            'AWS_REGION',
+            'DIAGRAM_BUCKET_NAME',
+            'DIAGRAMS_OUTPUT_DIR'
+        ]
+        
+        missing_vars = [var for var in required_env_vars 
+                       if not os.environ.get(var)]
+        
+        if missing_vars:
+            logger.error(f"Missing required environment variables: {missing_vars}")
+            return False
+            
+        # Validate temp directory
+        temp_dir = os.environ.get('DIAGRAMS_OUTPUT_DIR', '/tmp')
+        if not os.path.exists(temp_dir):
+            os.makedirs(temp_dir, exist_ok=True)
+        os.chmod(temp_dir, 0o777)
+        
+        # Validate AWS credentials
+        boto3.client('sts').get_caller_identity()
+        
+        # Test graphviz installation
+        try:
+            subprocess.run(['dot', '-V'], 
+                         capture_output=True, 
+                         text=True, 
+                         check=True)
+        except Exception as e:
+            logger.error(f"Graphviz test failed: {e}")
+            return False
+            
+        # Test diagrams library
+        try:
+            import diagrams
+            from diagrams import Diagram
+            logger.info("Diagrams library validated successfully")
+        except ImportError as e:
+            logger.error(f"Diagrams import failed: {e}")
+            return False
+            
+        return True
+        
+    except Exception as e:
+        logger.error(f"Environment validation failed: {e}")
+        return False
+
+
+def run(query: str) -> Dict[str, Any]:
+    generator = DiagramGenerator()
+    result = generator.generate_diagram(query)
+
+    if not result or not result.get('image'):
+        raise Exception("Failed to generate diagram")
+
+    image_base64 = pil_to_base64(result['image'])
+    caption = gen_image_caption(image_base64)
+    return {
+        'success': True,
+        'type': 'diagram',
+        'data': {
+            'image': image_base64,
+            'caption': caption,
+            'url': result.get('url')
+        }
+    }
+
+
+def warm():
+    _load_pil()
+    get_registry()
+    get_selector()
+    get_s3_client()
+    get_bedrock_runtime()
@@ -0,0 +1,122 @@
+import hashlib
+import logging
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import metrics
+from context_builder import CANDIDATES, TOKEN_BUDGET, Context, build_context
+from retrieval import get_retrieval_service
+from semantic_cache import get_semantic_cache
+from tools.llm import call_claude_3, get_bedrock_runtime, stream_claude_3
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = """
+        You are an expert AWS solutions architect professional, helping customers 
+        solve problems using the AWS Well-Architected Framework.
+        """
+
+# Answers depend on the prompt and context settings as well as the index
+_ANSWER_VERSION = hashlib.sha256(f"{SYSTEM_PROMPT}{CANDIDATES}:{TOKEN_BUDGET}".encode('utf-8')).hexdigest()[:8]
+
+
+def _no_store(result):
+    pass
+
+
+def _retrieve(query: str) -> Tuple[List[Tuple[Any, float]], Optional[List[float]]]:
+    """Candidate chunks for the context, with the query embedding if retrieval computed one"""
+    service = get_retrieval_service()
+    _, ranked, vector = service.rank(query, k=CANDIDATES)
+    return [(service.document(i), score) for i, score in ranked], vector
+
+
+def _cached_answer(vector: Optional[List[float]]) -> Tuple[Callable[[Dict[str, Any]], None], Optional[Dict[str, Any]]]:
+    """
+    Look the question up in the semantic cache by the embedding retrieval
+    already computed. Returns a function that stores the fresh answer (a
+    no-op when the cache cannot be used) and the cached answer, if any.
+    Queries answered from BM25 alone have no embedding and skip the cache
+    rather than pay for one.
+    """
+    cache = get_semantic_cache('well_arch')
+    if cache is None or vector is None:
+        metrics.set_property('semantic_cache', 'skip')
+        return _no_store, None
+    version = f"{get_retrieval_service().index_version()}:{_ANSWER_VERSION}"
+    cached = cache.lookup(vector, version)
+    metrics.set_property('semantic_cache', 'hit' if cached else 'miss')
+
+    def store(result):
+        cache.store(vector, version, result)
+
+    return store, cached[0] if cached else None
+
+
+def _build_prompt(query: str, results: List[Tuple[Any, float]]) -> Tuple[str, Context]:
+    """Build the prompt and packed context from the retrieved chunks"""
+    context = build_context(results)
+    prompt = f"""Use the following context to answer the question:
+        {context.text}
+        Question: {query}
+        Answer:"""
+    return prompt, context
+
+
+def aws_well_arch_tool(query: str) -> Dict[str, Any]:
+    """AWS Well-Architected Framework tool"""
+    try:
+        results, vector = _retrieve(query)
+        store, cached = _cached_answer(vector)
+        if cached:
+            return cached
+
+        prompt, context = _build_prompt(query, results)
+        answer = call_claude_3(SYSTEM_PROMPT, prompt)
+        
+        result = {
+            "ans": answer,
+            "docs": context.resource_lines,
+            "sources": context.resources
+        }
+        store(result)
+        return result
+        
+    except Exception as e:
+        logger.error(f"Error in AWS Well-Architected tool: {e}")
+        raise
+
+
+def run(query: str) -> Dict[str, Any]:
+    result = aws_well_arch_tool(query)
+    return {
+        'success': True,
+        'type': 'well-arch',
+        'data': {
+            'answer': result['ans'],
+            'resources': result['docs'],
+            'sources': result.get('sources', [])
+        }
+    }
+
+
+def stream(query: str) -> Iterator[Dict[str, Any]]:
+    """Yield the resources first, then the answer as it is generated"""
+    results, vector = _retrieve(query)
+    store, cached = _cached_answer(vector)
+    if cached:
+        yield {'type': 'resources', 'resources': cached['docs'], 'sources': cached.get('sources', [])}
+        yield {'type': 'delta', 'text': cached['ans']}
+        return
+
+    prompt, context = _build_prompt(query, results)
+    yield {'type': 'resources', 'resources': context.resource_lines, 'sources': context.resources}
+    answer = []
+    for text in stream_claude_3(SYSTEM_PROMPT, prompt):
+        answer.append(text)
+        yield {'type': 'delta', 'text': text}
+    store({"ans": ''.join(answer), "docs": context.resource_lines, "sources": context.resources})
+
+
+def warm():
+    get_retrieval_service().warm()
+    get_bedrock_runtime()